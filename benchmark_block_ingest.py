@@ -0,0 +1,90 @@
+# benchmark_block_ingest.py
+"""Measure how fast SQLiteDocumentRepository stores pages and blocks.
+
+"per-row" is the old write path: one INSERT OR REPLACE per page and block,
+serialised one model at a time. "batched" is store_pages_and_blocks: the rows
+are serialised in chunks on a worker thread, overlapping executemany of the
+previous chunk, in a single transaction. Both write synthetic Marker-shaped
+documents to fresh databases, either all at once or one page per call (what
+UploadService degrades to when pages arrive slower than it batches them).
+
+    python benchmark_block_ingest.py --blocks 20000 100000
+"""
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+
+from src.repositories.implementations.sqlite_document_repository import SQLiteDocumentRepository
+from src.repositories.sqlite_engine import dispose_sqlite_engines
+from src.services.document.marker_service import pages_and_blocks_from_marker_json
+
+BLOCKS_PER_PAGE = 40
+
+class PerRowRepository(SQLiteDocumentRepository):
+    """The repository as it was: a statement per row"""
+    async def store_pages_and_blocks(self, pages, blocks, session=None):
+        async with self._connect() as db:
+            for page in pages:
+                await db.execute(
+                    "INSERT OR REPLACE INTO pages (id, document_id, page_number, data) VALUES (?, ?, ?, ?)",
+                    (page.id, page.document_id, page.page_number, page.json())
+                )
+            for reading_order, block in enumerate(blocks):
+                await db.execute(
+                    "INSERT OR REPLACE INTO blocks (id, page_id, document_id, page_number, block_type, reading_order, data) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    (block.id, block.page_id, block.document_id, block.page_number, block.block_type, reading_order, block.json())
+                )
+            await db.commit()
+
+def synthetic_document(blocks: int) -> dict:
+    """Marker-shaped output with blocks spread over pages"""
+    pages = (blocks + BLOCKS_PER_PAGE - 1) // BLOCKS_PER_PAGE
+    return {"children": [{
+        "id": f"/page/{index}/Page/0",
+        "block_type": "Page",
+        "html": "",
+        "polygon": [[0.0, 0.0], [612.0, 0.0], [612.0, 792.0], [0.0, 792.0]],
+        "children": [{
+            "id": f"/page/{index}/Text/{n}",
+            "block_type": "Text",
+            "html": f"<p>{'Lorem ipsum dolor sit amet. ' * 6}</p>",
+            "polygon": [[72.0, 100.0], [540.0, 100.0], [540.0, 130.0], [72.0, 130.0]],
+            "section_hierarchy": {"1": "/page/0/SectionHeader/0"}
+        } for n in range(min(BLOCKS_PER_PAGE, blocks - index * BLOCKS_PER_PAGE))]
+    } for index in range(pages)]}
+
+async def ingest(repository: SQLiteDocumentRepository, pages: list, blocks: list, per_page: bool) -> None:
+    if not per_page:
+        await repository.store_pages_and_blocks(pages, blocks)
+        return
+    by_page = {}
+    for block in blocks:
+        by_page.setdefault(block.page_id, []).append(block)
+    for page in pages:
+        await repository.store_pages_and_blocks([page], by_page.get(page.id, []))
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--blocks", type=int, nargs="+", default=[20000, 100000], help="Document sizes to try")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        for count in args.blocks:
+            pages, blocks = pages_and_blocks_from_marker_json(synthetic_document(count), "benchmark")
+            print(f"{len(blocks)} blocks on {len(pages)} pages")
+            for label, cls in [("per-row", PerRowRepository), ("batched", SQLiteDocumentRepository)]:
+                for per_page in (False, True):
+                    db_path = os.path.join(workdir, f"{label}-{count}-{per_page}.db")
+                    repository = cls(db_path)
+                    started = time.perf_counter()
+                    await ingest(repository, pages, blocks, per_page)
+                    elapsed = time.perf_counter() - started
+                    mode = "page by page" if per_page else "all at once"
+                    print(f"  {label:<8} {mode:<13} {elapsed:6.2f}s  {len(blocks) / elapsed:9.0f} blocks/s")
+        await dispose_sqlite_engines()
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,92 @@
+# benchmark_chat_turn.py
+"""Measure the database time of one ChatService.send_message turn.
+
+"per-call" is the old turn: get_conversation, get_active_thread,
+add_message, set_active_version, the context walk of the thread again, and
+add_message and set_active_version for the response, each its own commit.
+"unit of work" reads the conversation and thread in one query and writes
+each phase in one transaction. The LLM answers instantly, so the time is
+all database. Turns run through a SQLAlchemy session, as the API's do, and
+without one.
+
+    python benchmark_chat_turn.py --turns 200
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import tempfile
+import time
+import uuid
+from typing import Optional
+
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import sessionmaker
+
+from src.models.base.document import Document
+from src.models.conversation.message import Message, MessageRole
+from src.repositories.implementations.sqlite_conversation_repository import SQLiteConversationRepository
+from src.repositories.implementations.sqlite_document_repository import SQLiteDocumentRepository
+from src.repositories.sqlite_engine import dispose_sqlite_engines, get_sqlite_engine
+from src.services.conversation.chat_service import ChatService
+
+class InstantLLM:
+    async def generate_response(self, context: list) -> str:
+        return f"A reply to {len(context)} messages."
+
+class PerCallChatService(ChatService):
+    """send_message as it was: a repository call, and a commit, per step"""
+    async def send_message(self, conversation_id: str, content: str, parent_version_id: Optional[str] = None, session: Optional[AsyncSession] = None):
+        if not await self.conversation_repo.get_conversation(conversation_id, session):
+            raise ValueError(f"Conversation {conversation_id} not found")
+        thread = await self.conversation_repo.get_active_thread(conversation_id, session)
+        user_msg = Message(id=str(uuid.uuid4()), conversation_id=conversation_id, role=MessageRole.USER,
+                           content=content, parent_id=thread[-1].id if thread else None)
+        await self.conversation_repo.add_message(user_msg, session)
+        await self.conversation_repo.set_active_version(user_msg.parent_id, user_msg.id, session)
+        context = await self.context_service.build_message_context(conversation_id, user_msg)
+        ai_msg = Message(id=str(uuid.uuid4()), conversation_id=conversation_id, role=MessageRole.ASSISTANT,
+                         content=await self.llm_service.generate_response(context), parent_id=user_msg.id)
+        await self.conversation_repo.add_message(ai_msg, session)
+        await self.conversation_repo.set_active_version(user_msg.id, ai_msg.id, session)
+        return ai_msg, user_msg.id
+
+async def run(label: str, cls, db_path: str, turns: int, use_session: bool) -> None:
+    documents = SQLiteDocumentRepository(db_path)
+    conversations = SQLiteConversationRepository(db_path)
+    service = cls(conversations, documents, InstantLLM())
+    factory = sessionmaker(get_sqlite_engine(db_path), class_=AsyncSession, expire_on_commit=False)
+    document = Document(user_id="benchmark", status="READY", title="Benchmark")
+    await documents.store_document(document)
+    conversation = await service.create_conversation(document.id)
+
+    latencies = []
+    for n in range(turns):
+        started = time.perf_counter()
+        if use_session:
+            async with factory() as session:
+                await service.send_message(conversation.id, f"Question {n}?", session=session)
+                await session.commit()
+        else:
+            await service.send_message(conversation.id, f"Question {n}?")
+        latencies.append(time.perf_counter() - started)
+    thread = await conversations.get_active_thread(conversation.id)
+    assert len(thread) == 2 * turns + 1, len(thread)
+    mode = "session" if use_session else "no session"
+    print(f"  {label:<13} {mode:<10} median {statistics.median(latencies) * 1e3:7.2f} ms  "
+          f"last 10% {statistics.mean(latencies[-max(turns // 10, 1):]) * 1e3:7.2f} ms")
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--turns", type=int, default=200, help="Turns sent to one conversation")
+    args = parser.parse_args()
+
+    print(f"{args.turns} turns in one conversation")
+    with tempfile.TemporaryDirectory() as workdir:
+        for use_session in (True, False):
+            for label, cls in [("per-call", PerCallChatService), ("unit of work", ChatService)]:
+                await run(label, cls, os.path.join(workdir, f"{cls.__name__}-{use_session}.db"), args.turns, use_session)
+        await dispose_sqlite_engines()
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,91 @@
+# benchmark_marker_event_loop.py
+"""Measure event-loop lag while MarkerService uploads PDFs concurrently.
+
+Starts marker_stub_server.py in a subprocess, then runs N concurrent uploads
+twice: once with blocking `requests` calls inside coroutines (the old
+behaviour) and once through MarkerService's pooled async client. A probe task
+sleeps for a fixed interval and records how late it wakes up; with a blocking
+client the lag grows with upload size, with the async client it stays flat.
+
+    python benchmark_marker_event_loop.py --uploads 8 --size-mb 20
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import time
+
+import requests
+
+from src.services.document.marker_service import MarkerService, close_marker_http_client, get_marker_http_client
+from src.services.document.marker_poller import MarkerPoller
+from marker_stub_server import run_in_subprocess
+
+PROBE_INTERVAL = 0.01
+
+async def probe_lag(stop: asyncio.Event, samples: list):
+    """Record how much later than PROBE_INTERVAL the loop lets us wake up"""
+    while not stop.is_set():
+        start = time.perf_counter()
+        await asyncio.sleep(PROBE_INTERVAL)
+        samples.append(time.perf_counter() - start - PROBE_INTERVAL)
+
+async def blocking_upload(url: str, payload: bytes, poll_interval: float):
+    """What MarkerService used to do: sync requests inside a coroutine"""
+    headers = {"X-Api-Key": "benchmark"}
+    response = requests.post(url, files={"file": ("document.pdf", payload, "application/pdf")},
+                             data={"output_format": "json"}, headers=headers)
+    check_url = response.json()["request_check_url"]
+    while True:
+        await asyncio.sleep(poll_interval)
+        if requests.get(check_url, headers=headers).json()["status"] == "complete":
+            return
+
+async def run(label: str, uploads, samples_out: dict):
+    samples: list = []
+    stop = asyncio.Event()
+    probe = asyncio.create_task(probe_lag(stop, samples))
+    started = time.perf_counter()
+    await asyncio.gather(*uploads)
+    elapsed = time.perf_counter() - started
+    stop.set()
+    await probe
+    samples_out[label] = (elapsed, samples)
+
+def report(label: str, elapsed: float, samples: list):
+    ms = sorted(s * 1000 for s in samples) or [0.0]
+    p99 = ms[min(len(ms) - 1, int(len(ms) * 0.99))]
+    print(f"{label:<10} wall {elapsed:6.2f}s  lag mean {statistics.mean(ms):7.2f}ms  "
+          f"p99 {p99:7.2f}ms  max {ms[-1]:7.2f}ms  ({len(ms)} samples)")
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--uploads", type=int, default=8, help="Concurrent uploads")
+    parser.add_argument("--size-mb", type=float, default=20, help="Size of each uploaded file")
+    parser.add_argument("--port", type=int, default=8765)
+    args = parser.parse_args()
+
+    server = run_in_subprocess(args.port)
+    url = f"http://127.0.0.1:{args.port}/api/v1/marker"
+    payload = os.urandom(int(args.size_mb * 1024 * 1024))
+    poll_interval = 0.2
+    results: dict = {}
+
+    try:
+        await run("blocking", [blocking_upload(url, payload, poll_interval) for _ in range(args.uploads)], results)
+
+        # Build the shared client (and its SSL context) up front, as a long-running app would have
+        get_marker_http_client()
+        marker = MarkerService(api_key="benchmark", marker_url=url,
+                               poller=MarkerPoller(min_interval=poll_interval, max_interval=poll_interval, first_poll_fraction=0))
+        await run("async", [marker.process_document(payload, "benchmark") for _ in range(args.uploads)], results)
+    finally:
+        await close_marker_http_client()
+        server.terminate()
+
+    print(f"{args.uploads} concurrent uploads of {args.size_mb:g} MB, probe interval {PROBE_INTERVAL * 1000:g}ms")
+    for label, (elapsed, samples) in results.items():
+        report(label, elapsed, samples)
+
+if __name__ == "__main__":
+    asyncio.run(main())
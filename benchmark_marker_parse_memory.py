@@ -0,0 +1,103 @@
+# benchmark_marker_parse_memory.py
+"""Measure peak Python memory while turning a Marker response into pages and blocks.
+
+Writes a synthetic Marker check response (text blocks plus a base64 image per
+page) for several document lengths, then compares the old path (json.load the
+whole response and build every Page and Block before storing anything) with
+MarkerOutput's incremental parse, where each page is dropped once handled the
+way UploadService stores it before parsing the next. The streaming peak
+should stay flat as the page count grows; it needs ijson installed.
+
+    python benchmark_marker_parse_memory.py --pages 250 500 1000
+"""
+import argparse
+import base64
+import json
+import os
+import tempfile
+import time
+import tracemalloc
+
+from src.services.document.marker_poller import MarkerOutput, ijson_available
+from src.services.document.marker_service import iter_pages_and_blocks, pages_and_blocks_from_marker_json
+
+def synthetic_page(index: int, blocks_per_page: int, image_bytes: int) -> dict:
+    """One page of Marker JSON with text blocks and a picture"""
+    children = [{
+        "id": f"/page/{index}/Text/{n}",
+        "block_type": "Text",
+        "html": f"<p>{'Lorem ipsum dolor sit amet, consectetur adipiscing elit. ' * 8}</p>",
+        "polygon": [[72.0, 100.0 + n * 40], [540.0, 100.0 + n * 40], [540.0, 130.0 + n * 40], [72.0, 130.0 + n * 40]],
+        "section_hierarchy": {"1": "/page/0/SectionHeader/0"},
+        "images": {}
+    } for n in range(blocks_per_page)]
+    children.append({
+        "id": f"/page/{index}/Picture/{blocks_per_page}",
+        "block_type": "Picture",
+        "html": "",
+        "polygon": [[72.0, 500.0], [540.0, 500.0], [540.0, 700.0], [72.0, 700.0]],
+        "section_hierarchy": {"1": "/page/0/SectionHeader/0"},
+        "images": {f"/page/{index}/Picture/{blocks_per_page}": base64.b64encode(os.urandom(image_bytes)).decode()}
+    })
+    return {
+        "id": f"/page/{index}/Page/0",
+        "block_type": "Page",
+        "html": "",
+        "polygon": [[0.0, 0.0], [612.0, 0.0], [612.0, 792.0], [0.0, 792.0]],
+        "children": children
+    }
+
+def write_response(path: str, pages: int, blocks_per_page: int, image_bytes: int) -> None:
+    """A complete check response, written page by page so generating it stays cheap"""
+    with open(path, "w") as f:
+        f.write('{"status": "complete", "success": true, "json": {"block_type": "Document", "children": [')
+        for index in range(pages):
+            if index:
+                f.write(",")
+            json.dump(synthetic_page(index, blocks_per_page, image_bytes), f)
+        f.write("]}}")
+
+def buffered(path: str) -> int:
+    """What MarkerService used to do: whole response in memory, every model built up front"""
+    with open(path, "rb") as f:
+        response = json.load(f)
+    pages, blocks = pages_and_blocks_from_marker_json(response.get("json", {}), "benchmark")
+    return len(pages)
+
+def streaming(path: str) -> int:
+    """MarkerOutput pages handled one at a time, like UploadService storing each before the next"""
+    count = 0
+    with open(path, "rb") as f:
+        for page, blocks in iter_pages_and_blocks(MarkerOutput(f).pages(), "benchmark"):
+            count += 1
+    return count
+
+def measure(label: str, fn, path: str) -> None:
+    tracemalloc.start()
+    started = time.perf_counter()
+    pages = fn(path)
+    elapsed = time.perf_counter() - started
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f"  {label:<10} {pages:5d} pages  peak {peak / 2**20:8.1f} MB  {elapsed:6.1f}s")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--pages", type=int, nargs="+", default=[250, 500, 1000], help="Document lengths to try")
+    parser.add_argument("--blocks-per-page", type=int, default=12)
+    parser.add_argument("--image-kb", type=int, default=32, help="Size of the picture on each page before base64")
+    args = parser.parse_args()
+    if not ijson_available():
+        print("ijson is not installed, so the streaming path falls back to loading the whole response")
+
+    with tempfile.TemporaryDirectory() as workdir:
+        for pages in args.pages:
+            path = os.path.join(workdir, f"response-{pages}.json")
+            write_response(path, pages, args.blocks_per_page, args.image_kb * 1024)
+            print(f"{pages} pages, {os.path.getsize(path) / 2**20:.1f} MB response")
+            measure("buffered", buffered, path)
+            measure("streaming", streaming, path)
+            os.remove(path)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+# benchmark_sqlite_connections.py
+"""Measure per-query overhead of SQLiteDocumentRepository with and without the connection pool.
+
+"per-call" is what the repositories used to do: open a fresh aiosqlite
+connection (a new thread and file open, default rollback journal) for every
+method call. "pooled" borrows a connection from the shared engine, which keeps
+connections open with WAL and the configured pragmas. Both run the same
+repository SQL against copies of the same database.
+
+    python benchmark_sqlite_connections.py --reads 2000 --writers 16
+"""
+import argparse
+import asyncio
+import os
+import shutil
+import statistics
+import tempfile
+import time
+from contextlib import asynccontextmanager
+
+import aiosqlite
+
+from src.models.base.document import Document
+from src.repositories.implementations.sqlite_document_repository import SQLiteDocumentRepository
+from src.repositories.sqlite_engine import dispose_sqlite_engines, sqlite_pool_stats
+from src.services.document.marker_service import pages_and_blocks_from_marker_json
+
+class PerCallRepository(SQLiteDocumentRepository):
+    """The repository as it was: a new connection per method call"""
+    @asynccontextmanager
+    async def _connect(self):
+        async with aiosqlite.connect(self.db_path) as db:
+            yield db
+
+def synthetic_document(pages: int, blocks_per_page: int) -> dict:
+    """Marker-shaped output with text blocks on every page"""
+    return {"children": [{
+        "id": f"/page/{index}/Page/0",
+        "block_type": "Page",
+        "html": "",
+        "polygon": [[0.0, 0.0], [612.0, 0.0], [612.0, 792.0], [0.0, 792.0]],
+        "children": [{
+            "id": f"/page/{index}/Text/{n}",
+            "block_type": "Text",
+            "html": f"<p>{'Lorem ipsum dolor sit amet. ' * 10}</p>",
+            "polygon": [[72.0, 100.0], [540.0, 100.0], [540.0, 130.0], [72.0, 130.0]]
+        } for n in range(blocks_per_page)]
+    } for index in range(pages)]}
+
+async def seed(db_path: str, documents: int, pages: int, blocks_per_page: int) -> list:
+    repository = PerCallRepository(db_path)
+    ids = []
+    for _ in range(documents):
+        document = Document(user_id="benchmark", status="READY")
+        page_list, blocks = pages_and_blocks_from_marker_json(synthetic_document(pages, blocks_per_page), document.id)
+        await repository.store_document(document)
+        await repository.store_pages(page_list)
+        await repository.store_blocks(blocks)
+        ids.append(document.id)
+    return ids
+
+async def time_calls(calls: int, fn) -> list:
+    latencies = []
+    for i in range(calls):
+        started = time.perf_counter()
+        await fn(i)
+        latencies.append(time.perf_counter() - started)
+    return latencies
+
+async def run(label: str, repository: SQLiteDocumentRepository, ids: list, reads: int, writers: int, writes_per_writer: int) -> None:
+    point = await time_calls(reads, lambda i: repository.get_document(ids[i % len(ids)]))
+    listing = await time_calls(max(reads // 20, 1), lambda i: repository.get_blocks(ids[i % len(ids)]))
+
+    async def writer(n: int) -> None:
+        for i in range(writes_per_writer):
+            await repository.store_document(Document(user_id=f"writer-{n}", title=f"{n}-{i}"))
+    started = time.perf_counter()
+    await asyncio.gather(*(writer(n) for n in range(writers)))
+    write_seconds = time.perf_counter() - started
+
+    print(f"{label}")
+    print(f"  get_document   median {statistics.median(point) * 1e6:8.0f} us  p99 {sorted(point)[int(len(point) * 0.99)] * 1e6:8.0f} us")
+    print(f"  get_blocks     median {statistics.median(listing) * 1e3:8.2f} ms")
+    print(f"  store_document {writers * writes_per_writer / write_seconds:8.0f} writes/s with {writers} concurrent writers")
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--reads", type=int, default=2000, help="Sequential get_document calls")
+    parser.add_argument("--writers", type=int, default=16, help="Concurrent tasks storing documents")
+    parser.add_argument("--writes-per-writer", type=int, default=25)
+    parser.add_argument("--documents", type=int, default=20)
+    parser.add_argument("--pages", type=int, default=20, help="Pages per seeded document")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        seeded = os.path.join(workdir, "seed.db")
+        ids = await seed(seeded, args.documents, args.pages, 12)
+        for label, cls in [("per-call connections", PerCallRepository), ("pooled connections (WAL)", SQLiteDocumentRepository)]:
+            db_path = os.path.join(workdir, f"{cls.__name__}.db")
+            shutil.copy(seeded, db_path)
+            await run(label, cls(db_path), ids, args.reads, args.writers, args.writes_per_writer)
+        for path, stats in sqlite_pool_stats().items():
+            print(f"pool: {stats['connects_total']} connections opened, {stats['checked_in']} idle at the end")
+        await dispose_sqlite_engines()
+
+if __name__ == "__main__":
+    asyncio.run(main())
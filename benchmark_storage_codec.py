@@ -0,0 +1,170 @@
+# benchmark_storage_codec.py
+"""Compare database size and decode time of the storage codecs.
+
+Blocks come from the PDFs in pdf/ (local text extraction), every other one,
+copied into as many documents as asked for; each document also gets a chat
+conversation. "legacy" writes plain JSON text and decodes it with parse_raw,
+as the repositories did before the codec; the others write codec blobs.
+msgpack and zstd rows are skipped unless msgpack and zstandard are installed.
+Dictionaries are trained on documents made of the remaining blocks, so they
+are measured on text they have not seen.
+
+    python benchmark_storage_codec.py --documents 50
+"""
+import argparse
+import asyncio
+import glob
+import os
+import sqlite3
+import tempfile
+import time
+
+from src.models.base.document import Document
+from src.models.conversation.conversation import Conversation
+from src.models.conversation.message import Message, MessageRole
+from src.models.viewer.block import Block
+from src.repositories import codec as codec_module
+from src.repositories.codec import CodecOptions, StorageCodec, msgpack_available, zstd_available, train_dictionary
+from src.repositories.implementations.sqlite_conversation_repository import SQLiteConversationRepository
+from src.repositories.implementations.sqlite_document_repository import SQLiteDocumentRepository
+from src.repositories.sqlite_engine import dispose_sqlite_engines
+from src.services.document.marker_service import pages_and_blocks_from_marker_json
+from src.services.document.pdf_text_extractor import extract_marker_json
+
+MESSAGES_PER_CONVERSATION = 20
+
+class LegacyCodec(StorageCodec):
+    """What the repositories wrote before the codec: JSON text"""
+    def encode(self, value) -> str:
+        return self.serialize(value).decode()
+
+def source_documents() -> tuple:
+    """Marker-shaped output of every PDF in pdf/, split into documents of alternate blocks"""
+    training, measured = [], []
+    for path in sorted(glob.glob(os.path.join(os.path.dirname(__file__) or ".", "pdf", "*.pdf"))):
+        with open(path, "rb") as f:
+            pages = extract_marker_json(f.read())["children"]
+        for documents, start in ((training, 0), (measured, 1)):
+            documents.append({"children": [{**page, "children": (page.get("children") or [])[start::2]} for page in pages]})
+    return training, measured
+
+def conversation_messages(conversation_id: str, blocks: list) -> list:
+    """A chat thread quoting the document's blocks"""
+    messages, parent_id = [], None
+    for n in range(MESSAGES_PER_CONVERSATION):
+        block = blocks[n % len(blocks)]
+        role = MessageRole.USER if n % 2 == 0 else MessageRole.ASSISTANT
+        content = f"What does this passage mean? {block.html_content}" if role == MessageRole.USER else \
+            f"The passage explains the following. {block.html_content} In short, it is about {block.block_type}."
+        message = Message(conversation_id=conversation_id, role=role, content=content, parent_id=parent_id, block_id=block.id)
+        messages.append(message)
+        parent_id = message.id
+    return messages
+
+async def seed(db_path: str, outputs: list, documents: int) -> dict:
+    """Store the corpus; returns document and conversation IDs and the write time"""
+    documents_repo = SQLiteDocumentRepository(db_path)
+    conversations_repo = SQLiteConversationRepository(db_path)
+    ids, conversation_ids, blocks_total = [], [], 0
+    started = time.perf_counter()
+    for n in range(documents):
+        document = Document(user_id="benchmark", status="READY")
+        pages, blocks = pages_and_blocks_from_marker_json(outputs[n % len(outputs)], document.id)
+        await documents_repo.store_document(document)
+        await documents_repo.store_pages_and_blocks(pages, blocks)
+        conversation = Conversation(document_id=document.id)
+        await conversations_repo.create_conversation(conversation)
+        for message in conversation_messages(conversation.id, blocks):
+            await conversations_repo.add_message(message)
+        ids.append(document.id)
+        conversation_ids.append(conversation.id)
+        blocks_total += len(blocks)
+    return {"ids": ids, "conversations": conversation_ids, "blocks": blocks_total, "write_seconds": time.perf_counter() - started}
+
+def sizes(db_path: str) -> dict:
+    with sqlite3.connect(db_path) as db:
+        db.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+        db.execute("VACUUM")
+        return {
+            "file": os.path.getsize(db_path),
+            "blocks": db.execute("SELECT SUM(LENGTH(data)) FROM blocks").fetchone()[0],
+            "messages": db.execute("SELECT SUM(LENGTH(data)) FROM messages").fetchone()[0],
+        }
+
+def decode_seconds(db_path: str, legacy: bool) -> float:
+    """Time to decode every stored block into a model, without the SQL"""
+    with sqlite3.connect(db_path) as db:
+        rows = [row[0] for row in db.execute("SELECT data FROM blocks")]
+    started = time.perf_counter()
+    for row in rows:
+        if legacy:
+            Block.parse_raw(row)
+        else:
+            codec_module.decode_model(Block, row)
+    return time.perf_counter() - started
+
+async def read_seconds(db_path: str, seeded: dict) -> tuple:
+    """Time to load every document's blocks and every conversation's messages through the repositories"""
+    documents_repo = SQLiteDocumentRepository(db_path)
+    conversations_repo = SQLiteConversationRepository(db_path)
+    started = time.perf_counter()
+    for document_id in seeded["ids"]:
+        await documents_repo.get_blocks(document_id)
+    blocks = time.perf_counter() - started
+    started = time.perf_counter()
+    for conversation_id in seeded["conversations"]:
+        await conversations_repo.get_messages(conversation_id)
+    return blocks, time.perf_counter() - started
+
+async def dictionary_for(outputs: list, workdir: str, fmt: str) -> str:
+    """Train a dictionary on the payloads of a database seeded with other documents"""
+    db_path = os.path.join(workdir, f"{fmt}-training.db")
+    await seed(db_path, outputs, len(outputs))
+    await dispose_sqlite_engines(db_path)
+    serializer = StorageCodec(CodecOptions(format=fmt, compression="none"))
+    with sqlite3.connect(db_path) as db:
+        rows = [row[0] for row in db.execute("SELECT data FROM blocks UNION ALL SELECT data FROM messages")]
+    samples = [serializer.serialize(codec_module.decode_blob(row)) for row in rows]
+    path = os.path.join(workdir, f"{fmt}-dictionaries", f"storage{codec_module.DICTIONARY_SUFFIX}")
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "wb") as f:
+        f.write(train_dictionary(samples))
+    return path
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--documents", type=int, default=50, help="Documents (each with a conversation) per database")
+    args = parser.parse_args()
+
+    training, outputs = source_documents()
+    runs = [("legacy", None), ("json", CodecOptions(format="json", compression="none"))]
+    formats = ["json"] + (["msgpack"] if msgpack_available() else [])
+    if msgpack_available():
+        runs.append(("msgpack", CodecOptions(format="msgpack", compression="none")))
+    if zstd_available():
+        runs += [(f"{fmt}+zstd", CodecOptions(format=fmt, compression="zstd")) for fmt in formats]
+        runs += [(f"{fmt}+zstd+dict", CodecOptions(format=fmt, compression="zstd", dictionary="train")) for fmt in formats]
+    else:
+        print("zstandard is not installed; skipping compressed codecs (pip install zstandard)")
+
+    print(f"{'codec':<18} {'db size':>10} {'blocks':>10} {'messages':>10} {'writes':>8} {'decode/block':>13} {'get_blocks':>11} {'get_messages':>13}")
+    with tempfile.TemporaryDirectory() as workdir:
+        for label, options in runs:
+            db_path = os.path.join(workdir, f"{label}.db")
+            if options and options.dictionary == "train":
+                codec_module._codec = LegacyCodec(CodecOptions(compression="none"))
+                options.dictionary = await dictionary_for(training, workdir, options.format)
+            # Swap the process-wide codec for this run
+            codec_module._codec = LegacyCodec(CodecOptions(compression="none")) if options is None else StorageCodec(options)
+            seeded = await seed(db_path, outputs, args.documents)
+            blocks_read, messages_read = await read_seconds(db_path, seeded)
+            await dispose_sqlite_engines(db_path)
+            size = sizes(db_path)
+            decode = decode_seconds(db_path, legacy=options is None)
+            print(f"{label:<18} {size['file'] / 1e6:8.2f}MB {size['blocks'] / 1e6:8.2f}MB {size['messages'] / 1e6:8.2f}MB "
+                  f"{seeded['write_seconds']:7.2f}s {decode / seeded['blocks'] * 1e6:11.1f}us "
+                  f"{blocks_read * 1e3:9.1f}ms {messages_read * 1e3:11.1f}ms")
+        await dispose_sqlite_engines()
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,91 @@
+# benchmark_upload_memory.py
+"""Measure peak Python memory while UploadService ingests PDFs concurrently.
+
+Runs N concurrent uploads of a generated file against marker_stub_server.py
+twice: once the old way (read the whole UploadFile, hash it, store the bytes,
+send the bytes to Marker) and once through UploadService's streaming path.
+tracemalloc's peak divided by N is the memory each upload costs; for the
+streaming path it should stay near the chunk size whatever the file size.
+
+    python benchmark_upload_memory.py --uploads 8 --size-mb 50
+"""
+import argparse
+import asyncio
+import hashlib
+import os
+import tempfile
+import tracemalloc
+
+from fastapi import UploadFile
+
+from src.repositories.implementations.local_storage_repository import LocalStorageRepository
+from src.repositories.implementations.sqlite_document_repository import SQLiteDocumentRepository
+from src.services.document.marker_service import MarkerService, close_marker_http_client, get_marker_http_client
+from src.services.document.marker_poller import MarkerPoller
+from src.services.document.upload_service import UploadService
+from marker_stub_server import run_in_subprocess
+
+def write_pdf(path: str, size: int) -> None:
+    """Random bytes with a few page objects, so page counting has something to find"""
+    with open(path, "wb") as f:
+        f.write(b"%PDF-1.7\n" + b"<< /Type /Page >>\n" * 10)
+        remaining = size
+        while remaining > 0:
+            chunk = os.urandom(min(remaining, 1024 * 1024))
+            f.write(chunk)
+            remaining -= len(chunk)
+
+def open_upload(path: str) -> UploadFile:
+    return UploadFile(file=open(path, "rb"), filename=os.path.basename(path))
+
+async def buffered_upload(service: UploadService, upload: UploadFile, document_id: str):
+    """What UploadService used to do: the whole PDF as one bytes object"""
+    file_data = await upload.read()
+    hashlib.sha256(file_data).hexdigest()
+    await service.storage_repo.store_file(file_data, document_id)
+    await service.marker.process_document(file_data, document_id)
+
+async def measure(label: str, uploads) -> None:
+    tracemalloc.start()
+    await asyncio.gather(*uploads)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    count = len(uploads)
+    print(f"{label:<10} peak {peak / 2**20:8.1f} MB total, {peak / count / 2**20:7.2f} MB per upload")
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--uploads", type=int, default=8, help="Concurrent uploads")
+    parser.add_argument("--size-mb", type=float, default=50, help="Size of each uploaded file")
+    parser.add_argument("--port", type=int, default=8766)
+    args = parser.parse_args()
+
+    server = run_in_subprocess(args.port, processing_seconds=0.2)
+    with tempfile.TemporaryDirectory() as workdir:
+        pdf_path = os.path.join(workdir, "input.pdf")
+        write_pdf(pdf_path, int(args.size_mb * 2**20))
+        marker = MarkerService(
+            api_key="benchmark",
+            marker_url=f"http://127.0.0.1:{args.port}/api/v1/marker",
+            poller=MarkerPoller(min_interval=0.1, max_interval=0.1, first_poll_fraction=0)
+        )
+        service = UploadService(
+            document_repository=SQLiteDocumentRepository(os.path.join(workdir, "benchmark.db")),
+            storage_repository=LocalStorageRepository(os.path.join(workdir, "storage")),
+            marker_service=marker,
+            deduplicate=False
+        )
+        get_marker_http_client()  # Build the shared client outside the measured region
+
+        try:
+            print(f"{args.uploads} concurrent uploads of {args.size_mb:g} MB")
+            await measure("buffered", [buffered_upload(service, open_upload(pdf_path), f"buffered-{i}")
+                                       for i in range(args.uploads)])
+            await measure("streaming", [service.upload(open_upload(pdf_path), user_id=f"user-{i}")
+                                        for i in range(args.uploads)])
+        finally:
+            await close_marker_http_client()
+            server.terminate()
+
+if __name__ == "__main__":
+    asyncio.run(main())
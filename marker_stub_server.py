@@ -0,0 +1,142 @@
+# marker_stub_server.py
+"""Local stand-in for the Datalab Marker API.
+
+Accepts the same multipart upload as https://www.datalab.to/api/v1/marker and
+returns a canned document (one page per page object in the PDF, or per page of
+the submitted page_range) after a configurable delay, so upload and polling
+code can be exercised without an API key or network access. If a webhook_url
+is submitted, it is POSTed {request_id, request_check_url} once the document
+is ready, like the real service.
+
+    uvicorn marker_stub_server:app --port 8001
+    MARKER_API_URL=http://127.0.0.1:8001/api/v1/marker uvicorn src.main:app
+"""
+import asyncio
+import os
+import re
+import subprocess
+import sys
+import time
+from typing import Optional
+from uuid import uuid4
+import httpx
+from fastapi import FastAPI, File, Form, HTTPException, Request, UploadFile
+
+PROCESSING_SECONDS = float(os.getenv("MARKER_STUB_PROCESSING_SECONDS", "1.0"))
+SECONDS_PER_PAGE = float(os.getenv("MARKER_STUB_SECONDS_PER_PAGE", "0"))
+PAGE_OBJECT = re.compile(rb"/Type\s*/Page(?![a-zA-Z])")
+# 1x1 PNG, base64 encoded the way Marker returns images
+PIXEL_PNG = "iVBORw0KGgoAAAANSUhEUgAAAAEAAAABCAYAAAAfFcSJAAAADUlEQVR42mP8z8BQDwAEhQGAhKmMIQAAAABJRU5ErkJggg=="
+
+app = FastAPI()
+requests_by_id: dict = {}
+
+def canned_page(index: int, page_number: int, size: int, first_page: int) -> dict:
+    """One page of Marker JSON; the document's first page opens its only section"""
+    header_id = "/page/0/SectionHeader/0"
+    children = []
+    if page_number == 0:
+        children.append({
+            "id": header_id,
+            "block_type": "SectionHeader",
+            "html": "<h1>Stub document</h1>",
+            "polygon": [[72, 72], [540, 72], [540, 100], [72, 100]],
+            "section_hierarchy": {"1": header_id},
+            "images": {}
+        })
+        children.append({
+            "id": f"/page/{index}/Picture/2",
+            "block_type": "Picture",
+            "html": "",
+            "polygon": [[72, 160], [540, 160], [540, 400], [72, 400]],
+            "section_hierarchy": {"1": header_id},
+            "images": {f"/page/{index}/Picture/2": PIXEL_PNG}
+        })
+    children.append({
+        "id": f"/page/{index}/Text/1",
+        "block_type": "Text",
+        "html": f"<p>Page {page_number} of an upload of {size} bytes.</p>",
+        "polygon": [[72, 110], [540, 110], [540, 140], [72, 140]],
+        # Like Marker, a page range only knows about sections opened within it
+        "section_hierarchy": {"1": header_id} if first_page == 0 else {},
+        "images": {}
+    })
+    return {
+        "id": f"/page/{index}/Page/0",
+        "block_type": "Page",
+        "html": "",
+        "polygon": [[0, 0], [612, 0], [612, 792], [0, 792]],
+        "children": children
+    }
+
+def canned_response(size: int, first_page: int = 0, page_count: int = 1) -> dict:
+    """Marker JSON output for page_count pages starting at first_page, numbered from 0"""
+    return {"children": [canned_page(index, first_page + index, size, first_page) for index in range(page_count)]}
+
+@app.post("/api/v1/marker")
+async def submit(
+    request: Request,
+    file: UploadFile = File(...),
+    output_format: str = Form("json"),
+    webhook_url: Optional[str] = Form(None),
+    page_range: Optional[str] = Form(None)
+):
+    if not request.headers.get("X-Api-Key"):
+        raise HTTPException(status_code=401, detail="Missing X-Api-Key")
+    size = 0
+    page_objects = 0
+    while chunk := await file.read(1024 * 1024):
+        size += len(chunk)
+        page_objects += len(PAGE_OBJECT.findall(chunk))
+    first_page, page_count = 0, max(page_objects, 1)
+    if page_range:
+        first, _, last = page_range.partition("-")
+        first_page, page_count = int(first), int(last or first) - int(first) + 1
+    request_id = str(uuid4())
+    requests_by_id[request_id] = {
+        "ready_at": time.monotonic() + PROCESSING_SECONDS + SECONDS_PER_PAGE * page_count,
+        "size": size,
+        "first_page": first_page,
+        "page_count": page_count
+    }
+    check_url = str(request.url_for("check", request_id=request_id))
+    if webhook_url:
+        asyncio.create_task(call_webhook(webhook_url, request_id, check_url, requests_by_id[request_id]["ready_at"]))
+    return {
+        "success": True,
+        "request_id": request_id,
+        "request_check_url": check_url
+    }
+
+async def call_webhook(webhook_url: str, request_id: str, check_url: str, ready_at: float):
+    await asyncio.sleep(ready_at - time.monotonic())
+    async with httpx.AsyncClient() as client:
+        await client.post(webhook_url, json={"request_id": request_id, "request_check_url": check_url})
+
+@app.get("/api/v1/marker/{request_id}")
+async def check(request_id: str):
+    entry = requests_by_id.get(request_id)
+    if entry is None:
+        raise HTTPException(status_code=404, detail="Unknown request")
+    if time.monotonic() < entry["ready_at"]:
+        await asyncio.sleep(0)
+        return {"status": "processing"}
+    return {"status": "complete", "success": True, "json": canned_response(entry["size"], entry["first_page"], entry["page_count"])}
+
+def run_in_subprocess(port: int, processing_seconds: float = 0.5, seconds_per_page: float = 0.0) -> subprocess.Popen:
+    """Start this server in its own process (so it doesn't share the caller's GIL) and wait until it's up"""
+    env = dict(os.environ,
+               MARKER_STUB_PROCESSING_SECONDS=str(processing_seconds),
+               MARKER_STUB_SECONDS_PER_PAGE=str(seconds_per_page))
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "marker_stub_server:app", "--port", str(port), "--log-level", "warning"],
+        env=env
+    )
+    for _ in range(100):
+        try:
+            httpx.get(f"http://127.0.0.1:{port}/docs", timeout=1)
+            return server
+        except httpx.TransportError:
+            time.sleep(0.1)
+    server.terminate()
+    raise RuntimeError("Marker stub server did not start")
@@ -1,6 +1,7 @@
 from functools import lru_cache
-from typing import Optional
-from fastapi import Depends
+from urllib.parse import urlencode
+from typing import Dict, Optional
+from fastapi import Depends, Header
 from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
 from sqlalchemy.orm import sessionmaker, declarative_base
 from sqlalchemy import Column, Integer
@@ -13,32 +14,138 @@ from src.repositories.interfaces.storage_repository import StorageRepository
 from src.repositories.interfaces.conversation_repository import ConversationRepository
 from src.repositories.interfaces.insight_repository import InsightRepository
 from src.repositories.implementations.sqlite_insight_repository import InsightModel
+from src.repositories.sqlite_engine import SQLitePoolOptions, configure_sqlite_engines, get_sqlite_engine
+from src.repositories.codec import CodecOptions, configure_codec
 from src.services.document.upload_service import UploadService
-from src.services.document.marker_service import MarkerService
+from src.services.document.marker_service import MarkerService, MarkerJobLimiter, configure_marker_job_limiter
+from src.services.document.marker_poller import MarkerPoller, configure_marker_poller
+from src.services.document.extraction_router import ExtractionRouter, create_extraction_router
 from src.services.conversation.chat_service import ChatService
 from src.services.ai.llm_service import LLMService
 from src.services.rumination.structured_insight_service import StructuredInsightService
+from src.services.rumination.rumination_estimator import RuminationEstimator
+from src.services.scheduling.admission_controller import AdmissionController
+from src.services.scheduling.llm_scheduler import LLMScheduler, LLMLane
+from src.services.scheduling.bulkhead import Bulkhead, DBBudgetLease, Workload, configure_bulkheads, workload_context
 from src.config import get_settings, Settings
 
 # Global instances
 repository_factory = RepositoryFactory()
 db_session_factory = None
+admission_controllers: Dict[str, AdmissionController] = {}
+llm_scheduler: Optional[LLMScheduler] = None
+extraction_router: Optional[ExtractionRouter] = None
+
+# Service time assumed for each endpoint class until real samples arrive
+ADMISSION_DEFAULT_SERVICE_SECONDS = {
+    "upload": 60.0,
+    "rumination": 300.0,
+    "chat": 5.0
+}
+
+def initialize_bulkheads():
+    """Called on app startup to reserve resources per workload class"""
+    settings = get_settings()
+    configure_bulkheads({
+        Workload.CHAT: Bulkhead(
+            Workload.CHAT,
+            llm_concurrency=settings.chat_llm_concurrency,
+            db_connections=settings.chat_db_connections,
+            thread_pool_size=settings.chat_thread_pool_size
+        ),
+        Workload.RUMINATION: Bulkhead(
+            Workload.RUMINATION,
+            llm_concurrency=settings.rumination_llm_concurrency,
+            db_connections=settings.rumination_db_connections,
+            thread_pool_size=settings.rumination_thread_pool_size
+        )
+    })
+
+def initialize_marker_poller():
+    """Called on app startup to configure the shared Marker poller and job limit"""
+    settings = get_settings()
+    configure_marker_job_limiter(MarkerJobLimiter(max_jobs=settings.marker_max_concurrent_jobs))
+    configure_marker_poller(MarkerPoller(
+        min_interval=settings.marker_poll_min_interval,
+        max_interval=settings.marker_poll_max_interval,
+        max_wait_seconds=settings.marker_max_wait_seconds,
+        callback_fallback_interval=settings.marker_webhook_fallback_poll_seconds
+    ))
+
+def get_marker_webhook_url(settings: Settings) -> Optional[str]:
+    """Webhook URL handed to Marker, carrying the shared secret if one is set"""
+    if not settings.marker_webhook_url:
+        return None
+    if not settings.marker_webhook_secret:
+        return settings.marker_webhook_url
+    separator = "&" if "?" in settings.marker_webhook_url else "?"
+    return f"{settings.marker_webhook_url}{separator}{urlencode({'secret': settings.marker_webhook_secret})}"
+
+def initialize_codec():
+    """Configure how repositories encode what they store"""
+    settings = get_settings()
+    configure_codec(CodecOptions(
+        format=settings.storage_format,
+        compression=settings.storage_compression,
+        level=settings.storage_compression_level,
+        dictionary=settings.storage_zstd_dictionary
+    ))
+
+class BudgetedSession(AsyncSession):
+    """AsyncSession that holds a connection from the current workload's DB budget while a transaction is open.
+
+    The slot is taken on the first statement and given back on commit,
+    rollback or close, so a chat request does not hold one through its LLM call.
+    """
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._budget = DBBudgetLease()
+
+    async def execute(self, *args, **kwargs):
+        await self._budget.acquire()
+        return await super().execute(*args, **kwargs)
+
+    async def commit(self):
+        try:
+            await super().commit()
+        finally:
+            self._budget.release()
+
+    async def rollback(self):
+        try:
+            await super().rollback()
+        finally:
+            self._budget.release()
+
+    async def close(self):
+        try:
+            await super().close()
+        finally:
+            self._budget.release()
 
 async def initialize_repositories():
     """Called on app startup to initialize repositories"""
     global db_session_factory
     
     settings = get_settings()
+    initialize_codec()
     
     # Initialize session factory if using a database
     if settings.document_storage_type in ["rds", "sqlite"]:
         if settings.document_storage_type == "rds":
             url = f"postgresql+asyncpg://{settings.db_user}:{settings.db_password}@{settings.db_host}:{settings.db_port}/db"
-        else:  # sqlite
-            url = f"sqlite+aiosqlite:///{settings.db_path}"
-            
-        engine = create_async_engine(url)
-        db_session_factory = sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+            engine = create_async_engine(url)
+        else:  # sqlite: one pool per database file, shared with the repositories
+            configure_sqlite_engines(SQLitePoolOptions(
+                pool_size=settings.sqlite_pool_size,
+                max_overflow=settings.sqlite_max_overflow,
+                busy_timeout_ms=settings.sqlite_busy_timeout_ms,
+                mmap_size_mb=settings.sqlite_mmap_size_mb,
+                cache_size_mb=settings.sqlite_cache_size_mb
+            ))
+            engine = get_sqlite_engine(settings.db_path)
+
+        db_session_factory = sessionmaker(engine, class_=BudgetedSession, expire_on_commit=False)
         
         # Import all models that need tables created
         from src.repositories.implementations.sqlite_insight_repository import InsightModel
@@ -61,7 +168,9 @@ async def initialize_repositories():
         aws_access_key=settings.aws_access_key,
         aws_secret_key=settings.aws_secret_key,
         s3_bucket=settings.s3_bucket,
-        session_factory=db_session_factory
+        session_factory=db_session_factory,
+        document_cache_max_bytes=settings.document_cache_max_mb * 1024 * 1024,
+        document_cache_ttl=settings.document_cache_ttl_seconds
     )
 
 async def get_db() -> Optional[AsyncSession]:
@@ -95,12 +204,65 @@ def get_conversation_repository() -> ConversationRepository:
 def get_marker_service() -> MarkerService:
     """Dependency for marker service"""
     settings = get_settings()
-    return MarkerService(api_key=settings.datalab_api_key)
+    return MarkerService(
+        api_key=settings.datalab_api_key,
+        marker_url=settings.marker_api_url,
+        webhook_url=get_marker_webhook_url(settings),
+        shard_pages=settings.marker_shard_pages
+    )
+
+def get_extraction_router() -> ExtractionRouter:
+    """Get the shared policy that picks local extraction or Marker per document"""
+    global extraction_router
+    if extraction_router is None:
+        settings = get_settings()
+        extraction_router = create_extraction_router(
+            settings.document_processor,
+            max_workers=settings.local_extraction_workers,
+            min_chars_per_page=settings.local_min_chars_per_page
+        )
+    return extraction_router
+
+def get_current_user_id(x_user_id: Optional[str] = Header(None)) -> str:
+    """Dependency for the requesting user's ID"""
+    # For testing purposes, fall back to the fixed test user
+    return x_user_id or "test_user"
+
+def get_llm_scheduler() -> LLMScheduler:
+    """Get the shared fair-queuing scheduler for LLM calls"""
+    global llm_scheduler
+    if llm_scheduler is None:
+        settings = get_settings()
+        llm_scheduler = LLMScheduler(
+            max_concurrency=settings.llm_max_concurrency,
+            lane_limits={
+                LLMLane.INTERACTIVE: settings.chat_llm_concurrency,
+                LLMLane.BATCH: settings.rumination_llm_concurrency
+            },
+            daily_token_quota=settings.user_daily_token_quota,
+            max_concurrent_jobs=settings.user_max_concurrent_jobs
+        )
+    return llm_scheduler
+
+def get_llm_service(user_id: str = Depends(get_current_user_id)) -> LLMService:
+    """Dependency for LLM service on the interactive lane"""
+    settings = get_settings()
+    return LLMService(
+        api_key=settings.openai_api_key,
+        scheduler=get_llm_scheduler(),
+        user_id=user_id,
+        lane=LLMLane.INTERACTIVE
+    )
 
-def get_llm_service() -> LLMService:
-    """Dependency for LLM service"""
+def get_batch_llm_service(user_id: str = Depends(get_current_user_id)) -> LLMService:
+    """Dependency for LLM service on the batch lane"""
     settings = get_settings()
-    return LLMService(api_key=settings.openai_api_key)
+    return LLMService(
+        api_key=settings.openai_api_key,
+        scheduler=get_llm_scheduler(),
+        user_id=user_id,
+        lane=LLMLane.BATCH
+    )
 
 def get_insight_repository() -> InsightRepository:
     """Dependency for insight repository"""
@@ -116,16 +278,44 @@ def get_insight_service(
         insight_repository=insight_repository
     )
 
+def get_rumination_insight_service(
+    llm_service: LLMService = Depends(get_batch_llm_service),
+    insight_repository: InsightRepository = Depends(get_insight_repository)
+) -> StructuredInsightService:
+    """Dependency for insight service used by batch rumination"""
+    return StructuredInsightService(
+        llm_service=llm_service,
+        insight_repository=insight_repository
+    )
+
+def get_rumination_estimator(
+    insight_service: StructuredInsightService = Depends(get_rumination_insight_service)
+) -> RuminationEstimator:
+    """Dependency for rumination cost and time estimator"""
+    settings = get_settings()
+    return RuminationEstimator(
+        prompts=insight_service.prompts,
+        model=insight_service.llm_service.CHAT_MODEL,
+        seconds_per_call=settings.rumination_seconds_per_call
+    )
+
 def get_upload_service(
     document_repository: DocumentRepository = Depends(get_document_repository),
     storage_repository: StorageRepository = Depends(get_storage_repository),
-    marker_service: MarkerService = Depends(get_marker_service)
+    marker_service: MarkerService = Depends(get_marker_service),
+    extraction_router: ExtractionRouter = Depends(get_extraction_router)
 ) -> UploadService:
     """Dependency for upload service that composes other dependencies"""
+    settings = get_settings()
     return UploadService(
         document_repository=document_repository,
         storage_repository=storage_repository,
-        marker_service=marker_service
+        marker_service=marker_service,
+        # Insight storage is only needed (and only available with sqlite) when cloning insights
+        insight_repository=repository_factory.insight_repository if settings.upload_dedup_clone_insights else None,
+        deduplicate=settings.upload_deduplicate,
+        clone_insights=settings.upload_dedup_clone_insights,
+        extraction_router=extraction_router
     )
 
 def get_chat_service(
@@ -134,4 +324,22 @@ def get_chat_service(
     llm_service: LLMService = Depends(get_llm_service)
 ) -> ChatService:
     """Dependency for chat service"""
-    return ChatService(conversation_repository, document_repository, llm_service)
\ No newline at end of file
+    return ChatService(conversation_repository, document_repository, llm_service)
+
+def get_admission_controller(workload: str) -> AdmissionController:
+    """Get the shared admission controller for an endpoint class"""
+    if workload not in admission_controllers:
+        settings = get_settings()
+        admission_controllers[workload] = AdmissionController(
+            workload=workload,
+            max_concurrency=getattr(settings, f"{workload}_max_concurrency"),
+            max_queue_depth=getattr(settings, f"{workload}_max_queue_depth"),
+            default_service_seconds=ADMISSION_DEFAULT_SERVICE_SECONDS[workload]
+        )
+    return admission_controllers[workload]
+
+async def admit_chat():
+    """Hold a chat admission slot and run the request in the chat bulkhead"""
+    async with get_admission_controller("chat").admit():
+        with workload_context(Workload.CHAT):
+            yield
@@ -0,0 +1,39 @@
+from fastapi import APIRouter, Depends, HTTPException, Request, Response
+from typing import Optional
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from src.api.dependencies import get_document_repository, get_storage_repository, get_db
+from src.repositories.interfaces.document_repository import DocumentRepository
+from src.repositories.interfaces.storage_repository import StorageRepository
+from src.services.document.block_images import load_block_image, media_type
+
+router = APIRouter(prefix="/blocks", tags=["blocks"])
+
+# Images are addressed by content hash, so a fetched image never changes
+IMAGE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+@router.get("/{block_id}/images/{name:path}")
+async def get_block_image(
+    block_id: str,
+    name: str,
+    request: Request,
+    document_repository: DocumentRepository = Depends(get_document_repository),
+    storage_repository: StorageRepository = Depends(get_storage_repository),
+    session: Optional[AsyncSession] = Depends(get_db)
+) -> Response:
+    """Serve one of a block's images with long-lived cache headers"""
+    block = await document_repository.get_block(block_id, session)
+    if not block:
+        raise HTTPException(status_code=404, detail="Block not found")
+
+    # The reference is the content hash, so revalidation needs no trip to storage
+    digest = (block.image_refs or {}).get(name)
+    if digest and request.headers.get("if-none-match") == f'"{digest}"':
+        return Response(status_code=304, headers={"Cache-Control": IMAGE_CACHE_CONTROL, "ETag": f'"{digest}"'})
+
+    image = await load_block_image(block, name, storage_repository, session)
+    if image is None:
+        raise HTTPException(status_code=404, detail="Image not found")
+    data, digest = image
+    headers = {"Cache-Control": IMAGE_CACHE_CONTROL, "ETag": f'"{digest}"'}
+    return Response(content=data, media_type=media_type(data), headers=headers)
@@ -6,7 +6,7 @@ from pydantic import BaseModel
 from src.models.conversation.conversation import Conversation
 from src.models.conversation.message import Message
 from src.services.conversation.chat_service import ChatService
-from src.api.dependencies import get_chat_service, get_db
+from src.api.dependencies import get_chat_service, get_db, admit_chat
 
 router = APIRouter(prefix="/conversations", tags=["conversations"])
 
@@ -51,7 +51,7 @@ async def get_conversation_thread(
     except ValueError as e:
         raise HTTPException(status_code=404, detail=str(e))
 
-@router.post("/{conversation_id}/messages", response_model=tuple[Message, str])
+@router.post("/{conversation_id}/messages", response_model=tuple[Message, str], dependencies=[Depends(admit_chat)])
 async def send_message(
     conversation_id: str,
     request: SendMessageRequest,
@@ -87,7 +87,7 @@ async def get_block_conversations(
     """Get all conversations for a block"""
     return await chat_service.get_block_conversations(block_id, session)
 
-@router.put("/{conversation_id}/messages/{message_id}", response_model=tuple[Message, str])
+@router.put("/{conversation_id}/messages/{message_id}", response_model=tuple[Message, str], dependencies=[Depends(admit_chat)])
 async def edit_message(
     conversation_id: str,
     message_id: str,
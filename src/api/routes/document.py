@@ -1,26 +1,212 @@
-from fastapi import APIRouter, UploadFile, File, Depends, HTTPException
-from typing import Optional, List
+from fastapi import APIRouter, UploadFile, File, Depends, HTTPException, Body, Query, Request
+from fastapi.responses import StreamingResponse
+from typing import Optional, List, Dict
+import asyncio
+import hmac
+import json
+import logging
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from src.services.document.upload_service import UploadService
-from src.api.dependencies import get_upload_service, get_document_repository, get_db
+from src.api.dependencies import (
+    get_upload_service, get_document_repository, get_storage_repository, get_marker_service, get_extraction_router, get_db,
+    get_admission_controller, get_batch_llm_service, get_insight_repository, get_rumination_insight_service,
+    get_current_user_id
+)
+from src.api.routes.insights import launch_rumination
 from src.repositories.interfaces.document_repository import DocumentRepository
-from src.models.viewer.block import Block
-from src.models.base.document import Document
+from src.models.viewer.block import Block, BlockSearchResult
+from src.models.base.document import Document, DocumentStatus
+from src.services.document.marker_poller import get_marker_poller
+from src.services.scheduling.admission_controller import AdmissionTicket, AdmissionRejected
+from src.services.scheduling.llm_scheduler import QuotaExceeded
+from src.config import get_settings
+
+logger = logging.getLogger(__name__)
 
 document_router = APIRouter(prefix="/documents")
 
-@document_router.post("/")
+TERMINAL_STATUSES = {DocumentStatus.READY, DocumentStatus.ERROR}
+# Statuses a document can be left in if the process stops mid-pipeline
+RESUMABLE_STATUSES = [DocumentStatus.PENDING, DocumentStatus.PROCESSING_MARKER]
+_upload_tasks: Dict[str, asyncio.Task] = {}  # Background pipeline for each document being processed
+MAX_BLOCKS_PER_REQUEST = 1000
+MAX_SEARCH_RESULTS = 100
+
+@document_router.post("/", status_code=202)
 async def upload_document(
     file: UploadFile = File(...),
     upload_service: UploadService = Depends(get_upload_service),
     session: Optional[AsyncSession] = Depends(get_db)
 ) -> Document:
-    """Upload a new document"""
-    # For testing purposes, using a fixed user_id
-    doc = await upload_service.upload(file, session, user_id="test_user")
+    """Store a new document and process it in the background; poll /status for progress"""
+    # Reserve an upload slot up front so overload is rejected with 429; the pipeline holds it
+    ticket = get_admission_controller("upload").admit()
+    try:
+        # For testing purposes, using a fixed user_id
+        doc = await upload_service.accept_upload(file, session, user_id="test_user")
+        if session:
+            await session.commit()  # The pipeline runs outside this request's session
+    except Exception:
+        ticket.cancel()
+        raise
+
+    if doc.status != DocumentStatus.PENDING:
+        # Deduplicated against an already processed upload
+        ticket.cancel()
+        return doc
+    _upload_tasks[doc.id] = asyncio.create_task(process_upload(upload_service, doc, ticket))
     return doc
 
+async def process_upload(upload_service: UploadService, document: Document, ticket: AdmissionTicket, resume: bool = False):
+    """Background pipeline: Marker, page and block storage, then optional auto-rumination"""
+    document_id = document.id
+    try:
+        async with ticket:
+            if resume:
+                document = await upload_service.resume_document(document)
+            else:
+                document = await upload_service.process_document(document)
+    except Exception as e:
+        logger.error(f"Background processing of document {document_id} failed: {e}")
+        return
+    finally:
+        _upload_tasks.pop(document_id, None)
+
+    if get_settings().upload_auto_ruminate:
+        await auto_ruminate(upload_service.document_repo, document)
+
+async def resume_interrupted_uploads() -> int:
+    """Restart the pipeline for documents a previous process left PENDING or PROCESSING_MARKER"""
+    upload_service = get_upload_service(
+        get_document_repository(), get_storage_repository(), get_marker_service(), get_extraction_router()
+    )
+    documents = await upload_service.document_repo.get_documents_by_status([status.value for status in RESUMABLE_STATUSES])
+    if documents:
+        logger.info(f"Resuming processing of {len(documents)} interrupted uploads")
+    for document in documents:
+        if document.id in _upload_tasks:
+            continue
+        ticket = await _admit_when_possible("upload")
+        _upload_tasks[document.id] = asyncio.create_task(process_upload(upload_service, document, ticket, resume=True))
+    return len(documents)
+
+async def _admit_when_possible(workload: str) -> AdmissionTicket:
+    """Queue for admission, waiting out rejections instead of failing"""
+    while True:
+        try:
+            return get_admission_controller(workload).admit()
+        except AdmissionRejected as e:
+            await asyncio.sleep(e.retry_after)
+
+async def auto_ruminate(document_repository: DocumentRepository, document: Document):
+    """Start a rumination for a freshly processed document on the owner's batch lane"""
+    insight_service = get_rumination_insight_service(
+        llm_service=get_batch_llm_service(document.user_id),
+        insight_repository=get_insight_repository()
+    )
+    blocks = await document_repository.get_blocks(document.id)
+    if not blocks:
+        return
+    try:
+        launch_rumination(document.id, blocks, insight_service)
+    except (AdmissionRejected, QuotaExceeded) as e:
+        logger.warning(f"Skipping auto-rumination of document {document.id}: {e}")
+
+@document_router.post("/marker/webhook")
+async def marker_webhook(
+    payload: dict = Body(...),
+    secret: Optional[str] = Query(None)
+):
+    """Receive a Marker completion callback and fetch the result right away"""
+    expected_secret = get_settings().marker_webhook_secret
+    if expected_secret and not hmac.compare_digest(secret or "", expected_secret):
+        raise HTTPException(status_code=403, detail="Invalid webhook secret")
+    # The callback only tells us to look; the result itself is fetched from Marker
+    matched = get_marker_poller().notify(
+        check_url=payload.get("request_check_url"),
+        request_id=payload.get("request_id")
+    )
+    return {"matched": matched}
+
+async def document_status_event_generator(request: Request, document_repository: DocumentRepository, document_id: str):
+    """Generate SSE events whenever a document's processing status changes"""
+    last_event = None
+    while not await request.is_disconnected():
+        doc = await document_repository.get_document(document_id)
+        if doc is None:
+            yield f"data: {json.dumps({'document_id': document_id, 'error': 'Document not found'})}\n\n"
+            break
+        # Sharded jobs publish pages while still processing, so progress is an event too
+        if (doc.status, doc.pages_processed) != last_event:
+            last_event = (doc.status, doc.pages_processed)
+            yield f"data: {json.dumps(document_status(doc))}\n\n"
+        if doc.status in TERMINAL_STATUSES:
+            break
+        await asyncio.sleep(1)
+
+def document_status(doc: Document) -> dict:
+    return {
+        "document_id": doc.id,
+        "status": doc.status,
+        "processing_error": doc.processing_error,
+        "page_count": doc.page_count,
+        "pages_processed": doc.pages_processed,
+        "updated_at": doc.updated_at.isoformat() if doc.updated_at else None
+    }
+
+@document_router.get("/search")
+async def search_documents(
+    q: str = Query(..., min_length=1, description="Words to find"),
+    limit: int = Query(20, ge=1, le=MAX_SEARCH_RESULTS),
+    user_id: str = Depends(get_current_user_id),
+    document_repository: DocumentRepository = Depends(get_document_repository),
+    session: Optional[AsyncSession] = Depends(get_db)
+) -> List[BlockSearchResult]:
+    """Search the blocks of all of the user's documents, best matches first"""
+    try:
+        return await document_repository.search_blocks(q, user_id=user_id, limit=limit, session=session)
+    except NotImplementedError as e:
+        raise HTTPException(status_code=501, detail=str(e))
+
+@document_router.get("/{document_id}/search")
+async def search_document(
+    document_id: str,
+    q: str = Query(..., min_length=1, description="Words to find"),
+    limit: int = Query(20, ge=1, le=MAX_SEARCH_RESULTS),
+    document_repository: DocumentRepository = Depends(get_document_repository),
+    session: Optional[AsyncSession] = Depends(get_db)
+) -> List[BlockSearchResult]:
+    """Search a document's blocks, best matches first, with the matched words in <mark> in each snippet"""
+    try:
+        return await document_repository.search_blocks(q, document_id=document_id, limit=limit, session=session)
+    except NotImplementedError as e:
+        raise HTTPException(status_code=501, detail=str(e))
+
+@document_router.get("/{document_id}/status")
+async def get_document_status(
+    document_id: str,
+    document_repository: DocumentRepository = Depends(get_document_repository),
+    session: Optional[AsyncSession] = Depends(get_db)
+) -> dict:
+    """Get a document's processing status without its pages or blocks"""
+    doc = await document_repository.get_document(document_id, session=session)
+    if not doc:
+        raise HTTPException(status_code=404, detail="Document not found")
+    return document_status(doc)
+
+@document_router.get("/{document_id}/status/stream")
+async def stream_document_status(
+    request: Request,
+    document_id: str,
+    document_repository: DocumentRepository = Depends(get_document_repository)
+) -> StreamingResponse:
+    """Stream processing status and page progress as Server-Sent Events until READY or ERROR"""
+    return StreamingResponse(
+        document_status_event_generator(request, document_repository, document_id),
+        media_type="text/event-stream"
+    )
+
 @document_router.get("/{document_id}")
 async def get_document(
     document_id: str,
@@ -45,14 +231,38 @@ async def get_pages(
         raise HTTPException(status_code=404, detail="Pages not found")
     return pages
 
+@document_router.get("/{document_id}/pages/{page_number}/blocks")
+async def get_page_blocks(
+    document_id: str,
+    page_number: int,
+    document_repository: DocumentRepository = Depends(get_document_repository),
+    session: Optional[AsyncSession] = Depends(get_db)
+) -> List[Block]:
+    """Get the blocks of one page (numbered from 0) in reading order"""
+    blocks = await document_repository.get_blocks_by_page_number(document_id, page_number, session)
+    if not blocks:
+        raise HTTPException(status_code=404, detail="Blocks not found")
+    return blocks
+
 @document_router.get("/{document_id}/blocks")
 async def get_blocks(
     document_id: str,
+    after: Optional[str] = Query(None, description="Return blocks after this block ID"),
+    limit: Optional[int] = Query(None, ge=1, le=MAX_BLOCKS_PER_REQUEST, description="Return at most this many blocks"),
     document_repository: DocumentRepository = Depends(get_document_repository),
     session: Optional[AsyncSession] = Depends(get_db)
 ) -> List[Block]:
-    """Get all blocks for a document"""
-    blocks = await document_repository.get_blocks(document_id, session)
-    if not blocks:
+    """Get a document's blocks in reading order, all at once or a page at a time.
+
+    With limit, pass the ID of the last block received as after to get the
+    next page; a page shorter than limit is the last one.
+    """
+    if after is None and limit is None:
+        blocks = await document_repository.get_blocks(document_id, session)
+    else:
+        blocks = await document_repository.get_blocks_after(document_id, after, limit or MAX_BLOCKS_PER_REQUEST, session)
+        if blocks is None:
+            raise HTTPException(status_code=404, detail=f"Block {after} not found")
+    if not blocks and after is None:
         raise HTTPException(status_code=404, detail="Blocks not found")
-    return blocks
\ No newline at end of file
+    return blocks
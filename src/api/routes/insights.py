@@ -1,14 +1,20 @@
 import logging
-from typing import List
+from typing import List, Optional
 from fastapi import APIRouter, Depends, HTTPException, Request
 from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
 import asyncio
 import json
+import time
 
 from src.services.rumination.structured_insight_service import StructuredInsightService
-from src.api.dependencies import get_insight_service, get_document_repository
+from src.services.rumination.rumination_estimator import RuminationEstimator
+from src.services.scheduling.admission_controller import AdmissionTicket, AdmissionRejected
+from src.services.scheduling.llm_scheduler import QuotaExceeded
+from src.services.scheduling.bulkhead import Workload, workload_context
+from src.api.dependencies import get_insight_service, get_rumination_insight_service, get_document_repository, get_rumination_estimator, get_admission_controller
 from src.models.rumination.structured_insight import StructuredInsight, Annotation
+from src.models.rumination.rumination_progress import RuminationProgress
 from src.repositories.interfaces.document_repository import DocumentRepository
 from src.models.viewer.block import Block
 
@@ -26,6 +32,7 @@ class AnalyzeBlockRequest(BaseModel):
 class RuminateRequest(BaseModel):
     document_id: str
     objective: str
+    dry_run: bool = False  # Only estimate calls, tokens, time and cost
 
 class RuminationStatus:
     PENDING = "pending"
@@ -34,6 +41,16 @@ class RuminationStatus:
 
 _rumination_status = {}  # Store status for each document
 _current_block = {}  # Store current block being processed for each document
+_rumination_progress = {}  # Store RuminationProgress for each document
+
+def get_rumination_state(document_id: str) -> dict:
+    """Current status, block and progress counters for a document's rumination"""
+    progress = _rumination_progress.get(document_id)
+    return {
+        'status': _rumination_status.get(document_id, RuminationStatus.PENDING),
+        'current_block_id': _current_block.get(document_id),
+        'progress': progress.to_event() if progress else None
+    }
 
 async def rumination_event_generator(request: Request, insight_service: StructuredInsightService, document_id: str):
     """Generate SSE events for rumination progress"""
@@ -46,12 +63,12 @@ async def rumination_event_generator(request: Request, insight_service: Structur
             # Get latest insights for the document
             insights = await insight_service.get_document_insights(document_id)
             
-            # Get current status and block
-            status = _rumination_status.get(document_id, RuminationStatus.PENDING)
-            current_block_id = _current_block.get(document_id)
+            # Get current status, block and progress counters
+            state = get_rumination_state(document_id)
+            status = state['status']
             
             # Send the insights and status as an SSE event
-            yield f"data: {json.dumps({'insights': [insight.dict() for insight in insights], 'status': status,'current_block_id': current_block_id})}\n\n"
+            yield f"data: {json.dumps({'insights': [insight.dict() for insight in insights], **state})}\n\n"
             
             # If complete or error, stop streaming
             if status in [RuminationStatus.COMPLETE, RuminationStatus.ERROR]:
@@ -78,62 +95,127 @@ async def stream_rumination(
         media_type="text/event-stream"
     )
 
+@router.get("/ruminate/{document_id}/status")
+async def get_rumination_status(document_id: str) -> dict:
+    """Get rumination status and progress without streaming insights"""
+    if document_id not in _rumination_status:
+        raise HTTPException(status_code=404, detail="No rumination found for document")
+    return {'document_id': document_id, **get_rumination_state(document_id)}
+
 @router.post("/ruminate")
 async def start_rumination(
     request: RuminateRequest,
-    insight_service: StructuredInsightService = Depends(get_insight_service),
-    document_repository: DocumentRepository = Depends(get_document_repository)
+    insight_service: StructuredInsightService = Depends(get_rumination_insight_service),
+    document_repository: DocumentRepository = Depends(get_document_repository),
+    estimator: RuminationEstimator = Depends(get_rumination_estimator)
 ) -> dict:
-    """Start the rumination process for a document"""
-    try:
-        logger.debug(f"Starting rumination for document_id: {request.document_id}")
-        logger.debug(f"Objective: {request.objective}")
-        
-        # Reset status for this document
-        _rumination_status[request.document_id] = RuminationStatus.PENDING
-        
-        # Get all blocks for the document
+    """Start the rumination process for a document, or estimate it when dry_run is set"""
+    if request.dry_run:
         blocks = await document_repository.get_blocks(request.document_id)
         if not blocks:
             raise HTTPException(status_code=404, detail="No blocks found for document")
-            
-        logger.debug(f"Found {len(blocks)} blocks to process")
-        
-        # Start async task to process blocks
-        asyncio.create_task(process_document_blocks(blocks, insight_service, request.document_id))
-        
-        return {"status": "started", "document_id": request.document_id}
+        return estimator.estimate(request.document_id, blocks).dict()
+
+    logger.debug(f"Starting rumination for document_id: {request.document_id}")
+    logger.debug(f"Objective: {request.objective}")
+
+    # Get all blocks for the document
+    blocks = await document_repository.get_blocks(request.document_id)
+    if not blocks:
+        raise HTTPException(status_code=404, detail="No blocks found for document")
+    logger.debug(f"Found {len(blocks)} blocks to process")
+
+    try:
+        launch_rumination(request.document_id, blocks, insight_service)
+    except (AdmissionRejected, QuotaExceeded):
+        raise
     except Exception as e:
-        _rumination_status[request.document_id] = RuminationStatus.ERROR
         logger.error(f"Error starting rumination: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
+    return {"status": "started", "document_id": request.document_id}
+
+def launch_rumination(document_id: str, blocks: List[Block], insight_service: StructuredInsightService) -> None:
+    """Start ruminating over a document's blocks in the background.
+
+    Raises QuotaExceeded or AdmissionRejected (both mapped to 429) if the user
+    or the service has no room for another rumination.
+    """
+    # Enforce the per-user job quota, then reserve a rumination slot so overload is rejected with 429
+    _begin_user_job(insight_service)
+    try:
+        ticket = get_admission_controller("rumination").admit()
+    except AdmissionRejected:
+        _end_user_job(insight_service)
+        raise
+    try:
+        # Reset status and progress for this document
+        _rumination_status[document_id] = RuminationStatus.PENDING
+        _rumination_progress.pop(document_id, None)
 
-async def process_document_blocks(blocks: List[Block], insight_service: StructuredInsightService, document_id: str):
+        # Start async task to process blocks
+        asyncio.create_task(process_document_blocks(blocks, insight_service, document_id, ticket))
+    except Exception:
+        ticket.cancel()
+        _end_user_job(insight_service)
+        _rumination_status[document_id] = RuminationStatus.ERROR
+        raise
+
+def _begin_user_job(insight_service: StructuredInsightService) -> None:
+    """Count a rumination against the user's concurrent job quota"""
+    llm_service = insight_service.llm_service
+    if llm_service.scheduler and llm_service.user_id:
+        llm_service.scheduler.begin_job(llm_service.user_id)
+
+def _end_user_job(insight_service: StructuredInsightService) -> None:
+    llm_service = insight_service.llm_service
+    if llm_service.scheduler and llm_service.user_id:
+        llm_service.scheduler.end_job(llm_service.user_id)
+
+async def process_document_blocks(blocks: List[Block], insight_service: StructuredInsightService, document_id: str, ticket: Optional[AdmissionTicket] = None):
     """Process all blocks in a document asynchronously"""
+    if ticket:
+        # Wait for a free rumination slot and hold it until all blocks are processed
+        try:
+            async with ticket:
+                with workload_context(Workload.RUMINATION):
+                    await process_document_blocks(blocks, insight_service, document_id)
+        finally:
+            _end_user_job(insight_service)
+        return
+
+    progress = RuminationProgress(blocks_total=len(blocks))
+    _rumination_progress[document_id] = progress
     try:
         logger.debug(f"Starting to process {len(blocks)} blocks")
-        for block in blocks:
-            if block.block_type and block.block_type.lower() == "text":
-                try:
-                    # Set current block being processed
-                    _current_block[document_id] = block.id
-                    logger.debug(f"Processing block {block.id} of type {block.block_type}")
-                    
-                    await insight_service.analyze_block(block)
-                    logger.debug(f"Processed block {block.id}")
-                except Exception as block_error:
-                    logger.error(f"Error processing block {block.id}: {str(block_error)}")
-                    continue
-            else:
-                logger.debug(f"Skipping non-text block {block.id} of type {block.block_type}")
+        text_blocks = [block for block in blocks if insight_service.should_analyze(block)]
+        progress.record_skipped(len(blocks) - len(text_blocks))
+        for block in text_blocks:
+            # Set current block being processed
+            _current_block[document_id] = block.id
+            logger.debug(f"Processing block {block.id} of type {block.block_type}")
+            started = time.monotonic()
+            tokens_before = insight_service.llm_service.tokens_used
+            try:
+                await insight_service.analyze_block(block)
+                progress.record_done(time.monotonic() - started, insight_service.llm_service.tokens_used - tokens_before)
+                logger.debug(f"Processed block {block.id}")
+            except QuotaExceeded:
+                # Out of quota for the day, so the remaining blocks would fail too
+                raise
+            except Exception as block_error:
+                progress.record_failed(time.monotonic() - started, insight_service.llm_service.tokens_used - tokens_before)
+                logger.error(f"Error processing block {block.id}: {str(block_error)}")
+                continue
         
         # Set status to complete after all blocks are processed
+        progress.finish()
         _rumination_status[document_id] = RuminationStatus.COMPLETE
         # Clear current block
         _current_block.pop(document_id, None)
         logger.debug(f"Completed rumination for document {document_id}")
     except Exception as e:
         logger.error(f"Error in process_document_blocks: {str(e)}", exc_info=True)
+        progress.finish()
         _rumination_status[document_id] = RuminationStatus.ERROR
         _current_block.pop(document_id, None)
 
@@ -155,6 +237,8 @@ async def get_block_insight(
         if not insight:
             raise HTTPException(status_code=404, detail="No insight found for block")
         return insight
+    except QuotaExceeded:
+        raise
     except Exception as e:
         logger.error(f"Error getting block insight for {block_id}: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
@@ -205,6 +289,8 @@ async def analyze_block(
             logger.error("Generated insight is missing document_id")
             
         return insight
+    except QuotaExceeded:
+        raise
     except ValueError as e:
         logger.error(f"Validation error analyzing block {request.block_id}: {str(e)}")
         raise HTTPException(status_code=400, detail=str(e))
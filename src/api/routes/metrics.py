@@ -0,0 +1,120 @@
+from fastapi import APIRouter
+from fastapi.responses import PlainTextResponse
+
+from src.api import dependencies
+from src.services.scheduling.bulkhead import get_bulkheads
+from src.services.document.marker_poller import get_marker_poller
+from src.services.document.marker_service import get_marker_job_limiter
+from src.repositories.sqlite_engine import sqlite_pool_stats
+from src.repositories.cache import cache_stats
+
+router = APIRouter(tags=["metrics"])
+
+def _format_metric(name: str, help_text: str, metric_type: str, samples: list) -> str:
+    """Format one metric family in Prometheus text exposition format"""
+    lines = [f"# HELP {name} {help_text}", f"# TYPE {name} {metric_type}"]
+    for labels, value in samples:
+        label_text = ",".join(f'{key}="{val}"' for key, val in labels.items())
+        lines.append(f"{name}{{{label_text}}} {value}" if label_text else f"{name} {value}")
+    return "\n".join(lines)
+
+def admission_metrics() -> list:
+    """Queue-depth gauges and counters for every admission controller"""
+    stats = [controller.stats() for controller in dependencies.admission_controllers.values()]
+    families = [
+        ("ruminate_admission_active", "Requests currently running", "gauge", "active"),
+        ("ruminate_admission_queued", "Requests waiting for a slot", "gauge", "queued"),
+        ("ruminate_admission_max_concurrency", "Configured concurrent request limit", "gauge", "max_concurrency"),
+        ("ruminate_admission_max_queue_depth", "Configured queue depth limit", "gauge", "max_queue_depth"),
+        ("ruminate_admission_avg_service_seconds", "EWMA of request service time", "gauge", "avg_service_seconds"),
+        ("ruminate_admission_admitted_total", "Requests admitted", "counter", "admitted_total"),
+        ("ruminate_admission_rejected_total", "Requests rejected with 429", "counter", "rejected_total"),
+    ]
+    return [
+        _format_metric(name, help_text, metric_type, [({"workload": s["workload"]}, s[key]) for s in stats])
+        for name, help_text, metric_type, key in families
+    ]
+
+def llm_scheduler_metrics() -> list:
+    """Per-lane queue depth and in-flight calls for the LLM scheduler"""
+    scheduler = dependencies.llm_scheduler
+    if scheduler is None:
+        return []
+    stats = scheduler.stats()
+    return [
+        _format_metric("ruminate_llm_queued", "LLM calls waiting for a slot", "gauge",
+                       [({"lane": lane}, count) for lane, count in stats["queued"].items()]),
+        _format_metric("ruminate_llm_in_flight", "LLM calls in progress", "gauge",
+                       [({"lane": lane}, count) for lane, count in stats["in_flight"].items()]),
+        _format_metric("ruminate_llm_active_jobs", "Rumination jobs per user", "gauge",
+                       [({"user_id": user_id}, count) for user_id, count in stats["active_jobs"].items()]),
+        _format_metric("ruminate_llm_tokens_today", "Tokens used per user in the current UTC day", "gauge",
+                       [({"user_id": user_id}, count) for user_id, count in stats["tokens_today"].items()]),
+    ]
+
+def bulkhead_metrics() -> list:
+    """DB connection budget usage per workload class"""
+    stats = [bulkhead.stats() for bulkhead in get_bulkheads().values()]
+    return [
+        _format_metric("ruminate_bulkhead_db_in_use", "DB connections held by the workload", "gauge",
+                       [({"workload": s["workload"]}, s["db_in_use"]) for s in stats]),
+        _format_metric("ruminate_bulkhead_db_connections", "DB connection budget of the workload", "gauge",
+                       [({"workload": s["workload"]}, s["db_connections"]) for s in stats]),
+    ]
+
+def marker_poller_metrics() -> list:
+    """In-flight Marker jobs, poll volume and observed completion times"""
+    stats = get_marker_poller().stats()
+    limiter = get_marker_job_limiter().stats()
+    return [
+        _format_metric("ruminate_marker_job_slots_in_use", "Marker jobs holding a slot of the global limit", "gauge",
+                       [({}, limiter["active"])]),
+        _format_metric("ruminate_marker_job_slots_waiting", "Marker jobs waiting for a slot", "gauge",
+                       [({}, limiter["waiting"])]),
+        _format_metric("ruminate_marker_jobs_in_flight", "Marker jobs awaiting completion", "gauge",
+                       [({}, stats["jobs_in_flight"])]),
+        _format_metric("ruminate_marker_polls_total", "Status polls sent to Marker", "counter",
+                       [({}, stats["polls_total"])]),
+        _format_metric("ruminate_marker_callbacks_total", "Completion webhooks matched to a job", "counter",
+                       [({}, stats["callbacks_total"])]),
+        _format_metric("ruminate_marker_completion_p50_seconds", "Median Marker completion time by page-count bucket", "gauge",
+                       [({"pages": bucket}, s["p50_seconds"]) for bucket, s in stats["completion_seconds"].items()]),
+    ]
+
+def sqlite_pool_metrics() -> list:
+    """Connection pool usage per SQLite database"""
+    stats = sqlite_pool_stats()
+    families = [
+        ("ruminate_sqlite_pool_size", "Connections the pool keeps open", "gauge", "size"),
+        ("ruminate_sqlite_pool_checked_out", "Pooled connections in use", "gauge", "checked_out"),
+        ("ruminate_sqlite_pool_checked_in", "Idle pooled connections", "gauge", "checked_in"),
+        ("ruminate_sqlite_pool_overflow", "Connections open beyond the pool size", "gauge", "overflow"),
+        ("ruminate_sqlite_connects_total", "Database connections opened", "counter", "connects_total"),
+    ]
+    return [
+        _format_metric(name, help_text, metric_type, [({"database": path}, s[key]) for path, s in stats.items()])
+        for name, help_text, metric_type, key in families
+    ]
+
+def cache_metrics() -> list:
+    """Size and hit rate of the in-process repository caches"""
+    stats = cache_stats()
+    families = [
+        ("ruminate_cache_entries", "Entries in the cache", "gauge", "entries"),
+        ("ruminate_cache_bytes", "Size of the cached entries", "gauge", "bytes"),
+        ("ruminate_cache_max_bytes", "Configured cache size limit", "gauge", "max_bytes"),
+        ("ruminate_cache_hits_total", "Lookups served from the cache", "counter", "hits"),
+        ("ruminate_cache_misses_total", "Lookups that went to the repository", "counter", "misses"),
+        ("ruminate_cache_evictions_total", "Entries evicted to stay under the size limit", "counter", "evictions"),
+        ("ruminate_cache_expirations_total", "Entries dropped after their TTL", "counter", "expirations"),
+        ("ruminate_cache_invalidations_total", "Entries dropped because their document was written", "counter", "invalidations"),
+    ]
+    return [
+        _format_metric(name, help_text, metric_type, [({"cache": cache}, s[key]) for cache, s in stats.items()])
+        for name, help_text, metric_type, key in families
+    ]
+
+@router.get("/metrics", response_class=PlainTextResponse)
+async def get_metrics() -> str:
+    """Expose service metrics in Prometheus text format"""
+    return "\n".join(admission_metrics() + llm_scheduler_metrics() + bulkhead_metrics() + marker_poller_metrics() + sqlite_pool_metrics() + cache_metrics()) + "\n"
@@ -0,0 +1,284 @@
+# src/cli.py
+"""Command-line tools for operating a Ruminate deployment.
+
+    python -m src.cli ingest course-pack/ --workers 8 --ruminate
+
+ingest runs every PDF in a directory through UploadService (Marker or local
+extraction, with the same storage and settings as the API), several at a
+time. Files are hashed first, so duplicates within the directory are
+processed once and documents the user already has are not processed again.
+Each outcome is appended to a JSON-lines manifest (a duplicate gets its
+original's outcome once the original finishes); running the command again
+skips files that are already READY and retries the rest.
+
+    python -m src.cli train-dictionary
+
+train-dictionary trains a zstd dictionary on a sample of the stored blocks
+and messages; point storage_zstd_dictionary at it to compress new rows with
+it (small blobs compress several times better with a dictionary).
+"""
+import argparse
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import sys
+import time
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
+
+from fastapi import UploadFile
+
+from src.api.dependencies import (
+    initialize_bulkheads, initialize_marker_poller, initialize_repositories, get_upload_service,
+    get_document_repository, get_storage_repository, get_marker_service, get_extraction_router,
+    get_rumination_insight_service, get_batch_llm_service, get_insight_repository, initialize_codec
+)
+from src.api.routes.insights import process_document_blocks, get_rumination_state, RuminationStatus
+from src.config import get_settings
+from src.models.base.document import Document, DocumentStatus
+from src.repositories.codec import get_codec, train_dictionary, DICTIONARY_SUFFIX
+from src.services.document.marker_service import close_marker_http_client
+from src.services.document.marker_poller import close_marker_poller
+from src.services.document.local_extraction_service import shutdown_extraction_pool
+from src.services.document.upload_service import UploadService, UPLOAD_CHUNK_SIZE
+from src.services.scheduling.bulkhead import Workload, workload_context, run_blocking
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MANIFEST = "ingest-manifest.jsonl"
+
+def hash_file(path: str) -> str:
+    """SHA-256 of a file, read in chunks"""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        while chunk := f.read(UPLOAD_CHUNK_SIZE):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def find_pdfs(directory: str, recursive: bool = False) -> List[str]:
+    """PDF paths relative to directory, in a stable order"""
+    if recursive:
+        paths = [os.path.join(root, name) for root, _, names in os.walk(directory) for name in names]
+    else:
+        paths = [os.path.join(directory, name) for name in os.listdir(directory)]
+    return sorted(
+        os.path.relpath(path, directory) for path in paths if path.lower().endswith(".pdf") and os.path.isfile(path)
+    )
+
+class Manifest:
+    """Append-only JSON-lines record of ingest outcomes, keyed by relative path (the last line wins)"""
+    def __init__(self, path: str):
+        self.path = path
+        self.entries: Dict[str, dict] = {}
+        if os.path.exists(path):
+            with open(path) as f:
+                for line in f:
+                    if line.strip():
+                        entry = json.loads(line)
+                        self.entries[entry["path"]] = entry
+
+    def record(self, entry: dict) -> None:
+        self.entries[entry["path"]] = entry
+        with open(self.path, "a") as f:
+            f.write(json.dumps(entry) + "\n")
+
+    def is_done(self, path: str, sha256: str, ruminate: bool) -> bool:
+        """Whether an unchanged file was already ingested (and ruminated, if asked for)"""
+        entry = self.entries.get(path)
+        if not entry or entry.get("sha256") != sha256 or entry.get("status") != DocumentStatus.READY:
+            return False
+        return not ruminate or entry.get("rumination") == RuminationStatus.COMPLETE
+
+@dataclass
+class IngestReport:
+    """Counters printed at the end of an ingest run"""
+    total: int = 0
+    processed: int = 0
+    reused: int = 0
+    skipped: int = 0
+    duplicates: int = 0
+    pages: int = 0
+    started_at: float = field(default_factory=time.monotonic)
+    failures: List[dict] = field(default_factory=list)
+
+    def summary(self) -> str:
+        minutes = max(time.monotonic() - self.started_at, 1e-9) / 60
+        lines = [
+            f"Ingested {self.processed} of {self.total} PDFs in {minutes * 60:.1f}s "
+            f"({self.skipped} already done, {self.reused} already stored, {self.duplicates} duplicates, "
+            f"{len(self.failures)} failed)",
+            f"Throughput: {self.processed / minutes:.1f} docs/min, {self.pages / minutes:.1f} pages/min"
+        ]
+        for failure in self.failures:
+            lines.append(f"  FAILED {failure['path']}: {failure['error']}")
+        return "\n".join(lines)
+
+async def ruminate(document: Document) -> str:
+    """Ruminate over a processed document on the batch lane and wait for it to finish"""
+    insight_service = get_rumination_insight_service(
+        llm_service=get_batch_llm_service(document.user_id),
+        insight_repository=get_insight_repository()
+    )
+    blocks = await get_document_repository().get_blocks(document.id)
+    if not blocks:
+        return RuminationStatus.ERROR
+    with workload_context(Workload.RUMINATION):
+        await process_document_blocks(blocks, insight_service, document.id)
+    return get_rumination_state(document.id)["status"]
+
+async def ingest_file(upload_service: UploadService, directory: str, path: str, sha256: str, user_id: str, ruminate_after: bool, previous: Optional[dict]) -> dict:
+    """Process one PDF (or just ruminate it, if that is all a previous run left undone)"""
+    started = time.monotonic()
+    entry = {"path": path, "sha256": sha256}
+    try:
+        document = None
+        if previous and previous.get("status") == DocumentStatus.READY and previous.get("sha256") == sha256:
+            document = await upload_service.document_repo.get_document(previous["document_id"])
+        if document is None:
+            existing = await upload_service.document_repo.get_document_by_hash(sha256)
+            if existing and existing.user_id == user_id and existing.status == DocumentStatus.READY:
+                document = existing
+        if document is None:
+            with open(os.path.join(directory, path), "rb") as f:
+                document = await upload_service.upload(UploadFile(file=f, filename=os.path.basename(path)), user_id=user_id)
+        else:
+            entry["reused"] = True
+
+        entry.update(document_id=document.id, status=document.status.value, pages=document.page_count or 0)
+        if document.status == DocumentStatus.ERROR:
+            entry["error"] = document.processing_error
+        elif ruminate_after:
+            entry["rumination"] = await ruminate(document)
+    except Exception as e:
+        entry.update(status=DocumentStatus.ERROR.value, error=str(e) or type(e).__name__)
+    entry["seconds"] = round(time.monotonic() - started, 2)
+    return entry
+
+async def ingest(directory: str, workers: int, manifest_path: Optional[str], user_id: str, ruminate_after: bool, recursive: bool) -> IngestReport:
+    """Process every PDF in a directory, workers at a time"""
+    paths = find_pdfs(directory, recursive)
+    manifest = Manifest(manifest_path or os.path.join(directory, DEFAULT_MANIFEST))
+    report = IngestReport(total=len(paths))
+    print(f"Hashing {len(paths)} PDFs in {directory}")
+
+    # Hash everything up front so duplicates in the batch are processed once;
+    # they are recorded with their original's outcome once it is known
+    first_by_hash: Dict[str, str] = {}
+    duplicates: Dict[str, List[str]] = {}
+    pending = []
+    for path in paths:
+        sha256 = await run_blocking(hash_file, os.path.join(directory, path))
+        if manifest.is_done(path, sha256, ruminate_after):
+            report.skipped += 1
+        elif sha256 in first_by_hash:
+            report.duplicates += 1
+            duplicates.setdefault(first_by_hash[sha256], []).append(path)
+        else:
+            first_by_hash[sha256] = path
+            pending.append((path, sha256))
+
+    upload_service = get_upload_service(
+        get_document_repository(), get_storage_repository(), get_marker_service(), get_extraction_router()
+    )
+    semaphore = asyncio.Semaphore(max(workers, 1))
+    done = 0
+
+    async def run(path: str, sha256: str) -> None:
+        nonlocal done
+        async with semaphore:
+            entry = await ingest_file(upload_service, directory, path, sha256, user_id, ruminate_after, manifest.entries.get(path))
+        manifest.record(entry)
+        outcome = {key: value for key, value in entry.items() if key not in ("seconds", "reused")}
+        for duplicate in duplicates.get(path, ()):
+            manifest.record({**outcome, "path": duplicate, "duplicate_of": path})
+        done += 1
+        if entry["status"] == DocumentStatus.ERROR:
+            report.failures.append(entry)
+        elif entry.get("reused"):
+            report.reused += 1
+        else:
+            report.processed += 1
+            report.pages += entry.get("pages", 0)
+        rumination = f", rumination {entry['rumination']}" if "rumination" in entry else ""
+        print(f"[{done}/{len(pending)}] {path}: {entry['status']}, "
+              f"{entry.get('pages', 0)} pages in {entry['seconds']:.1f}s{rumination}")
+
+    print(f"Processing {len(pending)} PDFs with {workers} workers "
+          f"({report.skipped} already done, {report.duplicates} duplicates)")
+    await asyncio.gather(*(run(path, sha256) for path, sha256 in pending))
+    return report
+
+async def _run_ingest(args: argparse.Namespace) -> int:
+    # Same startup as the API process, so settings, storage and limits all apply
+    initialize_bulkheads()
+    initialize_marker_poller()
+    await initialize_repositories()
+    try:
+        report = await ingest(args.directory, args.workers, args.manifest, args.user_id, args.ruminate, args.recursive)
+    finally:
+        await close_marker_poller()
+        await close_marker_http_client()
+        shutdown_extraction_pool()
+    print(report.summary())
+    return 1 if report.failures else 0
+
+def dictionary_samples(db_path: str, per_table: int) -> List[bytes]:
+    """Uncompressed payloads of randomly sampled blocks and messages"""
+    codec = get_codec()
+    samples = []
+    with sqlite3.connect(db_path) as db:
+        tables = {row[0] for row in db.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+        for table in ("blocks", "messages"):
+            if table in tables:
+                rows = db.execute(f"SELECT data FROM {table} ORDER BY random() LIMIT ?", (per_table,))
+                samples.extend(codec.serialize(codec.decode(row[0])) for row in rows)
+    return samples
+
+def _run_train_dictionary(args: argparse.Namespace) -> int:
+    initialize_codec()  # Reads rows written with any dictionary configured so far
+    db_path = args.db or get_settings().db_path
+    samples = dictionary_samples(db_path, args.samples)
+    if len(samples) < 100:
+        print(f"Only {len(samples)} blocks and messages in {db_path}; store more documents before training")
+        return 1
+    dictionary = train_dictionary(samples, args.size * 1024)
+    output = args.output or os.path.join("dictionaries", f"storage-{int(time.time())}{DICTIONARY_SUFFIX}")
+    os.makedirs(os.path.dirname(output) or ".", exist_ok=True)
+    with open(output, "wb") as f:
+        f.write(dictionary)
+    print(f"Trained a {len(dictionary) // 1024} KiB dictionary on {len(samples)} samples: {output}")
+    print(f"Set STORAGE_ZSTD_DICTIONARY={output} to compress new rows with it")
+    return 0
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m src.cli", description="Ruminate command-line tools")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    ingest_parser = commands.add_parser("ingest", help="Process a directory of PDFs")
+    ingest_parser.add_argument("directory", help="Directory containing the PDFs")
+    ingest_parser.add_argument("--workers", type=int, default=4, help="PDFs processed at the same time")
+    ingest_parser.add_argument("--manifest", help=f"Manifest to resume from and append to (default: <directory>/{DEFAULT_MANIFEST})")
+    ingest_parser.add_argument("--user-id", default="test_user", help="Owner of the ingested documents")
+    ingest_parser.add_argument("--ruminate", action="store_true", help="Ruminate over each document once it is processed")
+    ingest_parser.add_argument("--recursive", action="store_true", help="Include PDFs in subdirectories")
+    ingest_parser.add_argument("--verbose", action="store_true", help="Show service logs")
+
+    dictionary_parser = commands.add_parser("train-dictionary", help="Train a zstd dictionary for stored blobs")
+    dictionary_parser.add_argument("--db", help="SQLite database to sample (default: the configured db_path)")
+    dictionary_parser.add_argument("--output", help=f"Dictionary file, ending in {DICTIONARY_SUFFIX} (default: dictionaries/storage-<time>{DICTIONARY_SUFFIX})")
+    dictionary_parser.add_argument("--samples", type=int, default=20000, help="Rows sampled from each table")
+    dictionary_parser.add_argument("--size", type=int, default=112, help="Dictionary size in KiB")
+
+    args = parser.parse_args(argv)
+    if args.command == "train-dictionary":
+        return _run_train_dictionary(args)
+    if not args.directory or not os.path.isdir(args.directory):
+        parser.error(f"{args.directory} is not a directory")
+    logging.getLogger().setLevel(logging.INFO if args.verbose else logging.WARNING)
+    return asyncio.run(_run_ingest(args))
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -9,6 +9,17 @@ class Settings(BaseSettings):
     openai_api_key: str
     datalab_api_key: str
     
+    # Marker settings
+    marker_api_url: Optional[str] = None   # Override to point at a stand-in server (see marker_stub_server.py)
+    marker_poll_min_interval: float = 1.0       # First backoff step after a missed poll
+    marker_poll_max_interval: float = 30.0      # Cap on the poll backoff
+    marker_max_wait_seconds: float = 600.0      # Give up on a Marker job after this long
+    marker_webhook_url: Optional[str] = None    # Public URL of POST /documents/marker/webhook; enables completion callbacks
+    marker_webhook_secret: Optional[str] = None # Shared secret appended to the webhook URL and checked on callbacks
+    marker_webhook_fallback_poll_seconds: float = 60.0  # Safety-net poll interval when callbacks are enabled
+    marker_max_concurrent_jobs: int = 8         # Marker jobs (documents or shards) in flight across all uploads
+    marker_shard_pages: Optional[int] = 50      # Split longer PDFs into page-range jobs of about this size; None disables
+    
     # Storage type settings
     document_storage_type: str = "sqlite"  # Default to local JSON storage
     file_storage_type: str = "local"      # Default to local file storage
@@ -19,6 +30,21 @@ class Settings(BaseSettings):
     
     # SQLite settings
     db_path: Optional[str] = "sqlite.db"         # Path to SQLite database
+    sqlite_pool_size: int = 10                   # Pooled connections kept open per database
+    sqlite_max_overflow: int = 10                # Extra connections opened under load
+    sqlite_busy_timeout_ms: int = 5000           # Wait on a locked database before failing
+    sqlite_mmap_size_mb: int = 256
+    sqlite_cache_size_mb: int = 64               # Page cache per connection
+
+    # Encoding of stored documents, blocks, messages and insights (see repositories/codec.py)
+    storage_format: str = "json"                 # "json" or "msgpack" (pip install msgpack)
+    storage_compression: str = "none"            # "zstd" (pip install zstandard), "none", or "auto" (zstd when installed)
+    storage_compression_level: int = 3
+    storage_zstd_dictionary: Optional[str] = None  # From `python -m src.cli train-dictionary`; keep older ones beside it
+
+    # In-process cache of documents, pages and blocks (see repositories/cache.py)
+    document_cache_max_mb: int = 256             # Bound on cached JSON size; 0 disables the cache
+    document_cache_ttl_seconds: float = 5.0      # How long a document's status and metadata may be served stale
     
     # RDS settings
     db_host: Optional[str] = None
@@ -31,6 +57,43 @@ class Settings(BaseSettings):
     aws_secret_key: Optional[str] = None
     s3_bucket: Optional[str] = None
 
+    # Upload deduplication by PDF content hash
+    upload_deduplicate: bool = True
+    upload_dedup_clone_insights: bool = False   # Also copy insights of the matching document
+    
+    # Background upload pipeline
+    upload_auto_ruminate: bool = False          # Start a rumination as soon as an upload is READY
+    upload_resume_on_startup: bool = False      # Resume interrupted uploads on startup; enable on one worker only
+    
+    # PDF extraction backend
+    document_processor: str = "marker"          # "marker", or opt in to "local" (PyMuPDF text layer) or "auto" (preflight picks)
+    local_extraction_workers: int = 2           # Processes used for local extraction
+    local_min_chars_per_page: int = 200         # Text-layer density at which auto picks local extraction
+
+    # Rumination settings
+    rumination_seconds_per_call: float = 3.0    # Average LLM call latency used for estimates
+
+    # Admission control: requests running / waiting per endpoint class before 429
+    upload_max_concurrency: int = 4
+    upload_max_queue_depth: int = 16
+    rumination_max_concurrency: int = 2
+    rumination_max_queue_depth: int = 8
+    chat_max_concurrency: int = 32
+    chat_max_queue_depth: int = 64
+
+    # Fair per-user scheduling of LLM calls
+    llm_max_concurrency: int = 16
+    user_daily_token_quota: Optional[int] = None     # Tokens per user per UTC day, None disables
+    user_max_concurrent_jobs: Optional[int] = 2      # Concurrent ruminations per user, None disables
+
+    # Bulkheads: resources reserved per workload class
+    chat_llm_concurrency: int = 12                   # Share of llm_max_concurrency for chat and block insights
+    rumination_llm_concurrency: int = 4              # Share of llm_max_concurrency for batch rumination
+    chat_db_connections: int = 8
+    rumination_db_connections: int = 2
+    chat_thread_pool_size: Optional[int] = None      # None uses the default executor
+    rumination_thread_pool_size: Optional[int] = None
+
     class Config:
         env_file = ".env"
         env_file_encoding = "utf-8"
@@ -1,10 +1,21 @@
 # src/main.py
-from fastapi import FastAPI
+import asyncio
+from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
-from src.api.routes.document import document_router
+from fastapi.responses import JSONResponse
+from src.api.routes.document import document_router, resume_interrupted_uploads
 from src.api.routes.conversation import router as conversation_router
-from src.api.dependencies import initialize_repositories
+from src.api.dependencies import initialize_repositories, initialize_bulkheads, initialize_marker_poller
 from src.api.routes.insights import router as insights_router
+from src.api.routes.metrics import router as metrics_router
+from src.api.routes.blocks import router as blocks_router
+from src.services.scheduling.admission_controller import AdmissionRejected
+from src.services.scheduling.llm_scheduler import QuotaExceeded
+from src.services.document.marker_service import close_marker_http_client
+from src.services.document.marker_poller import close_marker_poller
+from src.repositories.sqlite_engine import dispose_sqlite_engines
+from src.services.document.local_extraction_service import shutdown_extraction_pool
+from src.config import get_settings
 
 app = FastAPI()
 
@@ -16,13 +27,42 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+@app.exception_handler(AdmissionRejected)
+async def admission_rejected_handler(request: Request, exc: AdmissionRejected):
+    return JSONResponse(
+        status_code=429,
+        content={"detail": str(exc)},
+        headers={"Retry-After": str(exc.retry_after)}
+    )
+
+@app.exception_handler(QuotaExceeded)
+async def quota_exceeded_handler(request: Request, exc: QuotaExceeded):
+    return JSONResponse(
+        status_code=429,
+        content={"detail": str(exc)},
+        headers={"Retry-After": str(exc.retry_after)}
+    )
+
 @app.on_event("startup")
 async def startup_event():
+    initialize_bulkheads()
+    initialize_marker_poller()
     await initialize_repositories()
+    if get_settings().upload_resume_on_startup:
+        asyncio.create_task(resume_interrupted_uploads())
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    await close_marker_poller()
+    await close_marker_http_client()
+    shutdown_extraction_pool()
+    await dispose_sqlite_engines()
 
 app.include_router(document_router)
 app.include_router(conversation_router)
 app.include_router(insights_router)
+app.include_router(blocks_router)
+app.include_router(metrics_router)
 
 if __name__ == "__main__":
     import uvicorn
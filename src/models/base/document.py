@@ -20,9 +20,13 @@ class Document(BaseModel):
     s3_pdf_path: Optional[str] = None
     chunk_ids: List[str] = Field(default_factory=list)
     title: str = "Untitled Document"
+    content_hash: Optional[str] = None  # SHA-256 of the uploaded PDF, used for deduplication
     processing_error: Optional[str] = None
     marker_job_id: Optional[str] = None  # to track Marker processing
     marker_check_url: Optional[str] = None
+    marker_shards: List[Dict[str, Any]] = Field(default_factory=list)  # page ranges and check URLs of a sharded Marker job
+    page_count: Optional[int] = None  # estimated until processing finishes
+    pages_processed: int = 0  # pages whose blocks are stored and readable
     created_at: Optional[datetime] = None
     updated_at: Optional[datetime] = None
 
@@ -0,0 +1,26 @@
+# src/models/rumination/rumination_estimate.py
+
+from pydantic import BaseModel
+from typing import Dict, List, Optional
+
+class BlockEstimate(BaseModel):
+    block_id: str
+    page_number: Optional[int] = None
+    llm_calls: int
+    input_tokens: int
+    output_tokens: int
+
+class RuminationEstimate(BaseModel):
+    document_id: str
+    model: str
+    blocks_total: int
+    blocks_analyzed: int
+    blocks_skipped: int
+    llm_calls: int
+    input_tokens: int
+    output_tokens: int
+    max_context_tokens: int  # Largest single prompt, as the cumulative context grows
+    estimated_seconds: float  # Calls run one after another, each on the context of the last
+    estimated_cost_usd: float  # Cost with the configured model
+    cost_by_model: Dict[str, float]
+    blocks: List[BlockEstimate]
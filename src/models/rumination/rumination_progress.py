@@ -0,0 +1,72 @@
+# src/models/rumination/rumination_progress.py
+
+import time
+from pydantic import BaseModel, Field
+from typing import ClassVar, Optional
+
+class RuminationProgress(BaseModel):
+    """Counters and throughput estimates for a single rumination job"""
+    blocks_total: int = 0
+    blocks_done: int = 0
+    blocks_skipped: int = 0
+    blocks_failed: int = 0
+    tokens_used: int = 0
+    blocks_per_second: float = 0.0
+    avg_block_seconds: Optional[float] = None  # EWMA of per-block processing time
+    eta_seconds: Optional[float] = None
+    started_at: float = Field(default_factory=time.time)
+    updated_at: float = Field(default_factory=time.time)
+    finished_at: Optional[float] = None
+
+    # Weight of the newest sample in the per-block time EWMA
+    EWMA_ALPHA: ClassVar[float] = 0.3
+
+    @property
+    def blocks_remaining(self) -> int:
+        return max(self.blocks_total - self.blocks_done - self.blocks_skipped - self.blocks_failed, 0)
+
+    def record_skipped(self, count: int = 1) -> None:
+        """Record blocks that were not sent to the LLM"""
+        self.blocks_skipped += count
+        self._refresh()
+
+    def record_done(self, seconds: float, tokens: int = 0) -> None:
+        """Record a successfully analyzed block"""
+        self.blocks_done += 1
+        self._record_sample(seconds, tokens)
+
+    def record_failed(self, seconds: float, tokens: int = 0) -> None:
+        """Record a block whose analysis raised an error"""
+        self.blocks_failed += 1
+        self._record_sample(seconds, tokens)
+
+    def finish(self) -> None:
+        """Mark the job as finished"""
+        self.finished_at = time.time()
+        self._refresh()
+        self.eta_seconds = 0.0
+
+    def _record_sample(self, seconds: float, tokens: int) -> None:
+        self.tokens_used += tokens
+        if self.avg_block_seconds is None:
+            self.avg_block_seconds = seconds
+        else:
+            self.avg_block_seconds = self.EWMA_ALPHA * seconds + (1 - self.EWMA_ALPHA) * self.avg_block_seconds
+        self._refresh()
+
+    def _refresh(self) -> None:
+        """Recompute throughput and ETA from the current counters"""
+        now = time.time()
+        self.updated_at = now
+        elapsed = (self.finished_at or now) - self.started_at
+        processed = self.blocks_done + self.blocks_failed
+        self.blocks_per_second = processed / elapsed if elapsed > 0 else 0.0
+        if self.avg_block_seconds is not None:
+            self.eta_seconds = self.avg_block_seconds * self.blocks_remaining
+
+    def to_event(self) -> dict:
+        """Serialize for SSE events and status responses"""
+        data = self.dict()
+        data["blocks_remaining"] = self.blocks_remaining
+        data["seconds_since_update"] = time.time() - self.updated_at
+        return data
@@ -44,9 +44,11 @@ class Block(BaseModel):
     html_content: Optional[str] = None
     polygon: Optional[List[List[float]]] = None  # Marker uses polygon, not x1/y1/x2/y2
     page_number: Optional[int] = None
+    reading_order: Optional[int] = None  # Position on its page, as in Page.block_ids
     section_hierarchy: Optional[Dict[str, str]] = None  # From Marker's section_hierarchy
     metadata: Optional[Dict] = None
-    images: Optional[Dict[str, str]] = None  # base64 encoded images
+    images: Optional[Dict[str, str]] = None  # base64 encoded images, only until stored by block_images
+    image_refs: Optional[Dict[str, str]] = None  # image name -> SHA-256 of the image in blob storage
     created_at: Optional[datetime] = None
     updated_at: Optional[datetime] = None
 
@@ -54,10 +56,11 @@ class Block(BaseModel):
         use_enum_values = True
 
     @classmethod
-    def from_marker_block(cls, marker_block: Dict, document_id: str, page_id: str) -> 'Block':
+    def from_marker_block(cls, marker_block: Dict, document_id: str, page_id: str, block_id: Optional[str] = None) -> 'Block':
         """Create a Block from Marker API response"""
         assert marker_block.get('block_type', None) is not None, "Block type is None"
         return cls(
+            id=block_id or str(uuid4()),
             document_id=document_id,
             page_id=page_id,
             block_type=BlockType(marker_block.get('block_type')),
@@ -85,7 +88,17 @@ class Block(BaseModel):
             html_content=data.get('html_content'),
             polygon=data.get('polygon'),
             page_number=data.get('page_number'),
+            reading_order=data.get('reading_order'),
             section_hierarchy=data.get('section_hierarchy'),
             metadata=data.get('metadata'),
-            images=data.get('images')
-        )
\ No newline at end of file
+            images=data.get('images'),
+            image_refs=data.get('image_refs')
+        )
+
+class BlockSearchResult(BaseModel):
+    """A block matching a full-text search"""
+    block_id: str
+    document_id: str
+    page_number: Optional[int] = None
+    snippet: str  # Text around the matches, with each match wrapped in <mark>
+    score: float  # Higher is more relevant (negated BM25)
@@ -0,0 +1,107 @@
+# repositories/cache.py
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Hashable, Iterable, Optional, Set
+
+@dataclass
+class _Entry:
+    value: Any
+    size: int
+    expires_at: Optional[float]
+    tags: tuple
+
+_caches: Dict[str, "ByteLRUCache"] = {}
+
+class ByteLRUCache:
+    """LRU cache bounded by the total size of its entries, with optional TTLs and invalidation by tag.
+
+    Sizes are whatever the caller measures (bytes of some encoding of the
+    value); entries larger than the whole cache are not stored. Expired
+    entries are dropped when read or evicted. Not thread-safe: use it from the
+    event loop.
+    """
+    def __init__(self, name: str, max_bytes: int, clock: Callable[[], float] = time.monotonic):
+        self.name = name
+        self.max_bytes = max_bytes
+        self._clock = clock
+        self._entries: "OrderedDict[Hashable, _Entry]" = OrderedDict()
+        self._tags: Dict[Hashable, Set[Hashable]] = {}
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+        _caches[name] = self
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return default
+        if entry.expires_at is not None and entry.expires_at <= self._clock():
+            self._remove(key)
+            self.expirations += 1
+            self.misses += 1
+            return default
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return entry.value
+
+    def set(self, key: Hashable, value: Any, size: int, ttl: Optional[float] = None, tags: Iterable[Hashable] = ()) -> bool:
+        """Store a value, evicting the least recently used entries to make room; False if it is too large"""
+        if key in self._entries:
+            self._remove(key)
+        if size > self.max_bytes:
+            return False
+        tags = tuple(tags)
+        self._entries[key] = _Entry(value, size, None if ttl is None else self._clock() + ttl, tags)
+        self.bytes += size
+        for tag in tags:
+            self._tags.setdefault(tag, set()).add(key)
+        while self.bytes > self.max_bytes:
+            self._remove(next(iter(self._entries)))
+            self.evictions += 1
+        return True
+
+    def invalidate(self, key: Hashable) -> None:
+        if key in self._entries:
+            self._remove(key)
+            self.invalidations += 1
+
+    def invalidate_tag(self, tag: Hashable) -> None:
+        """Drop every entry stored with this tag"""
+        for key in list(self._tags.get(tag, ())):
+            self.invalidate(key)
+
+    def clear(self) -> None:
+        self._entries.clear()
+        self._tags.clear()
+        self.bytes = 0
+
+    def _remove(self, key: Hashable) -> None:
+        entry = self._entries.pop(key)
+        self.bytes -= entry.size
+        for tag in entry.tags:
+            keys = self._tags.get(tag)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._tags[tag]
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "entries": len(self._entries),
+            "bytes": self.bytes,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "invalidations": self.invalidations
+        }
+
+def cache_stats() -> Dict[str, Dict[str, int]]:
+    """Counters of every cache, by name"""
+    return {name: cache.stats() for name, cache in _caches.items()}
@@ -0,0 +1,216 @@
+# repositories/codec.py
+"""Encoding of the model blobs repositories store (documents, pages, blocks, messages, insights).
+
+A blob is a 3-byte header (codec version, format, compression) followed by
+the payload: JSON (orjson when installed) or msgpack (pip install msgpack),
+optionally zstd-compressed (pip install zstandard), with a trained dictionary
+if one is configured. Rows and files written before the codec existed are
+plain JSON text, which never starts with a header byte, so they still decode.
+"""
+import glob
+import json
+import logging
+import os
+import threading
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Type, TypeVar, Union
+
+import pydantic_core
+from pydantic import BaseModel
+from sqlalchemy import LargeBinary
+from sqlalchemy.types import TypeDecorator
+
+logger = logging.getLogger(__name__)
+
+CODEC_VERSION = 1
+FORMATS = {"json": 0, "msgpack": 1}
+COMPRESSIONS = {"none": 0, "zstd": 1}
+DICTIONARY_SUFFIX = ".zdict"
+
+ModelT = TypeVar("ModelT", bound=BaseModel)
+
+def _module(name: str):
+    try:
+        return __import__(name)
+    except ImportError:
+        return None
+
+def orjson_available() -> bool:
+    """Whether the optional orjson dependency is installed"""
+    return _module("orjson") is not None
+
+def msgpack_available() -> bool:
+    """Whether the optional msgpack dependency is installed"""
+    return _module("msgpack") is not None
+
+def zstd_available() -> bool:
+    """Whether the optional zstandard dependency is installed"""
+    return _module("zstandard") is not None
+
+def _require(name: str, package: str):
+    module = _module(name)
+    if module is None:
+        raise RuntimeError(f"{package} is not installed (pip install {package})")
+    return module
+
+@dataclass
+class CodecOptions:
+    """How new blobs are written; every version and format can always be read"""
+    format: str = "json"                # "json" or "msgpack"
+    compression: str = "none"           # "zstd", "none", or "auto" (zstd when installed)
+    level: int = 3                      # zstd compression level
+    dictionary: Optional[str] = None    # Trained zstd dictionary to compress with
+
+class StorageCodec:
+    """Encodes values to blobs and back. Safe to share between threads."""
+    def __init__(self, options: Optional[CodecOptions] = None):
+        options = options or CodecOptions()
+        if options.format not in FORMATS:
+            raise ValueError(f"Unknown storage format {options.format!r}")
+        compression = options.compression
+        if compression == "auto":
+            compression = "zstd" if zstd_available() else "none"
+        if compression not in COMPRESSIONS:
+            raise ValueError(f"Unknown storage compression {options.compression!r}")
+        if options.format == "msgpack":
+            _require("msgpack", "msgpack")
+        if compression == "zstd":
+            _require("zstandard", "zstandard")
+        self.options = options
+        self.format = options.format
+        self.compression = compression
+        self._json = _module("orjson") or json
+        self._msgpack = _module("msgpack")
+        self._zstandard = _module("zstandard")
+        self._dictionary = None
+        self._dictionaries: Dict[int, Any] = {}
+        if options.dictionary:
+            self._load_dictionaries(options.dictionary)
+        self._local = threading.local()  # zstd contexts are not thread-safe
+
+    def _load_dictionaries(self, path: str) -> None:
+        """Load the dictionary to compress with, and every other one beside it to decompress older rows"""
+        zstandard = _require("zstandard", "zstandard")
+        paths = {path, *glob.glob(os.path.join(os.path.dirname(path) or ".", f"*{DICTIONARY_SUFFIX}"))}
+        for candidate in sorted(paths):
+            with open(candidate, "rb") as f:
+                dictionary = zstandard.ZstdCompressionDict(f.read())
+            self._dictionaries[dictionary.dict_id()] = dictionary
+            if candidate == path:
+                self._dictionary = dictionary
+        logger.info(f"Loaded {len(self._dictionaries)} zstd dictionaries from {os.path.dirname(path) or '.'}")
+
+    def _compressor(self):
+        compressor = getattr(self._local, "compressor", None)
+        if compressor is None:
+            compressor = self._zstandard.ZstdCompressor(level=self.options.level, dict_data=self._dictionary)
+            self._local.compressor = compressor
+        return compressor
+
+    def _decompressor(self, payload: bytes):
+        zstandard = self._zstandard or _require("zstandard", "zstandard")
+        dict_id = zstandard.get_frame_parameters(payload).dict_id
+        decompressors = getattr(self._local, "decompressors", None)
+        if decompressors is None:
+            decompressors = self._local.decompressors = {}
+        decompressor = decompressors.get(dict_id)
+        if decompressor is None:
+            if dict_id and dict_id not in self._dictionaries:
+                raise ValueError(f"Blob was compressed with zstd dictionary {dict_id}, which is not loaded")
+            decompressor = zstandard.ZstdDecompressor(dict_data=self._dictionaries.get(dict_id))
+            decompressors[dict_id] = decompressor
+        return decompressor
+
+    def serialize(self, value: Any) -> bytes:
+        """The uncompressed payload of a pydantic model or of JSON-compatible data"""
+        if self.format == "msgpack":
+            if isinstance(value, BaseModel):
+                value = value.model_dump(mode="json")
+            return self._msgpack.packb(value)
+        if isinstance(value, BaseModel):
+            return pydantic_core.to_json(value)
+        if self._json is json:
+            return json.dumps(value).encode()
+        return self._json.dumps(value)
+
+    def encode(self, value: Any) -> bytes:
+        """A blob of a pydantic model or of JSON-compatible data"""
+        payload = self.serialize(value)
+        compression = COMPRESSIONS["none"]
+        if self.compression == "zstd":
+            compressed = self._compressor().compress(payload)
+            if len(compressed) < len(payload):  # Tiny payloads can grow
+                payload, compression = compressed, COMPRESSIONS["zstd"]
+        return bytes((CODEC_VERSION, FORMATS[self.format], compression)) + payload
+
+    def _payload(self, blob: Union[bytes, str]):
+        """(format, payload) of a blob; legacy rows are JSON text"""
+        if isinstance(blob, str):
+            return FORMATS["json"], blob
+        if not isinstance(blob, bytes):
+            blob = bytes(blob)
+        if not blob or blob[0] != CODEC_VERSION:
+            return FORMATS["json"], blob
+        fmt, compression, payload = blob[1], blob[2], blob[3:]
+        if compression == COMPRESSIONS["zstd"]:
+            payload = self._decompressor(payload).decompress(payload)
+        elif compression != COMPRESSIONS["none"]:
+            raise ValueError(f"Unknown compression {compression} in blob header")
+        return fmt, payload
+
+    def _load(self, fmt: int, payload: Union[bytes, str]) -> Any:
+        if fmt == FORMATS["json"]:
+            return self._json.loads(payload)
+        if fmt == FORMATS["msgpack"]:
+            return (self._msgpack or _require("msgpack", "msgpack")).unpackb(payload)
+        raise ValueError(f"Unknown format {fmt} in blob header")
+
+    def decode(self, blob: Union[bytes, str]) -> Any:
+        """The data a blob was encoded from (models come back as dicts)"""
+        return self._load(*self._payload(blob))
+
+    def decode_model(self, model: Type[ModelT], blob: Union[bytes, str]) -> ModelT:
+        """A pydantic model from its blob, validated straight from JSON when it is JSON"""
+        fmt, payload = self._payload(blob)
+        if fmt == FORMATS["json"]:
+            return model.model_validate_json(payload)
+        return model.model_validate(self._load(fmt, payload))
+
+_codec: Optional[StorageCodec] = None
+
+def configure_codec(options: CodecOptions) -> None:
+    """Set how blobs are written from now on (called on app startup)"""
+    global _codec
+    _codec = StorageCodec(options)
+
+def get_codec() -> StorageCodec:
+    """The process-wide codec, with default options until configure_codec is called"""
+    global _codec
+    if _codec is None:
+        _codec = StorageCodec()
+    return _codec
+
+def encode_blob(value: Any) -> bytes:
+    return get_codec().encode(value)
+
+def decode_blob(blob: Union[bytes, str]) -> Any:
+    return get_codec().decode(blob)
+
+def decode_model(model: Type[ModelT], blob: Union[bytes, str]) -> ModelT:
+    return get_codec().decode_model(model, blob)
+
+def train_dictionary(samples: List[bytes], size: int = 112 * 1024) -> bytes:
+    """A zstd dictionary trained on uncompressed payloads (StorageCodec.serialize), for CodecOptions.dictionary"""
+    zstandard = _require("zstandard", "zstandard")
+    return zstandard.train_dictionary(size, samples).as_bytes()
+
+class EncodedBlob(TypeDecorator):
+    """SQLAlchemy column type storing JSON-compatible data as a codec blob"""
+    impl = LargeBinary
+    cache_ok = True
+
+    def process_bind_param(self, value, dialect):
+        return None if value is None else encode_blob(value)
+
+    def process_result_value(self, value, dialect):
+        return None if value is None else decode_blob(value)
@@ -38,12 +38,12 @@ class RepositoryFactory:
             from .implementations.sqlite_insight_repository import SQLiteInsightRepository
             db_path = kwargs.get('db_path', 'sqlite.db')
             
-            # Create session factory if not exists
-            if 'session_factory' not in kwargs:
-                from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
+            # Create session factory if not exists, on the same pool as the repositories' raw SQL
+            if not kwargs.get('session_factory'):
+                from sqlalchemy.ext.asyncio import AsyncSession
                 from sqlalchemy.orm import sessionmaker
-                engine = create_async_engine(f"sqlite+aiosqlite:///{db_path}")
-                kwargs['session_factory'] = sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+                from .sqlite_engine import get_sqlite_engine
+                kwargs['session_factory'] = sessionmaker(get_sqlite_engine(db_path), class_=AsyncSession, expire_on_commit=False)
             
             self._document_repo = SQLiteDocumentRepository(db_path=db_path)
             self._conversation_repo = SQLiteConversationRepository(db_path=db_path)
@@ -58,6 +58,14 @@ class RepositoryFactory:
             # self._conversation_repo = RDSConversationRepository()
             # )
 
+        if self._document_repo and kwargs.get('document_cache_max_bytes'):
+            from .implementations.cached_document_repository import CachedDocumentRepository
+            self._document_repo = CachedDocumentRepository(
+                self._document_repo,
+                max_bytes=kwargs['document_cache_max_bytes'],
+                document_ttl=kwargs.get('document_cache_ttl', 5.0)
+            )
+
         if storage_type == "local":
             from .implementations.local_storage_repository import LocalStorageRepository
             self._storage_repo = LocalStorageRepository(storage_dir=kwargs.get('storage_dir', 'local_storage'))
@@ -0,0 +1,190 @@
+# repositories/implementations/cached_document_repository.py
+from typing import Any, Callable, Iterable, List, Optional
+
+import pydantic_core
+from sqlalchemy import event
+
+from src.models.base.document import Document, DocumentStatus
+from src.models.viewer.page import Page
+from src.models.viewer.block import Block, BlockSearchResult
+from src.repositories.cache import ByteLRUCache
+from src.repositories.interfaces.document_repository import DocumentRepository, DBSession
+
+_DIRTY_KEY = "cached_document_repository.dirty"
+_LISTENING_KEY = "cached_document_repository.listening"
+
+class CachedDocumentRepository(DocumentRepository):
+    """Read-through cache in front of another DocumentRepository.
+
+    Documents are cached for a short TTL, since their status and metadata
+    change while they are processed. Pages and blocks are only cached once
+    their document is READY, after which they do not change, so they stay
+    until evicted. Entries are tagged with their document and every write
+    drops the document's entries; a write counter keeps a read that raced
+    with a write from filling the cache with what it read before the write.
+
+    Writes made in a session are invisible to other connections until it
+    commits, so their documents are invalidated again on commit or rollback,
+    and the session itself reads them from the database in the meantime.
+
+    Cached pages and blocks are shared between callers and must not be
+    modified; documents are returned as copies.
+    """
+    def __init__(self, inner: DocumentRepository, max_bytes: int, document_ttl: float = 5.0, name: str = "documents"):
+        self.inner = inner
+        self.cache = ByteLRUCache(name, max_bytes)
+        self.document_ttl = document_ttl
+        self._writes = 0
+
+    def __getattr__(self, name: str) -> Any:
+        # Backend-specific helpers (get_pages, db_path, ...) go straight to the repository
+        return getattr(self.inner, name)
+
+    # Invalidation
+
+    def _invalidate(self, document_ids: Iterable[str], session: Optional[DBSession] = None) -> None:
+        document_ids = {document_id for document_id in document_ids if document_id}
+        self._writes += 1
+        for document_id in document_ids:
+            self.cache.invalidate_tag(document_id)
+        if session is not None and document_ids:
+            self._track_session(session, document_ids)
+
+    def _track_session(self, session: DBSession, document_ids: set) -> None:
+        """Invalidate documents written in a session again once it commits or rolls back"""
+        info = getattr(session, "info", None)
+        if info is None:
+            return
+        if _LISTENING_KEY not in info:
+            # Registered once for the session's lifetime: listeners cannot be removed while they run
+            info[_LISTENING_KEY] = True
+            sync_session = getattr(session, "sync_session", session)
+
+            def settle(_):
+                if _DIRTY_KEY in info:
+                    self._writes += 1
+                    for document_id in info.pop(_DIRTY_KEY):
+                        self.cache.invalidate_tag(document_id)
+
+            event.listen(sync_session, "after_commit", settle)
+            event.listen(sync_session, "after_rollback", settle)
+        info.setdefault(_DIRTY_KEY, set()).update(document_ids)
+
+    def _bypass(self, document_id: Optional[str], session: Optional[DBSession]) -> bool:
+        """Whether the session has uncommitted writes to the document, which the cache cannot hold"""
+        info = getattr(session, "info", None) if session is not None else None
+        if not info or _DIRTY_KEY not in info:
+            return False
+        return document_id is None or document_id in info[_DIRTY_KEY]
+
+    # Reads
+
+    async def _fill(self, key: tuple, load: Callable, document_id: Optional[Callable[[Any], Optional[str]]], ttl: Optional[float], ready_only: bool, session: Optional[DBSession]) -> Any:
+        """Load a value and cache it under key, tagged with the document document_id(value) returns"""
+        writes = self._writes
+        value = await load()
+        owner = document_id(value) if value else None
+        if owner is None or self._writes != writes:
+            return value
+        if ready_only:
+            document = await self.get_document(owner, session)
+            if document is None or document.status != DocumentStatus.READY or self._writes != writes:
+                return value
+        self.cache.set(key, value, len(pydantic_core.to_json(value)), ttl=ttl, tags=(owner,))
+        return value
+
+    async def get_document(self, document_id: str, session: Optional[DBSession] = None) -> Optional[Document]:
+        if self._bypass(document_id, session):
+            return await self.inner.get_document(document_id, session)
+        document = self.cache.get(("document", document_id))
+        if document is None:
+            document = await self._fill(("document", document_id), lambda: self.inner.get_document(document_id, session),
+                                        lambda document: document.id, self.document_ttl, False, session)
+        return document.model_copy(deep=True) if document is not None else None
+
+    async def _cached_list(self, key: tuple, document_id: str, load: Callable, session: Optional[DBSession]) -> list:
+        if self._bypass(document_id, session):
+            return await load()
+        values = self.cache.get(key)
+        if values is None:
+            values = await self._fill(key, load, lambda _: document_id, None, True, session)
+        return list(values)
+
+    async def get_document_pages(self, document_id: str, session: Optional[DBSession] = None) -> List[Page]:
+        return await self._cached_list(("pages", document_id), document_id,
+                                       lambda: self.inner.get_document_pages(document_id, session), session)
+
+    async def get_blocks(self, document_id: str, session: Optional[DBSession] = None) -> List[Block]:
+        return await self._cached_list(("blocks", document_id), document_id,
+                                       lambda: self.inner.get_blocks(document_id, session), session)
+
+    async def get_blocks_by_page_number(self, document_id: str, page_number: int, session: Optional[DBSession] = None) -> List[Block]:
+        blocks = None if self._bypass(document_id, session) else self.cache.get(("blocks", document_id))
+        if blocks is not None:
+            return [block for block in blocks if block.page_number == page_number]
+        return await self._cached_list(("page_number_blocks", document_id, page_number), document_id,
+                                       lambda: self.inner.get_blocks_by_page_number(document_id, page_number, session), session)
+
+    async def get_blocks_after(self, document_id: str, after: Optional[str] = None, limit: int = 100, session: Optional[DBSession] = None) -> Optional[List[Block]]:
+        blocks = None if self._bypass(document_id, session) else self.cache.get(("blocks", document_id))
+        if blocks is None:
+            return await self.inner.get_blocks_after(document_id, after, limit, session)
+        start = 0
+        if after is not None:
+            start = next((index + 1 for index, block in enumerate(blocks) if block.id == after), None)
+            if start is None:
+                return None
+        return blocks[start:start + limit]
+
+    async def get_page_blocks(self, page_id: str, session: Optional[DBSession] = None) -> List[Block]:
+        if self._bypass(None, session):
+            return await self.inner.get_page_blocks(page_id, session)
+        blocks = self.cache.get(("page_blocks", page_id))
+        if blocks is None:
+            blocks = await self._fill(("page_blocks", page_id), lambda: self.inner.get_page_blocks(page_id, session),
+                                      lambda blocks: blocks[0].document_id, None, True, session)
+        return list(blocks)
+
+    async def get_block(self, block_id: str, session: Optional[DBSession] = None) -> Optional[Block]:
+        if self._bypass(None, session):
+            return await self.inner.get_block(block_id, session)
+        block = self.cache.get(("block", block_id))
+        if block is None:
+            block = await self._fill(("block", block_id), lambda: self.inner.get_block(block_id, session),
+                                     lambda block: block.document_id, None, True, session)
+        return block
+
+    async def get_document_by_hash(self, content_hash: str, session: Optional[DBSession] = None) -> Optional[Document]:
+        return await self.inner.get_document_by_hash(content_hash, session)
+
+    async def get_documents_by_status(self, statuses: List[str], session: Optional[DBSession] = None) -> List[Document]:
+        return await self.inner.get_documents_by_status(statuses, session)
+
+    async def search_blocks(self, query: str, document_id: Optional[str] = None, user_id: Optional[str] = None, limit: int = 20, session: Optional[DBSession] = None) -> List[BlockSearchResult]:
+        return await self.inner.search_blocks(query, document_id, user_id, limit, session)
+
+    # Writes
+
+    async def store_document(self, document: Document, session: Optional[DBSession] = None) -> None:
+        try:
+            await self.inner.store_document(document, session)
+        finally:
+            self._invalidate([document.id], session)
+
+    async def store_pages(self, pages: List[Page], session: Optional[DBSession] = None) -> None:
+        try:
+            await self.inner.store_pages(pages, session)
+        finally:
+            self._invalidate((page.document_id for page in pages), session)
+
+    async def store_blocks(self, blocks: List[Block], session: Optional[DBSession] = None) -> None:
+        try:
+            await self.inner.store_blocks(blocks, session)
+        finally:
+            self._invalidate((block.document_id for block in blocks), session)
+
+    async def store_pages_and_blocks(self, pages: List[Page], blocks: List[Block], session: Optional[DBSession] = None) -> None:
+        try:
+            await self.inner.store_pages_and_blocks(pages, blocks, session)
+        finally:
+            self._invalidate([page.document_id for page in pages] + [block.document_id for block in blocks], session)
@@ -1,6 +1,6 @@
 from typing import List, Dict, Optional, TypeVar
-import json
 import os
+from src.repositories.codec import encode_blob, decode_blob
 from src.models.conversation.conversation import Conversation
 from src.models.conversation.message import Message
 from src.repositories.interfaces.conversation_repository import ConversationRepository
@@ -28,10 +28,11 @@ class JSONConversationRepository(ConversationRepository):
             
         path = os.path.join(self.data_dir, "messages", f"{conversation_id}.json")
         if os.path.exists(path):
-            with open(path, 'r') as f:
-                messages_data = json.load(f)
+            with open(path, 'rb') as f:
+                messages_data = decode_blob(f.read())
+                # Files written before the tree was kept by parent_id alone embed children; drop them
                 messages = {
-                    data['id']: Message.from_dict(data)
+                    data['id']: Message.from_dict({**data, 'children': None, 'active_child': None})
                     for data in messages_data
                 }
                 self.messages[conversation_id] = messages
@@ -45,17 +46,17 @@ class JSONConversationRepository(ConversationRepository):
             
         path = os.path.join(self.data_dir, "messages", f"{conversation_id}.json")
         messages_data = [
-            msg.to_dict() 
+            msg.model_dump(exclude={'children', 'active_child'})
             for msg in self.messages[conversation_id].values()
         ]
-        with open(path, 'w') as f:
-            json.dump(messages_data, f)
+        with open(path, 'wb') as f:
+            f.write(encode_blob(messages_data))
     
     async def create_conversation(self, conversation: Conversation, session: Optional[DBSession] = None) -> Conversation:
         self.conversations[conversation.id] = conversation
         path = os.path.join(self.data_dir, "conversations", f"{conversation.id}.json")
-        with open(path, 'w') as f:
-            json.dump(conversation.to_dict(), f)
+        with open(path, 'wb') as f:
+            f.write(encode_blob(conversation))
         return conversation
     
     async def get_conversation(self, conversation_id: str, session: Optional[DBSession] = None) -> Optional[Conversation]:
@@ -64,8 +65,8 @@ class JSONConversationRepository(ConversationRepository):
             
         path = os.path.join(self.data_dir, "conversations", f"{conversation_id}.json")
         if os.path.exists(path):
-            with open(path, 'r') as f:
-                data = json.load(f)
+            with open(path, 'rb') as f:
+                data = decode_blob(f.read())
                 conv = Conversation.from_dict(data)
                 self.conversations[conversation_id] = conv
                 return conv
@@ -77,8 +78,8 @@ class JSONConversationRepository(ConversationRepository):
         for filename in os.listdir(conv_dir):
             if filename.endswith('.json'):
                 path = os.path.join(conv_dir, filename)
-                with open(path, 'r') as f:
-                    data = json.load(f)
+                with open(path, 'rb') as f:
+                    data = decode_blob(f.read())
                     if data.get('document_id') == document_id:
                         conv = Conversation.from_dict(data)
                         self.conversations[conv.id] = conv
@@ -92,13 +93,9 @@ class JSONConversationRepository(ConversationRepository):
         # Add message to memory
         self.messages[message.conversation_id][message.id] = message
         
-        # If this message has a parent, add it to parent's children list and set as active child
+        # If this message has a parent, set it as the parent's active child
         if message.parent_id and message.parent_id in self.messages[message.conversation_id]:
-            parent = self.messages[message.conversation_id][message.parent_id]
-            if parent.children is None:
-                parent.children = []
-            parent.children.append(message)
-            parent.active_child_id = message.id  # Set as active child
+            self.messages[message.conversation_id][message.parent_id].active_child_id = message.id
         
         # Save to disk
         self._save_messages(message.conversation_id)
@@ -114,8 +111,8 @@ class JSONConversationRepository(ConversationRepository):
         for filename in os.listdir(conv_dir):
             if filename.endswith('.json'):
                 path = os.path.join(conv_dir, filename)
-                with open(path, 'r') as f:
-                    data = json.load(f)
+                with open(path, 'rb') as f:
+                    data = decode_blob(f.read())
                     if data.get('block_id') == block_id:
                         conv = Conversation.from_dict(data)
                         self.conversations[conv.id] = conv
@@ -206,6 +203,6 @@ class JSONConversationRepository(ConversationRepository):
             raise ValueError(f"Conversation {conversation.id} not found")
             
         # Save conversation data
-        with open(conversation_path, "w") as f:
-            json.dump(conversation.to_dict(), f)
+        with open(conversation_path, 'wb') as f:
+            f.write(encode_blob(conversation))
         return conversation
@@ -1,14 +1,18 @@
 from typing import List, Dict, Optional
 from sqlalchemy.ext.asyncio import AsyncSession
-import json
 import os
+from src.repositories.codec import encode_blob, decode_model
 from src.models.viewer.page import Page
 from src.models.viewer.block import Block
-from src.models.base.document import Document
+from src.models.base.document import Document, DocumentStatus
 from src.repositories.interfaces.document_repository import DocumentRepository
 
 class JSONDocumentRepository(DocumentRepository):
-    """Local JSON implementation of DocumentRepository."""
+    """Local file implementation of DocumentRepository.
+
+    Each model is a file named <id>.json holding a codec blob (see
+    repositories/codec.py); files from before the codec are plain JSON.
+    """
     
     def __init__(self, data_dir: str = "local_db"):
         """Initialize local JSON document repository.
@@ -35,8 +39,8 @@ class JSONDocumentRepository(DocumentRepository):
         """Store a document in memory and on disk"""
         self.documents[document.id] = document
         path = os.path.join(self.data_dir, "documents", f"{document.id}.json")
-        with open(path, 'w') as f:
-            f.write(document.json())
+        with open(path, 'wb') as f:
+            f.write(encode_blob(document))
     
     async def get_document(self, document_id: str, session: Optional[AsyncSession] = None) -> Optional[Document]:
         """Get a document by ID"""
@@ -45,17 +49,42 @@ class JSONDocumentRepository(DocumentRepository):
             
         path = os.path.join(self.data_dir, "documents", f"{document_id}.json")
         if os.path.exists(path):
-            with open(path, 'r') as f:
-                return Document.parse_raw(f.read())
+            with open(path, 'rb') as f:
+                return decode_model(Document, f.read())
+        return None
+    
+    async def get_document_by_hash(self, content_hash: str, session: Optional[AsyncSession] = None) -> Optional[Document]:
+        """Get a READY document with the given content hash"""
+        documents_dir = os.path.join(self.data_dir, "documents")
+        for filename in os.listdir(documents_dir):
+            if not filename.endswith('.json'):
+                continue
+            with open(os.path.join(documents_dir, filename), 'rb') as f:
+                document = decode_model(Document, f.read())
+            if document.content_hash == content_hash and document.status == DocumentStatus.READY:
+                return document
         return None
     
+    async def get_documents_by_status(self, statuses: List[str], session: Optional[AsyncSession] = None) -> List[Document]:
+        """Get all documents whose status is one of statuses"""
+        documents = []
+        documents_dir = os.path.join(self.data_dir, "documents")
+        for filename in os.listdir(documents_dir):
+            if not filename.endswith('.json'):
+                continue
+            with open(os.path.join(documents_dir, filename), 'rb') as f:
+                document = decode_model(Document, f.read())
+            if document.status in statuses:
+                documents.append(document)
+        return documents
+    
     async def store_pages(self, pages: List[Page], session: Optional[AsyncSession] = None) -> None:
         """Store pages in memory and on disk"""
         for page in pages:
             self.pages[page.id] = page
             path = os.path.join(self.data_dir, "pages", f"{page.id}.json")
-            with open(path, 'w') as f:
-                f.write(page.json())
+            with open(path, 'wb') as f:
+                f.write(encode_blob(page))
     
     async def get_document_pages(self, document_id: str, session: Optional[AsyncSession] = None) -> List[Page]:
         """Get all pages for a document"""
@@ -66,8 +95,8 @@ class JSONDocumentRepository(DocumentRepository):
                 continue
                 
             path = os.path.join(pages_dir, filename)
-            with open(path, 'r') as f:
-                page = Page.parse_raw(f.read())
+            with open(path, 'rb') as f:
+                page = decode_model(Page, f.read())
                 if page.document_id == document_id:
                     pages.append(page)
         return pages
@@ -77,8 +106,8 @@ class JSONDocumentRepository(DocumentRepository):
         for block in blocks:
             self.blocks[block.id] = block
             path = os.path.join(self.data_dir, "blocks", f"{block.id}.json")
-            with open(path, 'w') as f:
-                f.write(block.json())
+            with open(path, 'wb') as f:
+                f.write(encode_blob(block))
     
     async def get_page_blocks(self, page_id: str, session: Optional[AsyncSession] = None) -> List[Block]:
         """Get all blocks for a page"""
@@ -89,8 +118,8 @@ class JSONDocumentRepository(DocumentRepository):
                 continue
                 
             path = os.path.join(blocks_dir, filename)
-            with open(path, 'r') as f:
-                block = Block.parse_raw(f.read())
+            with open(path, 'rb') as f:
+                block = decode_model(Block, f.read())
                 if block.page_id == page_id:
                     blocks.append(block)
         return blocks
@@ -102,8 +131,8 @@ class JSONDocumentRepository(DocumentRepository):
             
         path = os.path.join(self.data_dir, "blocks", f"{block_id}.json")
         if os.path.exists(path):
-            with open(path, 'r') as f:
-                return Block.parse_raw(f.read())
+            with open(path, 'rb') as f:
+                return decode_model(Block, f.read())
         return None
 
     async def get_blocks(self, document_id: str, session: Optional[AsyncSession] = None) -> List[Block]:
@@ -112,8 +141,8 @@ class JSONDocumentRepository(DocumentRepository):
         blocks_dir = os.path.join(self.data_dir, "blocks")
         for filename in os.listdir(blocks_dir):
             if filename.endswith(".json"):
-                with open(os.path.join(blocks_dir, filename), 'r') as f:
-                    block = Block.parse_raw(f.read())
+                with open(os.path.join(blocks_dir, filename), 'rb') as f:
+                    block = decode_model(Block, f.read())
                     if block.document_id == document_id:
                         blocks.append(block)
         return blocks
\ No newline at end of file
@@ -1,10 +1,13 @@
-from typing import Optional
+from typing import Optional, BinaryIO
 import os
 import shutil
 from fastapi import UploadFile
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from src.repositories.interfaces.storage_repository import StorageRepository
+from src.services.scheduling.bulkhead import run_blocking
+
+COPY_CHUNK_SIZE = 1024 * 1024
 
 class LocalStorageRepository(StorageRepository):
     """Local filesystem implementation of StorageRepository."""
@@ -34,6 +37,29 @@ class LocalStorageRepository(StorageRepository):
             f.write(file_data)
         return file_path
     
+    async def store_stream(self, stream: BinaryIO, document_id: str, session: Optional[AsyncSession] = None) -> str:
+        """Copy a stream to local storage in chunks and return its path.
+        
+        Args:
+            stream: Binary file object positioned at the start of the data
+            document_id: Unique identifier for the document
+            session: Unused session parameter
+            
+        Returns:
+            str: Local path where file is stored
+        """
+        file_path = os.path.join(self.storage_dir, f"{document_id}.pdf")
+        await run_blocking(self._copy_to, stream, file_path)
+        return file_path
+    
+    @staticmethod
+    def _copy_to(stream: BinaryIO, file_path: str) -> None:
+        # Write to a temporary name first so a failed copy never leaves a truncated PDF behind
+        partial_path = f"{file_path}.partial"
+        with open(partial_path, "wb") as f:
+            shutil.copyfileobj(stream, f, COPY_CHUNK_SIZE)
+        os.replace(partial_path, file_path)
+    
     async def get_file(self, file_path: str, session: Optional[AsyncSession] = None) -> Optional[bytes]:
         """Retrieve a file from local storage.
         
@@ -50,6 +76,53 @@ class LocalStorageRepository(StorageRepository):
         with open(file_path, "rb") as f:
             return f.read()
     
+    async def open_file(self, file_path: str, session: Optional[AsyncSession] = None) -> Optional[BinaryIO]:
+        """Open a file in local storage for reading.
+        
+        Args:
+            file_path: Path to the file (returned from store_file)
+            session: Unused session parameter
+            
+        Returns:
+            BinaryIO: Open file object if found, None otherwise
+        """
+        if not os.path.exists(file_path):
+            return None
+        return open(file_path, "rb")
+    
+    async def store_blob(self, data: bytes, key: str, session: Optional[AsyncSession] = None) -> None:
+        """Store bytes under a content-addressed key below the storage directory.
+        
+        Args:
+            data: Raw bytes to store
+            key: Relative key, e.g. images/<sha256>
+            session: Unused session parameter
+        """
+        blob_path = os.path.join(self.storage_dir, key)
+        if os.path.exists(blob_path):
+            return  # Same key, same content
+        await run_blocking(self._write_blob, data, blob_path)
+    
+    @staticmethod
+    def _write_blob(data: bytes, blob_path: str) -> None:
+        os.makedirs(os.path.dirname(blob_path), exist_ok=True)
+        partial_path = f"{blob_path}.partial"
+        with open(partial_path, "wb") as f:
+            f.write(data)
+        os.replace(partial_path, blob_path)
+    
+    async def get_blob(self, key: str, session: Optional[AsyncSession] = None) -> Optional[bytes]:
+        """Get the bytes stored under a key.
+        
+        Args:
+            key: Key passed to store_blob
+            session: Unused session parameter
+            
+        Returns:
+            bytes: Stored data if found, None otherwise
+        """
+        return await self.get_file(os.path.join(self.storage_dir, key), session)
+    
     async def delete_file(self, file_path: str, session: Optional[AsyncSession] = None) -> None:
         """Delete a file from local storage.
         
@@ -23,6 +23,12 @@ class RDSDocumentRepository(DocumentRepository):
     async def get_document(self, document_id: str) -> Optional[Document]:
         raise NotImplementedError("RDS implementation pending")
     
+    async def get_document_by_hash(self, content_hash: str) -> Optional[Document]:
+        raise NotImplementedError("RDS implementation pending")
+    
+    async def get_documents_by_status(self, statuses: List[str]) -> List[Document]:
+        raise NotImplementedError("RDS implementation pending")
+    
     async def store_pages(self, pages: List[Page]) -> None:
         raise NotImplementedError("RDS implementation pending")
     
@@ -1,10 +1,15 @@
-from typing import Optional
+from typing import Optional, BinaryIO
+import tempfile
 import boto3
 from botocore.exceptions import ClientError
 from fastapi import UploadFile
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from src.repositories.interfaces.storage_repository import StorageRepository
+from src.services.scheduling.bulkhead import run_blocking
+
+# Downloads larger than this are spooled to a temporary file instead of memory
+SPOOL_MAX_SIZE = 1024 * 1024
 
 class S3StorageRepository(StorageRepository):
     def __init__(self, bucket_name: str, aws_access_key: str = None, aws_secret_key: str = None):
@@ -28,6 +33,15 @@ class S3StorageRepository(StorageRepository):
         except ClientError as e:
             raise Exception(f"Failed to upload to S3: {str(e)}")
     
+    async def store_stream(self, stream: BinaryIO, document_id: str, session: Optional[AsyncSession] = None) -> str:
+        """Stream a file to S3 (multipart for large files) and return its path"""
+        key = f"{document_id}.pdf"
+        try:
+            await run_blocking(self.s3_client.upload_fileobj, stream, self.bucket_name, key)
+            return f"s3://{self.bucket_name}/{key}"
+        except ClientError as e:
+            raise Exception(f"Failed to upload to S3: {str(e)}")
+    
     async def get_file(self, file_path: str, session: Optional[AsyncSession] = None) -> Optional[bytes]:
         """Get file from S3"""
         try:
@@ -40,6 +54,33 @@ class S3StorageRepository(StorageRepository):
                 return None
             raise Exception(f"Failed to get from S3: {str(e)}")
     
+    async def open_file(self, file_path: str, session: Optional[AsyncSession] = None) -> Optional[BinaryIO]:
+        """Download a file from S3 into a spooled temporary file"""
+        spool = tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_SIZE)
+        try:
+            # Extract bucket and key from s3:// URL
+            _, _, bucket, key = file_path.split('/', 3)
+            await run_blocking(self.s3_client.download_fileobj, bucket, key, spool)
+            spool.seek(0)
+            return spool
+        except ClientError as e:
+            spool.close()
+            if e.response['Error']['Code'] in ('NoSuchKey', '404'):
+                return None
+            raise Exception(f"Failed to get from S3: {str(e)}")
+    
+    async def store_blob(self, data: bytes, key: str, session: Optional[AsyncSession] = None) -> None:
+        """Store bytes in S3 under a content-addressed key"""
+        try:
+            # Keys are content hashes, so overwriting an existing object changes nothing
+            await run_blocking(self.s3_client.put_object, Bucket=self.bucket_name, Key=key, Body=data)
+        except ClientError as e:
+            raise Exception(f"Failed to upload to S3: {str(e)}")
+    
+    async def get_blob(self, key: str, session: Optional[AsyncSession] = None) -> Optional[bytes]:
+        """Get the bytes stored in S3 under a key"""
+        return await self.get_file(f"s3://{self.bucket_name}/{key}", session)
+    
     async def delete_file(self, file_path: str, session: Optional[AsyncSession] = None) -> None:
         """Delete file from S3"""
         try:
@@ -1,12 +1,14 @@
 from typing import List, Optional, Dict, Any, Tuple
-import aiosqlite
 import sqlite3
-import json
+from contextlib import asynccontextmanager
 import os
 import logging
 import uuid
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import text
+from src.services.scheduling.bulkhead import db_budget
+from src.repositories.sqlite_engine import sqlite_connection
+from src.repositories.codec import encode_blob, decode_blob
 from src.models.conversation.conversation import Conversation
 from src.models.conversation.message import Message
 from src.repositories.interfaces.conversation_repository import ConversationRepository
@@ -14,6 +16,29 @@ from src.repositories.interfaces.conversation_repository import ConversationRepo
 logging.basicConfig(level=logging.DEBUG)
 logger = logging.getLogger(__name__)
 
+_INSERT_MESSAGE_NAMED = (
+    "INSERT INTO messages (id, conversation_id, parent_id, active_child_id, data) "
+    "VALUES (:id, :conversation_id, :parent_id, :active_child_id, :data)"
+)
+_SET_ACTIVE_CHILD_NAMED = "UPDATE messages SET active_child_id = :active_child_id WHERE id = :id"
+
+# The conversation row (depth -1), then the thread from its root message in order
+_CONVERSATION_WITH_THREAD = """
+    WITH RECURSIVE thread(data, active_child_id, depth) AS (
+        SELECT m.data, m.active_child_id, 0
+        FROM conversations c JOIN messages m ON m.id = c.root_message_id
+        WHERE c.id = :conversation_id
+        UNION ALL
+        SELECT m.data, m.active_child_id, t.depth + 1
+        FROM thread t JOIN messages m ON m.id = t.active_child_id
+        WHERE t.depth < 10000
+    )
+    SELECT data, NULL, -1 AS depth FROM conversations WHERE id = :conversation_id
+    UNION ALL
+    SELECT data, active_child_id, depth FROM thread
+    ORDER BY depth
+"""
+
 class SQLiteConversationRepository(ConversationRepository):
     def __init__(self, db_path: str):
         self.db_path = db_path
@@ -50,8 +75,57 @@ class SQLiteConversationRepository(ConversationRepository):
                     FOREIGN KEY (active_child_id) REFERENCES messages(id)
                 )
             """)
+            
+            # Databases from before idx_messages_parent may embed each message's children in its data
+            if not db.execute("SELECT 1 FROM sqlite_master WHERE name = 'idx_messages_parent'").fetchone():
+                self._strip_embedded_children(db)
+            db.execute("CREATE INDEX IF NOT EXISTS idx_messages_parent ON messages (parent_id)")
+            db.execute("CREATE INDEX IF NOT EXISTS idx_messages_conversation ON messages (conversation_id)")
             db.commit()
     
+    def _strip_embedded_children(self, db: sqlite3.Connection, batch_size: int = 500):
+        """Rewrite messages stored with copies of their descendants; the tree is kept by parent_id and active_child_id"""
+        stripped, last_rowid = 0, -1
+        while True:
+            rows = db.execute(
+                "SELECT rowid, data FROM messages WHERE rowid > ? ORDER BY rowid LIMIT ?",
+                (last_rowid, batch_size)
+            ).fetchall()
+            if not rows:
+                break
+            last_rowid = rows[-1][0]
+            updates = []
+            for rowid, blob in rows:
+                data = decode_blob(blob)
+                if data.get("children") is not None or data.get("active_child") is not None:
+                    data["children"] = data["active_child"] = None
+                    updates.append((encode_blob(data), rowid))
+            db.executemany("UPDATE messages SET data = ? WHERE rowid = ?", updates)
+            stripped += len(updates)
+        if stripped:
+            logger.info(f"Removed embedded children from {stripped} stored messages")
+    
+    @asynccontextmanager
+    async def _connect(self):
+        """Borrow a pooled connection within the current workload's DB connection budget"""
+        async with db_budget():
+            async with sqlite_connection(self.db_path) as db:
+                yield db
+    
+    def _message_blob(self, message: Message) -> bytes:
+        """A message's stored data; the tree lives in the parent_id and active_child_id columns, not in children"""
+        if message.children is not None or message.active_child is not None:
+            message = message.model_copy(update={"children": None, "active_child": None})
+        return encode_blob(message)
+    
+    def _message_from_row(self, row) -> Message:
+        """A message from its (data, active_child_id) row; the column is authoritative for the active child"""
+        data = decode_blob(row[0])
+        data.pop("children", None)
+        data.pop("active_child", None)
+        data["active_child_id"] = row[1]
+        return Message.from_dict(data)
+    
     async def create_conversation(self, conversation: Conversation, session: Optional[AsyncSession] = None) -> Conversation:
         # logger.debug(f"Creating conversation with ID: {conversation.id}")
         # logger.debug(f"Conversation data: {conversation.model_dump()}")
@@ -65,18 +139,18 @@ class SQLiteConversationRepository(ConversationRepository):
                     "document_id": conversation.document_id,
                     "block_id": conversation.block_id,
                     "root_message_id": conversation.root_message_id,
-                    "data": json.dumps(conversation.model_dump())
+                    "data": encode_blob(conversation)
                 }
             )
             await session.commit()
             return conversation
 
         # logger.debug("Using aiosqlite connection")
-        async with aiosqlite.connect(self.db_path) as db:
+        async with self._connect() as db:
             try:
                 await db.execute(
                     "INSERT INTO conversations (id, document_id, block_id, root_message_id, data) VALUES (?, ?, ?, ?, ?)",
-                    (conversation.id, conversation.document_id, conversation.block_id, conversation.root_message_id, json.dumps(conversation.model_dump()))
+                    (conversation.id, conversation.document_id, conversation.block_id, conversation.root_message_id, encode_blob(conversation))
                 )
                 await db.commit()
                 # logger.debug("Successfully created conversation")
@@ -86,91 +160,71 @@ class SQLiteConversationRepository(ConversationRepository):
                 raise
     
     async def add_message(self, message: Message, session: Optional[AsyncSession] = None) -> Message:
+        """Add a message and make it its parent's active child; the parent's row is not rewritten"""
+        values = {
+            "id": message.id,
+            "conversation_id": message.conversation_id,
+            "parent_id": message.parent_id,
+            "active_child_id": message.active_child_id,
+            "data": self._message_blob(message)
+        }
         if session:
-            # First add the message
-            await session.execute(
-                text("INSERT INTO messages (id, conversation_id, parent_id, active_child_id, data) VALUES (:id, :conversation_id, :parent_id, :active_child_id, :data)"),
-                {
-                    "id": message.id,
-                    "conversation_id": message.conversation_id,
-                    "parent_id": message.parent_id,
-                    "active_child_id": message.active_child_id,
-                    "data": json.dumps(message.model_dump())
-                }
-            )
-            
-            # If message has a parent, add it to parent's children list and set as active child
+            await session.execute(text(_INSERT_MESSAGE_NAMED), values)
             if message.parent_id:
-                result = await session.execute(
-                    text("SELECT data FROM messages WHERE id = :id"),
-                    {"id": message.parent_id}
-                )
-                row = result.fetchone()
-                if row:
-                    parent = Message.from_dict(json.loads(row[0]))
-                    if parent.children is None:
-                        parent.children = []
-                    parent.children.append(message)
-                    parent.active_child_id = message.id  # Set as active child
-                    await session.execute(
-                        text("UPDATE messages SET data = :data, active_child_id = :active_child_id WHERE id = :id"),
-                        {
-                            "id": parent.id,
-                            "data": json.dumps(parent.model_dump()),
-                            "active_child_id": message.id
-                        }
-                    )
+                await session.execute(text(_SET_ACTIVE_CHILD_NAMED), {"id": message.parent_id, "active_child_id": message.id})
             await session.commit()
             return message
 
-        async with aiosqlite.connect(self.db_path) as db:
-            # First add the message
-            await db.execute(
-                "INSERT INTO messages (id, conversation_id, parent_id, active_child_id, data) VALUES (?, ?, ?, ?, ?)",
-                (message.id, message.conversation_id, message.parent_id, message.active_child_id, json.dumps(message.model_dump()))
-            )
-            
-            # If message has a parent, add it to parent's children list and set as active child
+        async with self._connect() as db:
+            await db.execute(_INSERT_MESSAGE_NAMED, values)
             if message.parent_id:
-                async with db.execute(
-                    "SELECT data FROM messages WHERE id = ?",
-                    (message.parent_id,)
-                ) as cursor:
-                    row = await cursor.fetchone()
-                    if row:
-                        parent = Message.from_dict(json.loads(row[0]))
-                        if parent.children is None:
-                            parent.children = []
-                        parent.children.append(message)
-                        parent.active_child_id = message.id  # Set as active child
-                        await db.execute(
-                            "UPDATE messages SET data = ?, active_child_id = ? WHERE id = ?",
-                            (json.dumps(parent.model_dump()), message.id, parent.id)
-                        )
+                await db.execute(_SET_ACTIVE_CHILD_NAMED, {"id": message.parent_id, "active_child_id": message.id})
             await db.commit()
             return message
     
+    async def save_messages(self, new_messages: List[Message], changed_messages: List[Message], session: Optional[AsyncSession] = None) -> None:
+        """Insert messages and point their parents at them, in one transaction"""
+        inserts = [
+            {"id": m.id, "conversation_id": m.conversation_id, "parent_id": m.parent_id, "active_child_id": m.active_child_id, "data": self._message_blob(m)}
+            for m in new_messages
+        ]
+        updates = [{"id": m.id, "active_child_id": m.active_child_id} for m in changed_messages]
+        if session:
+            if inserts:
+                await session.execute(text(_INSERT_MESSAGE_NAMED), inserts)
+            if updates:
+                await session.execute(text(_SET_ACTIVE_CHILD_NAMED), updates)
+            await session.commit()
+            return
+
+        async with self._connect() as db:
+            if inserts:
+                await db.executemany(_INSERT_MESSAGE_NAMED, inserts)
+            if updates:
+                await db.executemany(_SET_ACTIVE_CHILD_NAMED, updates)
+            await db.commit()
+    
     async def edit_message(self, message_id: str, new_content: str, session: Optional[AsyncSession] = None) -> Tuple[Message, str]:
         """Create a new version of a message as a sibling (sharing the same parent)"""
         # Get original message
         original_msg = None
         if session:
             result = await session.execute(
-                text("SELECT data FROM messages WHERE id = :id"),
+                text("SELECT data, active_child_id FROM messages WHERE id = :id"),
                 {"id": message_id}
             )
             row = result.fetchone()
             if row:
-                original_msg = Message.from_dict(json.loads(row[0]))
+                original_msg = self._message_from_row(row)
         else:
-            async with aiosqlite.connect(self.db_path) as db:
+            async with self._connect() as db:
                 async with db.execute(
-                    "SELECT data FROM messages WHERE id = ?",
+                    "SELECT data, active_child_id FROM messages WHERE id = ?",
                     (message_id,)
                 ) as cursor:
                     row = await cursor.fetchone()
                     if row:
-                        original_msg = Message.from_dict(json.loads(row[0]))
+                        original_msg = self._message_from_row(row)
         
         if not original_msg:
             raise ValueError(f"Message {message_id} not found")
@@ -189,34 +243,8 @@ class SQLiteConversationRepository(ConversationRepository):
         )
         logger.debug(f"Created new version: {new_msg.id}, parent_id: {new_msg.parent_id}")
         
-        # Add new message (parent's children list will be updated in add_message)
-        await self.add_message(new_msg)
-        
-        # Update parent's active_child_id to point to new version
-        if new_msg.parent_id:
-            await self.set_active_version(new_msg.parent_id, new_msg.id)
-            logger.debug(f"Set parent {new_msg.parent_id} active_child_id to {new_msg.id}")
-            
-            # Also update parent message object in memory
-            if session:
-                result = await session.execute(
-                    text("SELECT data FROM messages WHERE id = :id"),
-                    {"id": new_msg.parent_id}
-                )
-                row = result.fetchone()
-                if row:
-                    parent = Message.from_dict(json.loads(row[0]))
-                    parent.active_child_id = new_msg.id
-            else:
-                async with aiosqlite.connect(self.db_path) as db:
-                    async with db.execute(
-                        "SELECT data FROM messages WHERE id = ?",
-                        (new_msg.parent_id,)
-                    ) as cursor:
-                        row = await cursor.fetchone()
-                        if row:
-                            parent = Message.from_dict(json.loads(row[0]))
-                            parent.active_child_id = new_msg.id
+        # Add new message, which becomes its parent's active child
+        await self.add_message(new_msg, session)
         
         return new_msg, new_msg.id
     
@@ -225,61 +253,59 @@ class SQLiteConversationRepository(ConversationRepository):
         if session:
             # Start with the requested message
             result = await session.execute(
-                text("SELECT data FROM messages WHERE id = :id"),
+                text("SELECT data, active_child_id FROM messages WHERE id = :id"),
                 {"id": message_id}
             )
             row = result.fetchone()
             if not row:
                 return []
             
-            current_msg = Message.from_dict(json.loads(row[0]))
+            current_msg = self._message_from_row(row)
             logger.debug(f"Current message: {current_msg.id}, parent_id: {current_msg.parent_id}, role: {current_msg.role}")
             
             # Get all messages with same parent_id as this message (siblings)
             # OR all messages that have this message as their parent_id
             result = await session.execute(
                 text("""
-                    SELECT data FROM messages 
+                    SELECT data, active_child_id FROM messages 
                     WHERE (parent_id = :parent_id AND parent_id IS NOT NULL)  -- Get siblings
                     OR id = :message_id  -- Include the original message
-                    ORDER BY json_extract(data, '$.created_at')
                 """),
                 {"parent_id": current_msg.parent_id, "message_id": message_id}
             )
             rows = result.fetchall()
-            versions = [Message.from_dict(json.loads(row[0])) for row in rows]
+            versions = sorted((self._message_from_row(row) for row in rows), key=lambda m: m.created_at)
             logger.debug(f"Found {len(versions)} versions:")
             for v in versions:
                 logger.debug(f"  - {v.id} (parent: {v.parent_id}, role: {v.role})")
             
             return versions
 
-        async with aiosqlite.connect(self.db_path) as db:
+        async with self._connect() as db:
             # Start with the requested message
             async with db.execute(
-                "SELECT data FROM messages WHERE id = ?",
+                "SELECT data, active_child_id FROM messages WHERE id = ?",
                 (message_id,)
             ) as cursor:
                 row = await cursor.fetchone()
                 if not row:
                     return []
                 
-                current_msg = Message.from_dict(json.loads(row[0]))
+                current_msg = self._message_from_row(row)
                 logger.debug(f"Current message: {current_msg.id}, parent_id: {current_msg.parent_id}, role: {current_msg.role}")
                 
                 # Get all messages with same parent_id as this message (siblings)
                 # OR all messages that have this message as their parent_id
                 async with db.execute(
                     """
-                    SELECT data FROM messages 
+                    SELECT data, active_child_id FROM messages 
                     WHERE (parent_id = ? AND parent_id IS NOT NULL)  -- Get siblings
                     OR id = ?  -- Include the original message
-                    ORDER BY json_extract(data, '$.created_at')
                     """,
                     (current_msg.parent_id, message_id)
                 ) as cursor:
                     rows = await cursor.fetchall()
-                    versions = [Message.from_dict(json.loads(row[0])) for row in rows]
+                    versions = sorted((self._message_from_row(row) for row in rows), key=lambda m: m.created_at)
                     logger.debug(f"Found {len(versions)} versions:")
                     for v in versions:
                         logger.debug(f"  - {v.id} (parent: {v.parent_id}, role: {v.role})")
@@ -294,18 +320,18 @@ class SQLiteConversationRepository(ConversationRepository):
             )
             row = result.fetchone()
             if row:
-                data = json.loads(row[0])
+                data = decode_blob(row[0])
                 return Conversation.from_dict(data)
             return None
 
-        async with aiosqlite.connect(self.db_path) as db:
+        async with self._connect() as db:
             async with db.execute(
                 "SELECT data FROM conversations WHERE id = ?",
                 (conversation_id,)
             ) as cursor:
                 row = await cursor.fetchone()
                 if row:
-                    data = json.loads(row[0])
+                    data = decode_blob(row[0])
                     return Conversation.from_dict(data)
         return None
     
@@ -316,16 +342,16 @@ class SQLiteConversationRepository(ConversationRepository):
                 {"block_id": block_id}
             )
             rows = result.fetchall()
-            return [Conversation.from_dict(json.loads(row[0])) for row in rows]
+            return [Conversation.from_dict(decode_blob(row[0])) for row in rows]
 
         conversations = []
-        async with aiosqlite.connect(self.db_path) as db:
+        async with self._connect() as db:
             async with db.execute(
                 "SELECT data FROM conversations WHERE block_id = ?",
                 (block_id,)
             ) as cursor:
                 async for row in cursor:
-                    data = json.loads(row[0])
+                    data = decode_blob(row[0])
                     conversations.append(Conversation.from_dict(data))
         return conversations
     
@@ -352,12 +378,11 @@ class SQLiteConversationRepository(ConversationRepository):
                 if not row:
                     break
                 
-                data = json.loads(row[0])
-                messages.append(Message.from_dict(data))
+                messages.append(self._message_from_row(row))
                 current_id = row[1]  # active_child_id
             return messages
         
-        async with aiosqlite.connect(self.db_path) as db:
+        async with self._connect() as db:
             while current_id:
                 async with db.execute(
                     "SELECT data, active_child_id FROM messages WHERE id = ?",
@@ -367,61 +392,36 @@ class SQLiteConversationRepository(ConversationRepository):
                     if not row:
                         break
                     
-                    data = json.loads(row[0])
-                    messages.append(Message.from_dict(data))
+                    messages.append(self._message_from_row(row))
                     current_id = row[1]  # active_child_id
         for i in range(len(messages)):
             logger.debug(f"Message {i}: {messages[i].content}")
         return messages
     
+    async def get_conversation_with_thread(self, conversation_id: str, session: Optional[AsyncSession] = None) -> Tuple[Optional[Conversation], List[Message]]:
+        """Get a conversation and its active thread in one query, following active_child_id from the root"""
+        params = {"conversation_id": conversation_id}
+        if session:
+            rows = (await session.execute(text(_CONVERSATION_WITH_THREAD), params)).fetchall()
+        else:
+            async with self._connect() as db:
+                async with db.execute(_CONVERSATION_WITH_THREAD, params) as cursor:
+                    rows = await cursor.fetchall()
+        if not rows:
+            return None, []
+        conversation = Conversation.from_dict(decode_blob(rows[0][0]))
+        return conversation, [self._message_from_row(row) for row in rows[1:]]
+    
     async def set_active_version(self, parent_id: str, child_id: str, session: Optional[AsyncSession] = None) -> None:
         """Set a message's active child version"""
+        values = {"id": parent_id, "active_child_id": child_id}
         if session:
-            # Update the active_child_id in the messages table
-            await session.execute(
-                text("UPDATE messages SET active_child_id = :child_id WHERE id = :parent_id"),
-                {"parent_id": parent_id, "child_id": child_id}
-            )
-            
-            # Also update the active_child_id in the message data
-            result = await session.execute(
-                text("SELECT data FROM messages WHERE id = :id"),
-                {"id": parent_id}
-            )
-            row = result.fetchone()
-            if row:
-                parent = Message.from_dict(json.loads(row[0]))
-                parent.active_child_id = child_id
-                await session.execute(
-                    text("UPDATE messages SET data = :data WHERE id = :id"),
-                    {
-                        "id": parent_id,
-                        "data": json.dumps(parent.model_dump())
-                    }
-                )
+            await session.execute(text(_SET_ACTIVE_CHILD_NAMED), values)
             await session.commit()
             return
 
-        async with aiosqlite.connect(self.db_path) as db:
-            # Update the active_child_id in the messages table
-            await db.execute(
-                "UPDATE messages SET active_child_id = ? WHERE id = ?",
-                (child_id, parent_id)
-            )
-            
-            # Also update the active_child_id in the message data
-            async with db.execute(
-                "SELECT data FROM messages WHERE id = ?",
-                (parent_id,)
-            ) as cursor:
-                row = await cursor.fetchone()
-                if row:
-                    parent = Message.from_dict(json.loads(row[0]))
-                    parent.active_child_id = child_id
-                    await db.execute(
-                        "UPDATE messages SET data = ? WHERE id = ?",
-                        (json.dumps(parent.model_dump()), parent_id)
-                    )
+        async with self._connect() as db:
+            await db.execute(_SET_ACTIVE_CHILD_NAMED, values)
             await db.commit()
     
     async def get_document_conversations(self, document_id: str, session: Optional[AsyncSession] = None) -> List[Conversation]:
@@ -433,18 +433,18 @@ class SQLiteConversationRepository(ConversationRepository):
             )
             conversations = []
             for row in result:
-                data = json.loads(row[0])
+                data = decode_blob(row[0])
                 conversations.append(Conversation.from_dict(data))
             return conversations
             
-        async with aiosqlite.connect(self.db_path) as db:
+        async with self._connect() as db:
             async with db.execute(
                 "SELECT data FROM conversations WHERE document_id = ?",
                 (document_id,)
             ) as cursor:
                 conversations = []
                 async for row in cursor:
-                    data = json.loads(row[0])
+                    data = decode_blob(row[0])
                     conversations.append(Conversation.from_dict(data))
                 return conversations
     
@@ -452,25 +452,17 @@ class SQLiteConversationRepository(ConversationRepository):
         """Get all messages in a conversation from SQLite."""
         if session:
             result = await session.execute(
-                text("SELECT data FROM messages WHERE conversation_id = :conv_id"),
+                text("SELECT data, active_child_id FROM messages WHERE conversation_id = :conv_id"),
                 {"conv_id": conversation_id}
             )
-            messages = []
-            for row in result:
-                data = json.loads(row[0])
-                messages.append(Message.from_dict(data))
-            return messages
+            return [self._message_from_row(row) for row in result]
             
-        async with aiosqlite.connect(self.db_path) as db:
+        async with self._connect() as db:
             async with db.execute(
-                "SELECT data FROM messages WHERE conversation_id = ?",
+                "SELECT data, active_child_id FROM messages WHERE conversation_id = ?",
                 (conversation_id,)
             ) as cursor:
-                messages = []
-                async for row in cursor:
-                    data = json.loads(row[0])
-                    messages.append(Message.from_dict(data))
-                return messages
+                return [self._message_from_row(row) async for row in cursor]
     
     async def update_conversation(self, conversation: Conversation, session: Optional[AsyncSession] = None) -> Conversation:
         """Update an existing conversation"""
@@ -482,17 +474,17 @@ class SQLiteConversationRepository(ConversationRepository):
                     "document_id": conversation.document_id,
                     "block_id": conversation.block_id,
                     "root_message_id": conversation.root_message_id,
-                    "data": json.dumps(conversation.model_dump())
+                    "data": encode_blob(conversation)
                 }
             )
             await session.commit()
             return conversation
 
-        async with aiosqlite.connect(self.db_path) as db:
+        async with self._connect() as db:
             try:
                 await db.execute(
                     "UPDATE conversations SET document_id = ?, block_id = ?, root_message_id = ?, data = ? WHERE id = ?",
-                    (conversation.document_id, conversation.block_id, conversation.root_message_id, json.dumps(conversation.model_dump()), conversation.id)
+                    (conversation.document_id, conversation.block_id, conversation.root_message_id, encode_blob(conversation), conversation.id)
                 )
                 await db.commit()
                 return conversation
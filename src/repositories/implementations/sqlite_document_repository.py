@@ -1,15 +1,105 @@
 from typing import List, Optional, Dict, Any
-import aiosqlite
+import asyncio
+import html
+import re
 import sqlite3
-import json
+from contextlib import asynccontextmanager
 import os
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import text
-from src.models.base.document import Document
+from src.services.scheduling.bulkhead import db_budget, run_blocking
+from src.repositories.sqlite_engine import sqlite_connection
+from src.repositories.codec import encode_blob, decode_model
+from src.models.base.document import Document, DocumentStatus
 from src.models.viewer.page import Page
-from src.models.viewer.block import Block
+from src.models.viewer.block import Block, BlockSearchResult
 from src.repositories.interfaces.document_repository import DocumentRepository
 
+# Batches larger than this are serialised on a worker thread instead of the event loop
+SERIALIZE_INLINE_ROWS = 200
+# Tokens of context in a search result's snippet
+SNIPPET_TOKENS = 12
+# Blocks are written in chunks so serialising one chunk overlaps writing the previous one
+WRITE_CHUNK_ROWS = 5000
+
+# Columns selected to build a Block; page number and reading order are authoritative in their columns
+_BLOCK_FIELDS = "data, page_number, reading_order"
+# Reading order of a document's blocks; blocks missing a page number or position (possible in
+# migrated databases) come first, and the ID makes every key unique so keyset pages never skip ties
+_READING_ORDER = "COALESCE(page_number, -1), COALESCE(reading_order, -1), id"
+_PAGE_COLUMNS = ("id", "document_id", "page_number", "data")
+_BLOCK_COLUMNS = ("id", "page_id", "document_id", "page_number", "block_type", "reading_order", "text", "data")
+_INSERT_PAGE = "INSERT OR REPLACE INTO pages (id, document_id, page_number, data) VALUES (?, ?, ?, ?)"
+# An upsert rather than INSERT OR REPLACE: REPLACE deletes without firing triggers, which would leave stale search entries
+# (user_id is copied from the block's document, which is always stored first, so search can be scoped to a user)
+_UPSERT_BLOCK_SET = """
+    ON CONFLICT (id) DO UPDATE SET
+        page_id = excluded.page_id, document_id = excluded.document_id, user_id = excluded.user_id,
+        page_number = excluded.page_number, block_type = excluded.block_type, reading_order = excluded.reading_order,
+        text = excluded.text, data = excluded.data
+"""
+_INSERT_BLOCK = """
+    INSERT INTO blocks (id, page_id, document_id, user_id, page_number, block_type, reading_order, text, data)
+    VALUES (?1, ?2, ?3, (SELECT user_id FROM documents WHERE id = ?3),
+            COALESCE(?4, (SELECT page_number FROM pages WHERE id = ?2)), ?5, ?6, ?7, ?8)
+""" + _UPSERT_BLOCK_SET
+_INSERT_PAGE_NAMED = """
+    INSERT OR REPLACE INTO pages (id, document_id, page_number, data)
+    VALUES (:id, :document_id, :page_number, :data)
+"""
+_INSERT_BLOCK_NAMED = """
+    INSERT INTO blocks (id, page_id, document_id, user_id, page_number, block_type, reading_order, text, data)
+    VALUES (:id, :page_id, :document_id, (SELECT user_id FROM documents WHERE id = :document_id),
+            COALESCE(:page_number, (SELECT page_number FROM pages WHERE id = :page_id)),
+            :block_type, :reading_order, :text, :data)
+""" + _UPSERT_BLOCK_SET
+
+_TAG = re.compile(r"<[^>]+>")
+_SEARCH_TERM = re.compile(r"\w+")
+
+def plain_text(html_content: Optional[str]) -> str:
+    """Text of a block's HTML, as indexed for search"""
+    if not html_content:
+        return ""
+    content = _TAG.sub(" ", html_content)
+    if "&" in content:
+        content = html.unescape(content)
+    return " ".join(content.split())
+
+def fts_query(query: str) -> str:
+    """An FTS5 MATCH expression for blocks whose text has every word of a free-text query.
+
+    Words are quoted so user input can't form FTS syntax. They match on their
+    stem, so "proteins" also finds "protein"; there is no prefix matching, as
+    a short prefix expands to so many terms that a query takes seconds.
+    """
+    terms = " ".join(f'"{term}"' for term in _SEARCH_TERM.findall(query))
+    return f"text : ({terms})" if terms else ""
+
+def _fts_phrase(value: str) -> str:
+    """An FTS5 string literal"""
+    return '"' + value.replace('"', '""') + '"'
+
+def _page_rows(pages: List[Page]) -> List[tuple]:
+    return [(page.id, page.document_id, page.page_number, encode_blob(page)) for page in pages]
+
+def _block_rows(blocks: List[Block], reading_orders: List[int]) -> List[tuple]:
+    return [
+        (block.id, block.page_id, block.document_id, block.page_number, block.block_type, reading_order,
+         plain_text(block.html_content), encode_blob(block))
+        for block, reading_order in zip(blocks, reading_orders)
+    ]
+
+def _reading_orders(blocks: List[Block]) -> List[int]:
+    """Position of each block on its page: its own reading_order, else its place among the page's blocks given"""
+    positions: Dict[Optional[str], int] = {}
+    orders = []
+    for block in blocks:
+        order = positions.get(block.page_id, 0)
+        positions[block.page_id] = order + 1
+        orders.append(block.reading_order if block.reading_order is not None else order)
+    return orders
+
 class SQLiteDocumentRepository(DocumentRepository):
     """SQLite implementation of DocumentRepository."""
     
@@ -28,6 +118,9 @@ class SQLiteDocumentRepository(DocumentRepository):
             db.execute("""
                 CREATE TABLE IF NOT EXISTS documents (
                     id TEXT PRIMARY KEY,
+                    content_hash TEXT,
+                    status TEXT,
+                    user_id TEXT,
                     data TEXT NOT NULL
                 )
             """)
@@ -37,6 +130,7 @@ class SQLiteDocumentRepository(DocumentRepository):
                 CREATE TABLE IF NOT EXISTS pages (
                     id TEXT PRIMARY KEY,
                     document_id TEXT NOT NULL,
+                    page_number INTEGER,
                     data TEXT NOT NULL,
                     FOREIGN KEY (document_id) REFERENCES documents(id)
                 )
@@ -47,28 +141,142 @@ class SQLiteDocumentRepository(DocumentRepository):
                 CREATE TABLE IF NOT EXISTS blocks (
                     id TEXT PRIMARY KEY,
                     page_id TEXT NOT NULL,
+                    document_id TEXT,
+                    user_id TEXT,
+                    page_number INTEGER,
+                    block_type TEXT,
+                    reading_order INTEGER,
+                    text TEXT,
                     data TEXT NOT NULL,
                     FOREIGN KEY (page_id) REFERENCES pages(id)
                 )
             """)
+            
+            self._migrate(db)
+            db.execute("CREATE INDEX IF NOT EXISTS idx_documents_content_hash_status ON documents (content_hash, status)")
+            db.execute("CREATE INDEX IF NOT EXISTS idx_documents_status ON documents (status)")
+            db.execute("CREATE INDEX IF NOT EXISTS idx_documents_user_id ON documents (user_id)")
+            db.execute("CREATE INDEX IF NOT EXISTS idx_pages_document ON pages (document_id, page_number)")
+            # Listing a document's or a page's blocks is a range scan in reading order
+            db.execute("DROP INDEX IF EXISTS idx_blocks_document")  # Superseded by idx_blocks_reading_order
+            db.execute(f"CREATE INDEX IF NOT EXISTS idx_blocks_reading_order ON blocks (document_id, {_READING_ORDER})")
+            db.execute("CREATE INDEX IF NOT EXISTS idx_blocks_page ON blocks (page_id, reading_order)")
+            self._ensure_search_index(db)
             db.commit()
     
+    def _add_column_if_missing(self, db: sqlite3.Connection, table: str, column: str, definition: str) -> bool:
+        """Add a column to an existing table, returning True if it was added"""
+        columns = {row[1] for row in db.execute(f"PRAGMA table_info({table})")}
+        if column in columns:
+            return False
+        db.execute(f"ALTER TABLE {table} ADD COLUMN {column} {definition}")
+        return True
+    
+    def _migrate(self, db: sqlite3.Connection):
+        """Bring databases created by older versions up to the current schema"""
+        if self._add_column_if_missing(db, "documents", "content_hash", "TEXT"):
+            db.execute("UPDATE documents SET content_hash = json_extract(data, '$.content_hash')")
+        if self._add_column_if_missing(db, "documents", "status", "TEXT"):
+            db.execute("UPDATE documents SET status = json_extract(data, '$.status')")
+            db.execute("DROP INDEX IF EXISTS idx_documents_content_hash")  # Superseded by (content_hash, status)
+        if self._add_column_if_missing(db, "documents", "user_id", "TEXT"):
+            db.execute("UPDATE documents SET user_id = json_extract(data, '$.user_id')")
+        if self._add_column_if_missing(db, "pages", "page_number", "INTEGER"):
+            db.execute("UPDATE pages SET page_number = json_extract(data, '$.page_number')")
+        if self._add_column_if_missing(db, "blocks", "document_id", "TEXT"):
+            db.execute("UPDATE blocks SET document_id = json_extract(data, '$.document_id')")
+        if self._add_column_if_missing(db, "blocks", "user_id", "TEXT"):
+            db.execute("UPDATE blocks SET user_id = (SELECT user_id FROM documents WHERE documents.id = blocks.document_id)")
+        if self._add_column_if_missing(db, "blocks", "block_type", "TEXT"):
+            db.execute("UPDATE blocks SET block_type = json_extract(data, '$.block_type')")
+        if self._add_column_if_missing(db, "blocks", "page_number", "INTEGER"):
+            # Older blocks only know their page through the pages table
+            db.execute("""
+                UPDATE blocks SET page_number = COALESCE(
+                    json_extract(data, '$.page_number'),
+                    (SELECT page_number FROM pages WHERE pages.id = blocks.page_id)
+                )
+            """)
+        if self._add_column_if_missing(db, "blocks", "text", "TEXT"):
+            db.create_function("plain_text", 1, plain_text, deterministic=True)
+            db.execute("UPDATE blocks SET text = plain_text(json_extract(data, '$.html_content'))")
+        if self._add_column_if_missing(db, "blocks", "reading_order", "INTEGER"):
+            # A page lists its block IDs in reading order
+            db.execute("""
+                UPDATE blocks SET reading_order = (
+                    SELECT CAST(ids.key AS INTEGER)
+                    FROM pages, json_each(pages.data, '$.block_ids') AS ids
+                    WHERE pages.id = blocks.page_id AND ids.value = blocks.id
+                )
+            """)
+    
+    def _ensure_search_index(self, db: sqlite3.Connection):
+        """Full-text index over the blocks' text, kept in sync with the blocks table by triggers.
+
+        document_id and user_id are indexed too, so a scoped search intersects
+        the query's matches with one document's or user's blocks inside FTS5
+        instead of ranking matches from the whole library. The index refers to
+        blocks by rowid, which VACUUM may renumber; run
+        INSERT INTO blocks_fts(blocks_fts) VALUES('rebuild') after a VACUUM.
+        """
+        exists = db.execute("SELECT 1 FROM sqlite_master WHERE name = 'blocks_fts'").fetchone()
+        db.execute("""
+            CREATE VIRTUAL TABLE IF NOT EXISTS blocks_fts USING fts5(
+                text, document_id, user_id, content='blocks', content_rowid='rowid', tokenize='porter unicode61 remove_diacritics 2'
+            )
+        """)
+        db.execute("""
+            CREATE TRIGGER IF NOT EXISTS blocks_fts_insert AFTER INSERT ON blocks BEGIN
+                INSERT INTO blocks_fts (rowid, text, document_id, user_id)
+                VALUES (new.rowid, new.text, new.document_id, new.user_id);
+            END
+        """)
+        db.execute("""
+            CREATE TRIGGER IF NOT EXISTS blocks_fts_delete AFTER DELETE ON blocks BEGIN
+                INSERT INTO blocks_fts (blocks_fts, rowid, text, document_id, user_id)
+                VALUES ('delete', old.rowid, old.text, old.document_id, old.user_id);
+            END
+        """)
+        db.execute("""
+            CREATE TRIGGER IF NOT EXISTS blocks_fts_update AFTER UPDATE OF text, document_id, user_id ON blocks BEGIN
+                INSERT INTO blocks_fts (blocks_fts, rowid, text, document_id, user_id)
+                VALUES ('delete', old.rowid, old.text, old.document_id, old.user_id);
+                INSERT INTO blocks_fts (rowid, text, document_id, user_id)
+                VALUES (new.rowid, new.text, new.document_id, new.user_id);
+            END
+        """)
+        if not exists:
+            db.execute("INSERT INTO blocks_fts (blocks_fts) VALUES ('rebuild')")  # Index blocks stored before search existed
+    
+    @asynccontextmanager
+    async def _connect(self):
+        """Borrow a pooled connection within the current workload's DB connection budget"""
+        async with db_budget():
+            async with sqlite_connection(self.db_path) as db:
+                yield db
+    
     async def store_document(self, document: Document, session: Optional[AsyncSession] = None) -> None:
         """Store a document in SQLite."""
         if session:
             await session.execute(
-                text("INSERT OR REPLACE INTO documents (id, data) VALUES (:id, :data)"),
+                text("""
+                    INSERT OR REPLACE INTO documents (id, content_hash, status, user_id, data)
+                    VALUES (:id, :content_hash, :status, :user_id, :data)
+                """),
                 {
                     "id": document.id,
-                    "data": document.json()
+                    "content_hash": document.content_hash,
+                    "status": DocumentStatus(document.status).value,
+                    "user_id": document.user_id,
+                    "data": encode_blob(document)
                 }
             )
             return
             
-        async with aiosqlite.connect(self.db_path) as db:
+        async with self._connect() as db:
             await db.execute(
-                "INSERT OR REPLACE INTO documents (id, data) VALUES (?, ?)",
-                (document.id, document.json())
+                "INSERT OR REPLACE INTO documents (id, content_hash, status, user_id, data) VALUES (?, ?, ?, ?, ?)",
+                (document.id, document.content_hash, DocumentStatus(document.status).value, document.user_id, encode_blob(document))
             )
             await db.commit()
     
@@ -81,171 +289,322 @@ class SQLiteDocumentRepository(DocumentRepository):
             )
             row = result.fetchone()
             if row:
-                return Document.parse_raw(row[0])
+                return decode_model(Document, row[0])
             return None
             
-        async with aiosqlite.connect(self.db_path) as db:
+        async with self._connect() as db:
             async with db.execute(
                 "SELECT data FROM documents WHERE id = ?",
                 (document_id,)
             ) as cursor:
                 row = await cursor.fetchone()
                 if row:
-                    return Document.parse_raw(row[0])
+                    return decode_model(Document, row[0])
         return None
     
-    async def store_pages(self, pages: List[Page], session: Optional[AsyncSession] = None) -> None:
-        """Store pages in SQLite."""
+    async def get_document_by_hash(self, content_hash: str, session: Optional[AsyncSession] = None) -> Optional[Document]:
+        """Get a READY document with the given content hash from SQLite."""
         if session:
-            for page in pages:
-                await session.execute(
-                    text("INSERT OR REPLACE INTO pages (id, document_id, data) VALUES (:id, :document_id, :data)"),
-                    {
-                        "id": page.id,
-                        "document_id": page.document_id,
-                        "data": page.json()
-                    }
-                )
-            return
+            result = await session.execute(
+                text("""
+                    SELECT data FROM documents
+                    WHERE content_hash = :content_hash AND status = 'READY'
+                    LIMIT 1
+                """),
+                {"content_hash": content_hash}
+            )
+            row = result.fetchone()
+            if row:
+                return decode_model(Document, row[0])
+            return None
             
-        async with aiosqlite.connect(self.db_path) as db:
-            for page in pages:
-                await db.execute(
-                    "INSERT OR REPLACE INTO pages (id, document_id, data) VALUES (?, ?, ?)",
-                    (page.id, page.document_id, page.json())
-                )
-            await db.commit()
+        async with self._connect() as db:
+            async with db.execute(
+                """
+                SELECT data FROM documents
+                WHERE content_hash = ? AND status = 'READY'
+                LIMIT 1
+                """,
+                (content_hash,)
+            ) as cursor:
+                row = await cursor.fetchone()
+                if row:
+                    return decode_model(Document, row[0])
+        return None
+    
+    async def get_documents_by_status(self, statuses: List[str], session: Optional[AsyncSession] = None) -> List[Document]:
+        """Get all documents whose status is one of statuses from SQLite."""
+        if not statuses:
+            return []
+        if session:
+            params = {f"status_{i}": status for i, status in enumerate(statuses)}
+            placeholders = ", ".join(f":{name}" for name in params)
+            result = await session.execute(
+                text(f"SELECT data FROM documents WHERE status IN ({placeholders})"),
+                params
+            )
+            return [decode_model(Document, row[0]) for row in result]
+            
+        placeholders = ", ".join("?" for _ in statuses)
+        async with self._connect() as db:
+            async with db.execute(
+                f"SELECT data FROM documents WHERE status IN ({placeholders})",
+                tuple(statuses)
+            ) as cursor:
+                rows = await cursor.fetchall()
+                return [decode_model(Document, row[0]) for row in rows]
+    
+    async def store_pages(self, pages: List[Page], session: Optional[AsyncSession] = None) -> None:
+        """Store pages in SQLite."""
+        await self.store_pages_and_blocks(pages, [], session)
     
     async def get_document_pages(self, document_id: str, session: Optional[AsyncSession] = None) -> List[Page]:
         """Get all pages for a document from SQLite."""
         if session:
             result = await session.execute(
-                text("SELECT data FROM pages WHERE document_id = :document_id"),
+                text("SELECT data FROM pages WHERE document_id = :document_id ORDER BY page_number"),
                 {"document_id": document_id}
             )
-            return [Page.parse_raw(row[0]) for row in result]
+            return [decode_model(Page, row[0]) for row in result]
             
-        async with aiosqlite.connect(self.db_path) as db:
+        async with self._connect() as db:
             async with db.execute(
-                "SELECT data FROM pages WHERE document_id = ?",
+                "SELECT data FROM pages WHERE document_id = ? ORDER BY page_number",
                 (document_id,)
             ) as cursor:
                 rows = await cursor.fetchall()
-                return [Page.parse_raw(row[0]) for row in rows]
+                return [decode_model(Page, row[0]) for row in rows]
     
     async def store_blocks(self, blocks: List[Block], session: Optional[AsyncSession] = None) -> None:
-        """Store blocks in SQLite."""
+        """Store blocks in SQLite. Blocks must be given in reading order."""
+        await self.store_pages_and_blocks([], blocks, session)
+    
+    async def store_pages_and_blocks(self, pages: List[Page], blocks: List[Block], session: Optional[AsyncSession] = None) -> None:
+        """Store pages and their blocks with batched statements in a single transaction"""
+        page_rows = await self._serialize(_page_rows, pages)
+        orders = _reading_orders(blocks)
+        chunks = [
+            (blocks[start:start + WRITE_CHUNK_ROWS], orders[start:start + WRITE_CHUNK_ROWS])
+            for start in range(0, len(blocks), WRITE_CHUNK_ROWS)
+        ]
+        
+        # Pages go first so blocks without a page number can take their page's
         if session:
-            for block in blocks:
-                await session.execute(
-                    text("INSERT OR REPLACE INTO blocks (id, page_id, data) VALUES (:id, :page_id, :data)"),
-                    {
-                        "id": block.id,
-                        "page_id": block.page_id,
-                        "data": block.json()
-                    }
-                )
+            if page_rows:
+                await session.execute(text(_INSERT_PAGE_NAMED), [dict(zip(_PAGE_COLUMNS, row)) for row in page_rows])
+            for chunk_blocks, chunk_orders in chunks:
+                rows = await self._serialize(_block_rows, chunk_blocks, chunk_orders)
+                await session.execute(text(_INSERT_BLOCK_NAMED), [dict(zip(_BLOCK_COLUMNS, row)) for row in rows])
             return
             
-        async with aiosqlite.connect(self.db_path) as db:
-            for block in blocks:
-                await db.execute(
-                    "INSERT OR REPLACE INTO blocks (id, page_id, data) VALUES (?, ?, ?)",
-                    (block.id, block.page_id, block.json())
-                )
+        async with self._connect() as db:
+            if page_rows:
+                await db.executemany(_INSERT_PAGE, page_rows)
+            write = None
+            try:
+                for chunk_blocks, chunk_orders in chunks:
+                    rows = await self._serialize(_block_rows, chunk_blocks, chunk_orders)
+                    if write:
+                        await write
+                    write = asyncio.ensure_future(db.executemany(_INSERT_BLOCK, rows))
+            finally:
+                if write:
+                    await write
             await db.commit()
     
+    async def _serialize(self, fn, rows: list, *args) -> list:
+        """Build rows inline for small batches, on a worker thread for large ones"""
+        if len(rows) > SERIALIZE_INLINE_ROWS:
+            return await run_blocking(fn, rows, *args)
+        return fn(rows, *args)
+    
     async def get_page_blocks(self, page_id: str, session: Optional[AsyncSession] = None) -> List[Block]:
         """Get all blocks for a page from SQLite."""
         if session:
             result = await session.execute(
-                text("SELECT data FROM blocks WHERE page_id = :page_id"),
+                text(f"SELECT {_BLOCK_FIELDS} FROM blocks WHERE page_id = :page_id ORDER BY reading_order"),
                 {"page_id": page_id}
             )
-            return [Block.parse_raw(row[0]) for row in result]
+            return [self._block_from_row(row) for row in result]
             
-        async with aiosqlite.connect(self.db_path) as db:
+        async with self._connect() as db:
             async with db.execute(
-                "SELECT data FROM blocks WHERE page_id = ?",
+                f"SELECT {_BLOCK_FIELDS} FROM blocks WHERE page_id = ? ORDER BY reading_order",
                 (page_id,)
             ) as cursor:
                 rows = await cursor.fetchall()
-                return [Block.parse_raw(row[0]) for row in rows]
+                return [self._block_from_row(row) for row in rows]
     
     async def get_pages(self, document_id: str, session: Optional[AsyncSession] = None) -> List[Page]:
         """Get all pages for a document"""
         if session:
             result = await session.execute(
-                text("SELECT data FROM pages WHERE document_id = :document_id"),
+                text("SELECT data FROM pages WHERE document_id = :document_id ORDER BY page_number"),
                 {"document_id": document_id}
             )
-            return [Page.parse_raw(row[0]) for row in result]
+            return [decode_model(Page, row[0]) for row in result]
             
-        async with aiosqlite.connect(self.db_path) as db:
+        async with self._connect() as db:
             async with db.execute(
-                "SELECT data FROM pages WHERE document_id = ?",
+                "SELECT data FROM pages WHERE document_id = ? ORDER BY page_number",
                 (document_id,)
             ) as cursor:
                 rows = await cursor.fetchall()
-                return [Page.parse_raw(row[0]) for row in rows]
+                return [decode_model(Page, row[0]) for row in rows]
     
     async def get_blocks(self, document_id: str, session: Optional[AsyncSession] = None) -> List[Block]:
-        """Get all blocks for a document"""
+        """Get all blocks for a document, in reading order"""
         if session:
             result = await session.execute(
-                text("""
-                    SELECT b.data, p.data as page_data
-                    FROM blocks b 
-                    JOIN pages p ON b.page_id = p.id 
-                    WHERE p.document_id = :document_id
+                text(f"""
+                    SELECT {_BLOCK_FIELDS} FROM blocks
+                    WHERE document_id = :document_id
+                    ORDER BY {_READING_ORDER}
                 """),
                 {"document_id": document_id}
             )
-            blocks = []
-            for row in result:
-                block = Block.parse_raw(row[0])
-                page = Page.parse_raw(row[1])
-                block.page_number = page.page_number
-                blocks.append(block)
-            return blocks
-            
-        async with aiosqlite.connect(self.db_path) as db:
+            return [self._block_from_row(row) for row in result]
+            
+        async with self._connect() as db:
             async with db.execute(
-                """
-                SELECT b.data, p.data as page_data
-                FROM blocks b 
-                JOIN pages p ON b.page_id = p.id 
-                WHERE p.document_id = ?
+                f"""
+                SELECT {_BLOCK_FIELDS} FROM blocks
+                WHERE document_id = ?
+                ORDER BY {_READING_ORDER}
                 """,
                 (document_id,)
             ) as cursor:
                 rows = await cursor.fetchall()
-                blocks = []
-                for row in rows:
-                    block = Block.parse_raw(row[0])
-                    page = Page.parse_raw(row[1])
-                    block.page_number = page.page_number
-                    blocks.append(block)
-                return blocks
+                return [self._block_from_row(row) for row in rows]
+    
+    async def get_blocks_by_page_number(self, document_id: str, page_number: int, session: Optional[AsyncSession] = None) -> List[Block]:
+        """Get the blocks of one page of a document, in reading order"""
+        if session:
+            result = await session.execute(
+                text(f"""
+                    SELECT {_BLOCK_FIELDS} FROM blocks
+                    WHERE document_id = :document_id AND COALESCE(page_number, -1) = :page_number
+                    ORDER BY {_READING_ORDER}
+                """),
+                {"document_id": document_id, "page_number": page_number}
+            )
+            return [self._block_from_row(row) for row in result]
+            
+        async with self._connect() as db:
+            async with db.execute(
+                f"""
+                SELECT {_BLOCK_FIELDS} FROM blocks
+                WHERE document_id = ? AND COALESCE(page_number, -1) = ?
+                ORDER BY {_READING_ORDER}
+                """,
+                (document_id, page_number)
+            ) as cursor:
+                rows = await cursor.fetchall()
+                return [self._block_from_row(row) for row in rows]
+    
+    async def get_blocks_after(self, document_id: str, after: Optional[str] = None, limit: int = 100, session: Optional[AsyncSession] = None) -> Optional[List[Block]]:
+        """Get up to limit blocks of a document in reading order, starting after the block with ID after.
+
+        The cursor is resolved to its reading-order key, and the scan of
+        idx_blocks_reading_order starts at the cursor's page, so a call costs
+        the same whatever the offset. None if after is not a block of the document.
+        """
+        if after is None:
+            query = f"""
+                SELECT {_BLOCK_FIELDS} FROM blocks
+                WHERE document_id = :document_id
+                ORDER BY {_READING_ORDER}
+                LIMIT :limit
+            """
+        else:
+            # The page bound is what the index can seek on; the row value orders within the page
+            query = f"""
+                WITH cursor (page_key, order_key, id) AS (
+                    SELECT {_READING_ORDER} FROM blocks WHERE id = :after AND document_id = :document_id
+                )
+                SELECT {_BLOCK_FIELDS} FROM blocks
+                WHERE document_id = :document_id
+                  AND COALESCE(page_number, -1) >= (SELECT page_key FROM cursor)
+                  AND ({_READING_ORDER}) > (SELECT page_key, order_key, id FROM cursor)
+                ORDER BY {_READING_ORDER}
+                LIMIT :limit
+            """
+        exists = "SELECT 1 FROM blocks WHERE id = :after AND document_id = :document_id"
+        params = {"document_id": document_id, "after": after, "limit": limit}
+        if session:
+            rows = (await session.execute(text(query), params)).fetchall()
+            if not rows and after is not None and (await session.execute(text(exists), params)).first() is None:
+                return None
+            return [self._block_from_row(row) for row in rows]
+            
+        async with self._connect() as db:
+            async with db.execute(query, params) as cursor:
+                rows = await cursor.fetchall()
+            if not rows and after is not None:
+                async with db.execute(exists, params) as cursor:
+                    if await cursor.fetchone() is None:
+                        return None
+            return [self._block_from_row(row) for row in rows]
+    
+    async def search_blocks(self, query: str, document_id: Optional[str] = None, user_id: Optional[str] = None, limit: int = 20, session: Optional[AsyncSession] = None) -> List[BlockSearchResult]:
+        """Full-text search over block text, best BM25 matches first, within a document or a user's documents"""
+        match = fts_query(query)
+        if not match or (document_id is None and user_id is None):
+            return []
+        # The scope is part of the MATCH so FTS5 only ranks blocks inside it; the
+        # column check keeps IDs that tokenize alike ("a-b", "a b") apart
+        if document_id is not None:
+            match += f" AND document_id : {_fts_phrase(document_id)}"
+            scope = "b.document_id = :document_id"
+        else:
+            match += f" AND user_id : {_fts_phrase(user_id)}"
+            scope = "b.user_id = :user_id"
+        sql = f"""
+            SELECT b.id, b.document_id, b.page_number,
+                   snippet(blocks_fts, 0, '<mark>', '</mark>', '…', {SNIPPET_TOKENS}), bm25(blocks_fts, 1.0, 0.0, 0.0) AS rank
+            FROM blocks_fts JOIN blocks b ON b.rowid = blocks_fts.rowid
+            WHERE blocks_fts MATCH :match AND {scope}
+            ORDER BY rank
+            LIMIT :limit
+        """
+        params = {"match": match, "document_id": document_id, "user_id": user_id, "limit": limit}
+        if session:
+            result = await session.execute(text(sql), params)
+            rows = result.fetchall()
+        else:
+            async with self._connect() as db:
+                async with db.execute(sql, params) as cursor:
+                    rows = await cursor.fetchall()
+        return [
+            BlockSearchResult(block_id=row[0], document_id=row[1], page_number=row[2], snippet=row[3], score=-row[4])
+            for row in rows
+        ]
+    
+    def _block_from_row(self, row) -> Block:
+        """A block from its (data, page_number, reading_order) row"""
+        block = decode_model(Block, row[0])
+        block.page_number = row[1]
+        block.reading_order = row[2]
+        return block
     
     async def get_block(self, block_id: str, session: Optional[AsyncSession] = None) -> Optional[Block]:
         """Get a block by ID from SQLite"""
         if session:
             result = await session.execute(
-                text("SELECT data FROM blocks WHERE id = :id"),
+                text(f"SELECT {_BLOCK_FIELDS} FROM blocks WHERE id = :id"),
                 {"id": block_id}
             )
             row = result.fetchone()
             if row:
-                return Block.parse_raw(row[0])
+                return self._block_from_row(row)
             return None
             
-        async with aiosqlite.connect(self.db_path) as db:
+        async with self._connect() as db:
             async with db.execute(
-                "SELECT data FROM blocks WHERE id = ?",
+                f"SELECT {_BLOCK_FIELDS} FROM blocks WHERE id = ?",
                 (block_id,)
             ) as cursor:
                 row = await cursor.fetchone()
                 if row:
-                    return Block.parse_raw(row[0])
+                    return self._block_from_row(row)
         return None
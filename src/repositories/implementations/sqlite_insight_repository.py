@@ -1,12 +1,15 @@
 import json
+from contextlib import asynccontextmanager
 from typing import List, Optional
-from sqlalchemy import Column, String, Integer, JSON, ForeignKey
+from sqlalchemy import Column, String, Integer, ForeignKey
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
 from sqlalchemy.exc import IntegrityError
 
 from src.models.rumination.structured_insight import StructuredInsight
 from src.repositories.interfaces.insight_repository import InsightRepository
+from src.repositories.codec import EncodedBlob
+from src.services.scheduling.bulkhead import db_budget
 from src.api.dependencies import Base
 
 class InsightModel(Base):
@@ -16,30 +19,43 @@ class InsightModel(Base):
     document_id = Column(String, nullable=False)
     page_number = Column(Integer)
     insight = Column(String, nullable=False)
-    annotations = Column(JSON)
-    conversation_history = Column(JSON)
+    annotations = Column(EncodedBlob)
+    conversation_history = Column(EncodedBlob)
+
+def _insight_model(insight: StructuredInsight) -> InsightModel:
+    return InsightModel(
+        block_id=insight.block_id,
+        document_id=insight.document_id,
+        page_number=insight.page_number,
+        insight=insight.insight,
+        annotations=[a.dict() for a in insight.annotations] if insight.annotations else [],
+        conversation_history=insight.conversation_history
+    )
+
+def _stored_json(value):
+    """A column value, decoding rows written before the codec (JSON text inside a JSON column)"""
+    return json.loads(value) if isinstance(value, str) else value
 
 class SQLiteInsightRepository(InsightRepository):
     def __init__(self, session_factory):
         self.session_factory = session_factory
 
+    @asynccontextmanager
+    async def _session(self):
+        """Open a session within the current workload's DB connection budget"""
+        async with db_budget():
+            async with self.session_factory() as session:
+                yield session
+
     async def create_insight(self, insight: StructuredInsight) -> StructuredInsight:
-        async with self.session_factory() as session:
+        async with self._session() as session:
             try:
                 # First check if insight exists
                 existing = await self.get_block_insight(insight.block_id)
                 if existing:
                     return await self.update_insight(insight)
                     
-                db_insight = InsightModel(
-                    block_id=insight.block_id,
-                    document_id=insight.document_id,
-                    page_number=insight.page_number,
-                    insight=insight.insight,
-                    annotations=json.dumps([a.dict() for a in insight.annotations]) if insight.annotations else "[]",
-                    conversation_history=json.dumps(insight.conversation_history)
-                )
-                session.add(db_insight)
+                session.add(_insight_model(insight))
                 await session.commit()
                 return insight
             except IntegrityError:
@@ -47,8 +63,18 @@ class SQLiteInsightRepository(InsightRepository):
                 # If we hit an integrity error, try updating instead
                 return await self.update_insight(insight)
 
+    async def create_insights(self, insights: List[StructuredInsight], session: Optional[AsyncSession] = None) -> None:
+        """Add new insights; in the caller's session (which commits) if given, so they land with its other writes"""
+        if session is not None:
+            session.add_all([_insight_model(insight) for insight in insights])
+            await session.flush()
+            return
+        async with self._session() as own_session:
+            own_session.add_all([_insight_model(insight) for insight in insights])
+            await own_session.commit()
+
     async def get_block_insight(self, block_id: str) -> Optional[StructuredInsight]:
-        async with self.session_factory() as session:
+        async with self._session() as session:
             result = await session.execute(
                 select(InsightModel).where(InsightModel.block_id == block_id)
             )
@@ -61,12 +87,12 @@ class SQLiteInsightRepository(InsightRepository):
                 document_id=db_insight.document_id,
                 page_number=db_insight.page_number,
                 insight=db_insight.insight,
-                annotations=json.loads(db_insight.annotations) if db_insight.annotations else [],
-                conversation_history=json.loads(db_insight.conversation_history)
+                annotations=_stored_json(db_insight.annotations) or [],
+                conversation_history=_stored_json(db_insight.conversation_history)
             )
 
     async def get_document_insights(self, document_id: str) -> List[StructuredInsight]:
-        async with self.session_factory() as session:
+        async with self._session() as session:
             result = await session.execute(
                 select(InsightModel).where(InsightModel.document_id == document_id)
             )
@@ -77,14 +103,14 @@ class SQLiteInsightRepository(InsightRepository):
                     document_id=db_insight.document_id,
                     page_number=db_insight.page_number,
                     insight=db_insight.insight,
-                    annotations=json.loads(db_insight.annotations),
-                    conversation_history=json.loads(db_insight.conversation_history)
+                    annotations=_stored_json(db_insight.annotations),
+                    conversation_history=_stored_json(db_insight.conversation_history)
                 )
                 for db_insight in db_insights
             ]
 
     async def update_insight(self, insight: StructuredInsight) -> StructuredInsight:
-        async with self.session_factory() as session:
+        async with self._session() as session:
             result = await session.execute(
                 select(InsightModel).where(InsightModel.block_id == insight.block_id)
             )
@@ -94,13 +120,13 @@ class SQLiteInsightRepository(InsightRepository):
 
             db_insight.page_number = insight.page_number
             db_insight.insight = insight.insight
-            db_insight.annotations = json.dumps([a.dict() for a in insight.annotations])
-            db_insight.conversation_history = json.dumps(insight.conversation_history)
+            db_insight.annotations = [a.dict() for a in insight.annotations]
+            db_insight.conversation_history = insight.conversation_history
             await session.commit()
             return insight
 
     async def delete_insight(self, block_id: str) -> None:
-        async with self.session_factory() as session:
+        async with self._session() as session:
             result = await session.execute(
                 select(InsightModel).where(InsightModel.block_id == block_id)
             )
@@ -31,11 +31,28 @@ class ConversationRepository(ABC):
         """Add a new message to a conversation"""
         pass
     
+    async def save_messages(self, new_messages: List[Message], changed_messages: List[Message], session: Optional[DBSession] = None) -> None:
+        """Insert messages and point the parents they became the active child of at them; backends override this to write them in one transaction"""
+        for message in new_messages:
+            await self.add_message(message, session)
+    
     @abstractmethod
     async def get_messages(self, conversation_id: str, session: Optional[DBSession] = None) -> List[Message]:
         """Get all messages for a conversation"""
         pass
     
+    @abstractmethod
+    async def get_active_thread(self, conversation_id: str, session: Optional[DBSession] = None) -> List[Message]:
+        """Get the messages from the root along each message's active child"""
+        pass
+    
+    async def get_conversation_with_thread(self, conversation_id: str, session: Optional[DBSession] = None) -> Tuple[Optional[Conversation], List[Message]]:
+        """Get a conversation and its active thread together; backends override this to read them in one query"""
+        conversation = await self.get_conversation(conversation_id, session)
+        if conversation is None:
+            return None, []
+        return conversation, await self.get_active_thread(conversation_id, session)
+    
     @abstractmethod
     async def get_block_conversations(self, block_id: str, session: Optional[DBSession] = None) -> List[Conversation]:
         """Get all conversations for a block"""
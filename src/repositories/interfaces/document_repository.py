@@ -2,7 +2,7 @@ from abc import ABC, abstractmethod
 from typing import List, Optional, TypeVar
 from src.models.base.document import Document
 from src.models.viewer.page import Page
-from src.models.viewer.block import Block
+from src.models.viewer.block import Block, BlockSearchResult
 
 DBSession = TypeVar('DBSession')
 
@@ -16,6 +16,16 @@ class DocumentRepository(ABC):
         """Get a document by ID"""
         pass
     
+    @abstractmethod
+    async def get_document_by_hash(self, content_hash: str, session: Optional[DBSession] = None) -> Optional[Document]:
+        """Get a READY document with the given PDF content hash, if one exists"""
+        pass
+    
+    @abstractmethod
+    async def get_documents_by_status(self, statuses: List[str], session: Optional[DBSession] = None) -> List[Document]:
+        """Get all documents whose processing status is one of statuses"""
+        pass
+    
     @abstractmethod
     async def store_pages(self, pages: List[Page], session: Optional[DBSession] = None) -> None:
         pass
@@ -28,6 +38,11 @@ class DocumentRepository(ABC):
     async def store_blocks(self, blocks: List[Block], session: Optional[DBSession] = None) -> None:
         pass
     
+    async def store_pages_and_blocks(self, pages: List[Page], blocks: List[Block], session: Optional[DBSession] = None) -> None:
+        """Store pages and their blocks together; backends override this to write them in one batch"""
+        await self.store_pages(pages, session)
+        await self.store_blocks(blocks, session)
+    
     @abstractmethod
     async def get_page_blocks(self, page_id: str, session: Optional[DBSession] = None) -> List[Block]:
         pass
@@ -36,6 +51,37 @@ class DocumentRepository(ABC):
     async def get_blocks(self, document_id: str, session: Optional[DBSession] = None) -> List[Block]:
         pass
     
+    async def get_blocks_by_page_number(self, document_id: str, page_number: int, session: Optional[DBSession] = None) -> List[Block]:
+        """Get the blocks of one page of a document, in reading order"""
+        for page in await self.get_document_pages(document_id, session):
+            if page.page_number == page_number:
+                blocks = await self.get_page_blocks(page.id, session)
+                position = {block_id: index for index, block_id in enumerate(page.block_ids)}
+                return sorted(blocks, key=lambda block: position.get(block.id, len(position)))
+        return []
+    
+    async def get_blocks_after(self, document_id: str, after: Optional[str] = None, limit: int = 100, session: Optional[DBSession] = None) -> Optional[List[Block]]:
+        """Get up to limit blocks of a document in reading order, starting after the block with ID after.
+
+        None if after is not a block of the document.
+        """
+        blocks = await self.get_blocks(document_id, session)
+        blocks.sort(key=lambda block: (
+            -1 if block.page_number is None else block.page_number,
+            -1 if block.reading_order is None else block.reading_order,
+            block.id
+        ))
+        start = 0
+        if after is not None:
+            start = next((index + 1 for index, block in enumerate(blocks) if block.id == after), None)
+            if start is None:
+                return None
+        return blocks[start:start + limit]
+    
+    async def search_blocks(self, query: str, document_id: Optional[str] = None, user_id: Optional[str] = None, limit: int = 20, session: Optional[DBSession] = None) -> List[BlockSearchResult]:
+        """Full-text search over block text within a document, or across a user's documents"""
+        raise NotImplementedError(f"{type(self).__name__} does not support search")
+    
     @abstractmethod
     async def get_block(self, block_id: str, session: Optional[DBSession] = None) -> Optional[Block]:
         """Get a block by ID"""
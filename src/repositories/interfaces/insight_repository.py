@@ -1,6 +1,8 @@
-from typing import List, Optional
+from typing import List, Optional, TypeVar
 from src.models.rumination.structured_insight import StructuredInsight
 
+DBSession = TypeVar('DBSession')
+
 class InsightRepository:
     """Interface for storing and retrieving structured insights"""
     
@@ -8,6 +10,11 @@ class InsightRepository:
         """Create a new insight"""
         raise NotImplementedError()
     
+    async def create_insights(self, insights: List[StructuredInsight], session: Optional[DBSession] = None) -> None:
+        """Create new insights, in the caller's session if given; backends override this to write them together"""
+        for insight in insights:
+            await self.create_insight(insight)
+    
     async def get_block_insight(self, block_id: str) -> Optional[StructuredInsight]:
         """Get insight for a specific block"""
         raise NotImplementedError()
@@ -1,5 +1,6 @@
 from abc import ABC, abstractmethod
-from typing import Optional
+from typing import Optional, BinaryIO
+import io
 from fastapi import UploadFile
 from sqlalchemy.ext.asyncio import AsyncSession
 
@@ -19,4 +20,29 @@ class StorageRepository(ABC):
     @abstractmethod
     async def delete_file(self, file_path: str, session: Optional[AsyncSession] = None) -> None:
         """Delete a file"""
-        pass
\ No newline at end of file
+        pass
+    
+    @abstractmethod
+    async def store_blob(self, data: bytes, key: str, session: Optional[AsyncSession] = None) -> None:
+        """Store bytes under a content-addressed key; storing an existing key is a no-op"""
+        pass
+    
+    @abstractmethod
+    async def get_blob(self, key: str, session: Optional[AsyncSession] = None) -> Optional[bytes]:
+        """Get the bytes stored under a key, None if there are none"""
+        pass
+    
+    async def store_stream(self, stream: BinaryIO, document_id: str, session: Optional[AsyncSession] = None) -> str:
+        """Store a file read from a binary stream and return path.
+
+        Implementations should copy in chunks; this fallback reads the whole stream.
+        """
+        return await self.store_file(stream.read(), document_id, session)
+    
+    async def open_file(self, file_path: str, session: Optional[AsyncSession] = None) -> Optional[BinaryIO]:
+        """Open a stored file for streaming reads; the caller closes it.
+
+        Implementations should avoid loading the file into memory; this fallback does not.
+        """
+        file_data = await self.get_file(file_path, session)
+        return io.BytesIO(file_data) if file_data is not None else None
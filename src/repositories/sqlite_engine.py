@@ -0,0 +1,97 @@
+# repositories/sqlite_engine.py
+import logging
+import os
+from contextlib import asynccontextmanager
+from dataclasses import dataclass
+from typing import Dict, Optional
+
+import aiosqlite
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncEngine, create_async_engine
+
+logger = logging.getLogger(__name__)
+
+@dataclass
+class SQLitePoolOptions:
+    """Pool size and per-connection pragmas for SQLite engines"""
+    pool_size: int = 10
+    max_overflow: int = 10
+    pool_timeout: float = 30.0      # Seconds to wait for a free connection before failing
+    busy_timeout_ms: int = 5000     # How long a statement waits on another writer's lock
+    mmap_size_mb: int = 256
+    cache_size_mb: int = 64
+
+_options = SQLitePoolOptions()
+_engines: Dict[str, AsyncEngine] = {}
+_connects_total: Dict[str, int] = {}
+
+def configure_sqlite_engines(options: SQLitePoolOptions) -> None:
+    """Set the options used for engines created from now on (called on app startup)"""
+    global _options
+    _options = options
+
+def _apply_pragmas(dbapi_connection, options: SQLitePoolOptions) -> None:
+    cursor = dbapi_connection.cursor()
+    # WAL lets readers run alongside the single writer; NORMAL only syncs at checkpoints
+    cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.execute("PRAGMA synchronous=NORMAL")
+    cursor.execute(f"PRAGMA busy_timeout={int(options.busy_timeout_ms)}")
+    cursor.execute(f"PRAGMA mmap_size={int(options.mmap_size_mb) * 1024 * 1024}")
+    cursor.execute(f"PRAGMA cache_size=-{int(options.cache_size_mb) * 1024}")  # Negative means KiB
+    cursor.execute("PRAGMA temp_store=MEMORY")
+    cursor.close()
+
+def get_sqlite_engine(db_path: str) -> AsyncEngine:
+    """The process-wide engine (and connection pool) for a database file"""
+    key = os.path.abspath(db_path)
+    engine = _engines.get(key)
+    if engine is None:
+        options = _options
+        engine = create_async_engine(
+            f"sqlite+aiosqlite:///{db_path}",
+            pool_size=options.pool_size,
+            max_overflow=options.max_overflow,
+            pool_timeout=options.pool_timeout
+        )
+
+        @event.listens_for(engine.sync_engine, "connect")
+        def on_connect(dbapi_connection, connection_record):
+            _apply_pragmas(dbapi_connection, options)
+            _connects_total[key] = _connects_total.get(key, 0) + 1
+
+        _engines[key] = engine
+    return engine
+
+@asynccontextmanager
+async def sqlite_connection(db_path: str):
+    """Borrow a pooled aiosqlite connection for code that runs raw SQL.
+
+    The connection goes back to the pool on exit with any uncommitted work
+    rolled back, so callers commit what they write.
+    """
+    async with get_sqlite_engine(db_path).connect() as connection:
+        raw = await connection.get_raw_connection()
+        db: aiosqlite.Connection = raw.driver_connection
+        yield db
+
+def sqlite_pool_stats() -> Dict[str, Dict[str, int]]:
+    """Connection counts of every engine's pool, by database path"""
+    stats = {}
+    for path, engine in _engines.items():
+        pool = engine.pool
+        stats[path] = {
+            "size": pool.size(),
+            "checked_out": pool.checkedout(),
+            "checked_in": pool.checkedin(),
+            "overflow": max(pool.overflow(), 0),
+            "connects_total": _connects_total.get(path, 0)
+        }
+    return stats
+
+async def dispose_sqlite_engines(db_path: Optional[str] = None) -> None:
+    """Close pooled connections (of one database, or all of them on shutdown)"""
+    keys = [os.path.abspath(db_path)] if db_path else list(_engines)
+    for key in keys:
+        engine = _engines.pop(key, None)
+        if engine is not None:
+            await engine.dispose()
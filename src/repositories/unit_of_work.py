@@ -0,0 +1,51 @@
+# repositories/unit_of_work.py
+from typing import Dict, List, Optional
+
+from src.models.conversation.conversation import Conversation
+from src.models.conversation.message import Message
+from src.repositories.interfaces.conversation_repository import ConversationRepository, DBSession
+
+class ConversationUnitOfWork:
+    """A conversation and its active thread, loaded once, with message writes buffered until flush.
+
+    Adding a message makes it its parent's active child and the end of the
+    thread held here, so the thread never needs reading back. flush writes
+    everything added since the last flush in one transaction. Loaded messages
+    are copied before they are changed, so repositories that hand out their
+    own objects are not modified behind their back.
+    """
+    def __init__(self, repository: ConversationRepository, conversation_id: str, session: Optional[DBSession] = None):
+        self.repository = repository
+        self.conversation_id = conversation_id
+        self.session = session
+        self.conversation: Optional[Conversation] = None
+        self.thread: List[Message] = []
+        self._new: Dict[str, Message] = {}
+        self._changed: Dict[str, Message] = {}
+
+    async def load(self) -> Optional[Conversation]:
+        """Read the conversation and its active thread; None if the conversation does not exist"""
+        self.conversation, self.thread = await self.repository.get_conversation_with_thread(self.conversation_id, self.session)
+        return self.conversation
+
+    def add_message(self, message: Message) -> Message:
+        """Append a message to the thread after its parent, which must be in the thread"""
+        if message.parent_id is None:
+            self.thread = [message]
+        else:
+            index = next((i for i, m in enumerate(self.thread) if m.id == message.parent_id), None)
+            if index is None:
+                raise ValueError(f"Parent message {message.parent_id} is not in the active thread")
+            parent = self.thread[index].model_copy(update={"active_child_id": message.id})
+            self.thread = self.thread[:index] + [parent, message]
+            (self._new if parent.id in self._new else self._changed)[parent.id] = parent
+        self._new[message.id] = message
+        return message
+
+    async def flush(self) -> None:
+        """Write the messages added since the last flush, and their parents, in one transaction"""
+        if not self._new and not self._changed:
+            return
+        await self.repository.save_messages(list(self._new.values()), list(self._changed.values()), self.session)
+        self._new.clear()
+        self._changed.clear()
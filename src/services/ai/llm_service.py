@@ -1,15 +1,41 @@
 # llm_service.py
 
 from typing import List, Optional, Dict, Any
+from contextlib import nullcontext
 from src.models.conversation.message import Message, MessageRole
+from src.services.scheduling.llm_scheduler import LLMScheduler, LLMLane
 from litellm import acompletion
 import json
 
 class LLMService:
     CHAT_MODEL = "gpt-4o-mini"  # Default model
+    CHARS_PER_TOKEN = 4  # Rough prompt size estimate used as the scheduling cost
     
-    def __init__(self, api_key: Optional[str] = None):
+    def __init__(self,
+                 api_key: Optional[str] = None,
+                 scheduler: Optional[LLMScheduler] = None,
+                 user_id: Optional[str] = None,
+                 lane: LLMLane = LLMLane.INTERACTIVE):
         self.api_key = api_key
+        self.scheduler = scheduler
+        self.user_id = user_id
+        self.lane = lane
+        self.tokens_used = 0  # Running total of tokens reported by the provider
+
+    def _slot(self, formatted_messages: List[Dict[str, Any]]):
+        """Wait for a fair-queued scheduler slot, if a scheduler is configured"""
+        if not self.scheduler or not self.user_id:
+            return nullcontext()
+        cost = sum(len(msg["content"] or "") for msg in formatted_messages) / self.CHARS_PER_TOKEN
+        return self.scheduler.slot(self.user_id, self.lane, cost)
+
+    def _record_usage(self, completion) -> None:
+        """Add the token usage reported on a completion to the running total"""
+        usage = getattr(completion, "usage", None)
+        if usage and getattr(usage, "total_tokens", None):
+            self.tokens_used += usage.total_tokens
+            if self.scheduler and self.user_id:
+                self.scheduler.record_tokens(self.user_id, usage.total_tokens)
         
     async def generate_response(self, messages: List[Message]) -> str:
         """Generate LLM response for the given messages
@@ -28,12 +54,14 @@ class LLMService:
                 "content": msg.content
             })
             
-        completion = await acompletion(
-            model=self.CHAT_MODEL,
-            messages=formatted_messages,
-            api_key=self.api_key,
-            stream=False  # Don't stream responses for now
-        )
+        async with self._slot(formatted_messages):
+            completion = await acompletion(
+                model=self.CHAT_MODEL,
+                messages=formatted_messages,
+                api_key=self.api_key,
+                stream=False  # Don't stream responses for now
+            )
+        self._record_usage(completion)
         return completion.choices[0].message.content
 
     async def generate_structured_response(
@@ -60,22 +88,24 @@ class LLMService:
                 "content": msg.content
             })
             
-        completion = await acompletion(
-            model=self.CHAT_MODEL,
-            messages=formatted_messages,
-            api_key=self.api_key,
-            response_format=response_format,
-            tools=[{
-                "type": "function",
-                "function": {
-                    "name": "output_structure",
-                    "description": "Structure the output according to the schema",
-                    "parameters": json_schema
-                }
-            }],
-            tool_choice={"type": "function", "function": {"name": "output_structure"}},
-            stream=False
-        )
+        async with self._slot(formatted_messages):
+            completion = await acompletion(
+                model=self.CHAT_MODEL,
+                messages=formatted_messages,
+                api_key=self.api_key,
+                response_format=response_format,
+                tools=[{
+                    "type": "function",
+                    "function": {
+                        "name": "output_structure",
+                        "description": "Structure the output according to the schema",
+                        "parameters": json_schema
+                    }
+                }],
+                tool_choice={"type": "function", "function": {"name": "output_structure"}},
+                stream=False
+            )
+        self._record_usage(completion)
         
         # Extract and parse the JSON response from the function call
         function_call = completion.choices[0].message.tool_calls[0]
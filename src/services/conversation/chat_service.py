@@ -3,8 +3,10 @@ from src.models.conversation.conversation import Conversation, ConversationType
 from src.models.conversation.message import Message, MessageRole
 from src.repositories.interfaces.conversation_repository import ConversationRepository
 from src.repositories.interfaces.document_repository import DocumentRepository
+from src.repositories.unit_of_work import ConversationUnitOfWork
 from src.services.ai.llm_service import LLMService
 from src.services.ai.context_service import ContextService
+from src.services.scheduling.llm_scheduler import QuotaExceeded
 import uuid
 from sqlalchemy.ext.asyncio import AsyncSession
 import logging
@@ -128,27 +130,25 @@ class ChatService:
         return messages
     
     async def send_message(self, conversation_id: str, content: str, parent_version_id: Optional[str] = None, session: Optional[AsyncSession] = None) -> Tuple[Message, str]:
-        """Send a user message and get AI response"""
+        """Send a user message and get AI response.
+
+        The conversation and its active thread are read once; the user message
+        is written in one transaction before the LLM call and the response in
+        one after it.
+        """
         logger.info(f"Sending message to conversation {conversation_id}")
+        unit = ConversationUnitOfWork(self.conversation_repo, conversation_id, session)
         
-        # Get conversation to verify it exists
-        conversation = await self.conversation_repo.get_conversation(conversation_id, session)
-        logger.info(f"Retrieved conversation: {conversation}")
-        if not conversation:
+        # Get conversation and current thread to find parent
+        if not await unit.load():
             logger.error(f"Conversation {conversation_id} not found")
             raise ValueError(f"Conversation {conversation_id} not found")
-
-        # Get current thread to find parent
-        thread = await self.conversation_repo.get_active_thread(conversation_id, session)
-        logger.info(f"Retrieved thread with {len(thread) if thread else 0} messages")
-        logger.info(f"Thread messages: {[msg.content for msg in thread] if thread else []}")
+        thread = unit.thread
+        logger.info(f"Retrieved thread with {len(thread)} messages")
 
         # If parent_version_id is provided, verify it exists and use it as parent
-        parent_id = None
         if parent_version_id:
-            # Find the message in the thread that has this version ID
-            parent_msg = next((msg for msg in thread if msg.id == parent_version_id), None)
-            if not parent_msg:
+            if not any(msg.id == parent_version_id for msg in thread):
                 logger.error(f"Parent version {parent_version_id} not found")
                 raise ValueError(f"Parent version {parent_version_id} not found")
             parent_id = parent_version_id
@@ -156,96 +156,70 @@ class ChatService:
             # Use the last message in thread as parent
             parent_id = thread[-1].id if thread else None
 
-        # Create user message with parent set to specified version or last message
-        try:
-            user_msg = Message(
-                id=str(uuid.uuid4()),
-                conversation_id=conversation_id,
-                role=MessageRole.USER,
-                content=content,
-                parent_id=parent_id
-            )
-            logger.info(f"Created user message: {user_msg}")
-        except Exception as e:
-            logger.error(f"Error creating user message: {e}")
-            raise ValueError(f"Error creating user message: {e}")
-        
-        # Save user message
+        # Save user message as its parent's active child
+        user_msg = Message(
+            id=str(uuid.uuid4()),
+            conversation_id=conversation_id,
+            role=MessageRole.USER,
+            content=content,
+            parent_id=parent_id
+        )
         try:
-            await self.conversation_repo.add_message(user_msg, session)
+            unit.add_message(user_msg)
+            await unit.flush()
             logger.info("Saved user message")
         except Exception as e:
             logger.error(f"Error saving user message: {e}")
             raise ValueError(f"Error saving user message: {e}")
         
-        # Set parent's active_child_id to user message
-        if user_msg.parent_id:
-            try:
-                await self.conversation_repo.set_active_version(user_msg.parent_id, user_msg.id, session)
-                logger.info("Set active version")
-            except Exception as e:
-                logger.error(f"Error setting active version: {e}")
-                raise ValueError(f"Error setting active version: {e}")
-        
-        # Build context and generate response
+        # The thread now ends with the user message, which is the LLM context
         try:
-            context = await self.context_service.build_message_context(conversation_id, user_msg)
+            context = list(unit.thread)
             logger.info(f"Built context with {len(context)} messages")
             response_content = await self.llm_service.generate_response(context)
             logger.info("Generated response")
+        except QuotaExceeded:
+            raise
         except Exception as e:
             logger.error(f"Error generating response: {e}")
             raise ValueError(f"Error generating response: {e}")
         
-        # Create AI response with parent set to user message
-        try:
-            ai_msg = Message(
-                id=str(uuid.uuid4()),
-                conversation_id=conversation_id,
-                role=MessageRole.ASSISTANT,
-                content=response_content,
-                parent_id=user_msg.id
-            )
-            logger.info("Created AI message")
-        except Exception as e:
-            logger.error(f"Error creating AI message: {e}")
-            raise ValueError(f"Error creating AI message: {e}")
-        
-        # Save AI message
+        # Save AI response as the user message's active child
+        ai_msg = Message(
+            id=str(uuid.uuid4()),
+            conversation_id=conversation_id,
+            role=MessageRole.ASSISTANT,
+            content=response_content,
+            parent_id=user_msg.id
+        )
         try:
-            await self.conversation_repo.add_message(ai_msg, session)
+            unit.add_message(ai_msg)
+            await unit.flush()
             logger.info("Saved AI message")
         except Exception as e:
             logger.error(f"Error saving AI message: {e}")
             raise ValueError(f"Error saving AI message: {e}")
         
-        # Set user message's active_child_id to AI message
-        try:
-            await self.conversation_repo.set_active_version(user_msg.id, ai_msg.id, session)
-            logger.info("Set active version for AI message")
-        except Exception as e:
-            logger.error(f"Error setting active version for AI message: {e}")
-            raise ValueError(f"Error setting active version for AI message: {e}")
-        
         return ai_msg, user_msg.id
     
     async def edit_message(self, message_id: str, content: str, session: Optional[AsyncSession] = None) -> Tuple[Message, str]:
-        """Edit a message and regenerate the AI response"""
+        """Edit a message and regenerate the AI response.
+
+        The repository adds the new version as its parent's active child, so
+        the active thread, read once, ends with it and is the LLM context.
+        """
         # Create new version as sibling
         edited_msg, edited_msg_id = await self.conversation_repo.edit_message(message_id, content, session)
         
-        # Update parent to point to new version as active child
-        if edited_msg.parent_id:
-            await self.conversation_repo.set_active_version(edited_msg.parent_id, edited_msg.id, session)
+        unit = ConversationUnitOfWork(self.conversation_repo, edited_msg.conversation_id, session)
+        await unit.load()
+        if not unit.thread or unit.thread[-1].id != edited_msg.id:
+            raise ValueError(f"Message {message_id} is not in the active thread")
         
-        # Find any existing AI response to the original message
-        thread = await self.conversation_repo.get_active_thread(edited_msg.conversation_id, session)
+        # Generate new AI response from the thread ending with the edited message
+        response_content = await self.llm_service.generate_response(list(unit.thread))
         
-        # Build context and generate new AI response
-        context = await self.context_service.build_message_context(edited_msg.conversation_id, edited_msg)
-        response_content = await self.llm_service.generate_response(context)
-        
-        # Create new AI response as sibling to any existing response
+        # Save new AI response as the edited message's active child
         ai_msg = Message(
             id=str(uuid.uuid4()),
             conversation_id=edited_msg.conversation_id,
@@ -253,12 +227,8 @@ class ChatService:
             content=response_content,
             parent_id=edited_msg.id
         )
-        
-        # Save AI message
-        await self.conversation_repo.add_message(ai_msg, session)
-        
-        # Set edited message's active child to new AI response
-        await self.conversation_repo.set_active_version(edited_msg.id, ai_msg.id, session)
+        unit.add_message(ai_msg)
+        await unit.flush()
         
         return ai_msg, edited_msg_id
     
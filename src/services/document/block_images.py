@@ -0,0 +1,82 @@
+import base64
+import binascii
+import hashlib
+import logging
+from typing import List, Optional, Tuple
+
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from src.models.viewer.block import Block
+from src.repositories.interfaces.storage_repository import StorageRepository
+from src.services.scheduling.bulkhead import run_blocking
+
+logger = logging.getLogger(__name__)
+
+IMAGE_KEY_PREFIX = "images"
+# Leading bytes of the image formats Marker and PyMuPDF produce
+_MEDIA_TYPES = [
+    (b"\xff\xd8\xff", "image/jpeg"),
+    (b"\x89PNG\r\n\x1a\n", "image/png"),
+    (b"GIF8", "image/gif"),
+    (b"RIFF", "image/webp"),
+]
+
+def image_key(digest: str) -> str:
+    """Storage key of an image with the given SHA-256"""
+    return f"{IMAGE_KEY_PREFIX}/{digest}"
+
+def media_type(data: bytes) -> str:
+    """Content type of an image from its leading bytes"""
+    for magic, content_type in _MEDIA_TYPES:
+        if data.startswith(magic):
+            return content_type
+    return "application/octet-stream"
+
+def _decode_images(blocks: List[Block]) -> List[Tuple[Block, str, bytes, str]]:
+    """(block, name, bytes, SHA-256) for every inline image of the blocks"""
+    decoded = []
+    for block in blocks:
+        for name, encoded in (block.images or {}).items():
+            try:
+                data = base64.b64decode(encoded)
+            except (binascii.Error, ValueError):
+                logger.warning(f"Skipping undecodable image {name} of block {block.id}")
+                continue
+            decoded.append((block, name, data, hashlib.sha256(data).hexdigest()))
+    return decoded
+
+async def store_block_images(blocks: List[Block], storage: StorageRepository, session: Optional[AsyncSession] = None) -> None:
+    """Move the blocks' inline base64 images to blob storage, leaving references on the blocks.
+
+    Images are decoded once and stored under their content hash, so an image
+    shared by several blocks or documents is stored once.
+    """
+    if not any(block.images for block in blocks):
+        return
+    stored = set()
+    for block, name, data, digest in await run_blocking(_decode_images, blocks):
+        if digest not in stored:
+            await storage.store_blob(data, image_key(digest), session)
+            stored.add(digest)
+        block.image_refs = {**(block.image_refs or {}), name: digest}
+    for block in blocks:
+        block.images = None
+
+async def load_block_image(block: Block, name: str, storage: StorageRepository, session: Optional[AsyncSession] = None) -> Optional[Tuple[bytes, str]]:
+    """An image of a block and its SHA-256, None if the block has no (decodable) image by that name.
+
+    Blocks stored before images were externalised still carry them inline.
+    """
+    digest = (block.image_refs or {}).get(name)
+    if digest:
+        data = await storage.get_blob(image_key(digest), session)
+        return (data, digest) if data is not None else None
+    encoded = (block.images or {}).get(name)
+    if encoded is None:
+        return None
+    try:
+        data = base64.b64decode(encoded)
+    except (binascii.Error, ValueError):
+        logger.warning(f"Undecodable image {name} of block {block.id}")
+        return None
+    return data, hashlib.sha256(data).hexdigest()
@@ -0,0 +1,52 @@
+import logging
+from enum import Enum
+from typing import BinaryIO, Optional, Union
+
+from src.services.document.local_extraction_service import LocalExtractionService, pymupdf_available
+
+logger = logging.getLogger(__name__)
+
+class ExtractionBackend(str, Enum):
+    """Where a document's pages and blocks come from"""
+    MARKER = "marker"
+    LOCAL = "local"
+    AUTO = "auto"
+
+class ExtractionRouter:
+    """Picks local extraction or Marker for each document.
+
+    With the auto policy a preflight samples the PDF's text layer: documents
+    with enough embedded text per page are parsed locally, scans and
+    image-only PDFs (which need OCR) go to Marker. Auto falls back to Marker
+    when PyMuPDF isn't installed.
+    """
+    def __init__(self, policy: ExtractionBackend, local_service: Optional[LocalExtractionService] = None, min_chars_per_page: int = 200):
+        self.policy = ExtractionBackend(policy)
+        self.local_service = local_service
+        self.min_chars_per_page = min_chars_per_page
+        if self.policy == ExtractionBackend.LOCAL and local_service is None:
+            raise ValueError("Local extraction policy needs a LocalExtractionService")
+
+    async def choose(self, file_data: Union[bytes, BinaryIO]) -> ExtractionBackend:
+        """Backend to use for this PDF (MARKER or LOCAL)"""
+        if self.policy != ExtractionBackend.AUTO:
+            return self.policy
+        if self.local_service is None:
+            return ExtractionBackend.MARKER
+
+        try:
+            report = await self.local_service.inspect(file_data)
+        except Exception as e:
+            logger.warning(f"Text-layer preflight failed, using Marker: {e}")
+            return ExtractionBackend.MARKER
+        backend = ExtractionBackend.LOCAL if report["chars_per_page"] >= self.min_chars_per_page else ExtractionBackend.MARKER
+        logger.info(f"{report['page_count']} pages with {report['chars_per_page']:.0f} chars/page, using {backend.value}")
+        return backend
+
+def create_extraction_router(policy: str, max_workers: int = 2, min_chars_per_page: int = 200) -> ExtractionRouter:
+    """Build a router for the configured policy, with a local backend if PyMuPDF is available"""
+    policy = ExtractionBackend(policy)
+    local_service = None
+    if policy != ExtractionBackend.MARKER and (policy == ExtractionBackend.LOCAL or pymupdf_available()):
+        local_service = LocalExtractionService(max_workers=max_workers)
+    return ExtractionRouter(policy, local_service, min_chars_per_page)
@@ -0,0 +1,83 @@
+import asyncio
+import logging
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, BinaryIO, Dict, List, Optional, Tuple, Union
+
+from src.models.viewer.block import Block
+from src.models.viewer.page import Page
+from src.services.document.marker_service import pages_and_blocks_from_marker_json
+from src.services.document.pdf_text_extractor import extract_marker_json, inspect_text_layer
+
+logger = logging.getLogger(__name__)
+
+_executor: Optional[ProcessPoolExecutor] = None
+
+def pymupdf_available() -> bool:
+    """Whether the optional PyMuPDF dependency is installed"""
+    try:
+        import pymupdf  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+def get_extraction_pool(max_workers: int = 2) -> ProcessPoolExecutor:
+    """Process pool shared by every LocalExtractionService"""
+    global _executor
+    if _executor is None:
+        # Spawned rather than forked, since the parent runs an event loop and threads
+        _executor = ProcessPoolExecutor(max_workers=max_workers, mp_context=multiprocessing.get_context("spawn"))
+    return _executor
+
+def shutdown_extraction_pool() -> None:
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=False, cancel_futures=True)
+        _executor = None
+
+class LocalExtractionService:
+    """Offline alternative to MarkerService that reads the PDF's embedded text layer.
+
+    Same process_document contract as MarkerService; parsing runs in a process
+    pool so large PDFs don't hold the event loop or the GIL.
+    """
+    def __init__(self, max_workers: int = 2):
+        if not pymupdf_available():
+            raise RuntimeError("Local extraction needs PyMuPDF: pip install pymupdf")
+        self.max_workers = max_workers
+
+    async def process_document(self, file_data: Union[bytes, BinaryIO], document_id: str) -> Tuple[List[Page], List[Block]]:
+        """Extract pages and blocks from the PDF's text layer"""
+        marker_json = await self._run(extract_marker_json, file_data)
+        return pages_and_blocks_from_marker_json(marker_json, document_id)
+
+    async def inspect(self, file_data: Union[bytes, BinaryIO]) -> Dict[str, Any]:
+        """Page count and average characters of embedded text per page"""
+        return await self._run(inspect_text_layer, file_data)
+
+    async def _run(self, fn, file_data: Union[bytes, BinaryIO]):
+        loop = asyncio.get_running_loop()
+        source = self._source(file_data)
+        try:
+            return await loop.run_in_executor(get_extraction_pool(self.max_workers), fn, source)
+        except BrokenProcessPool:
+            # A worker died (e.g. killed for memory); start a fresh pool and try once more
+            logger.warning("Extraction pool broken, restarting it")
+            shutdown_extraction_pool()
+            return await loop.run_in_executor(get_extraction_pool(self.max_workers), fn, source)
+
+    @staticmethod
+    def _source(file_data: Union[bytes, BinaryIO]) -> Union[bytes, str]:
+        """What to send to the worker: a path if the file is on disk, otherwise its bytes"""
+        if isinstance(file_data, (bytes, bytearray)):
+            return bytes(file_data)
+        name = getattr(file_data, "name", None)
+        if isinstance(name, str) and os.path.isfile(name):
+            return name
+        start = file_data.tell()
+        try:
+            return file_data.read()
+        finally:
+            file_data.seek(start)
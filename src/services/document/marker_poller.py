@@ -0,0 +1,380 @@
+import asyncio
+import io
+import json
+import logging
+import re
+import tempfile
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Any, BinaryIO, Deque, Dict, Iterator, Optional, Union
+
+import httpx
+from fastapi import HTTPException
+
+from src.services.scheduling.bulkhead import run_blocking
+
+logger = logging.getLogger(__name__)
+
+_PAGE_OBJECT = re.compile(rb"/Type\s*/Page(?![a-zA-Z])")
+# Scan in windows so a thread running this gives up the GIL regularly
+_SCAN_WINDOW = 1024 * 1024
+_SCAN_OVERLAP = 64
+
+def estimate_page_count(source: Union[bytes, BinaryIO]) -> Optional[int]:
+    """Rough page count from the PDF's page objects (None if they are compressed away).
+
+    File objects are read in windows and rewound to where they started.
+    """
+    stream = io.BytesIO(source) if isinstance(source, (bytes, bytearray)) else source
+    start = stream.tell()
+    count = 0
+    tail = b""
+    try:
+        while chunk := stream.read(_SCAN_WINDOW):
+            window = tail + chunk
+            # Matches ending inside the carried-over tail were counted with the previous window
+            count += sum(1 for match in _PAGE_OBJECT.finditer(window) if match.end() > len(tail))
+            tail = window[-_SCAN_OVERLAP:]
+    finally:
+        stream.seek(start)
+    return count or None
+
+# Poll responses larger than this are spooled to disk instead of memory
+RESPONSE_SPOOL_SIZE = 1024 * 1024
+_STATUS_FIELDS = ("status", "success", "error")
+
+def _ijson():
+    """The optional ijson module, or None to fall back to loading whole responses"""
+    try:
+        import ijson
+    except ImportError:
+        return None
+    return ijson
+
+def ijson_available() -> bool:
+    """Whether the optional ijson dependency is installed"""
+    return _ijson() is not None
+
+class MarkerOutput:
+    """Body of a Marker check response, spooled so its pages can be parsed one at a time.
+
+    Parsing is incremental with ijson (pip install ijson); without it the
+    whole response is loaded, as before. Both are blocking, so call them
+    through run_blocking.
+    """
+    def __init__(self, body: BinaryIO):
+        self.body = body
+
+    def read_status(self) -> Dict[str, Any]:
+        """The top-level status, success and error fields, without building the output"""
+        self.body.seek(0)
+        ijson = _ijson()
+        if ijson is None:
+            data = json.load(self.body)
+            return {key: data[key] for key in _STATUS_FIELDS if key in data}
+
+        fields = {}
+        try:
+            for prefix, event, value in ijson.parse(self.body):
+                if prefix in _STATUS_FIELDS and event in ("string", "boolean", "number", "null"):
+                    fields[prefix] = value
+                # Stop as soon as the answer is known rather than scanning the whole output
+                if "status" in fields and (fields["status"] != "complete" or fields.get("success") or "error" in fields):
+                    break
+        except ijson.JSONError as e:
+            raise ValueError(f"Invalid Marker response: {e}")
+        return fields
+
+    def pages(self) -> Iterator[Dict[str, Any]]:
+        """The children of the output document (its pages), parsed one at a time"""
+        self.body.seek(0)
+        ijson = _ijson()
+        if ijson is None:
+            yield from json.load(self.body).get("json", {}).get("children", [])
+            return
+        yield from ijson.items(self.body, "json.children.item", use_float=True)
+
+    def close(self) -> None:
+        self.body.close()
+
+class CompletionStats:
+    """Observed Marker completion times, bucketed by page count"""
+    # Upper bounds of the page-count buckets; the last bucket is open-ended
+    BUCKET_BOUNDS = (5, 20, 50, 150)
+    SAMPLES_PER_BUCKET = 50
+    # Prior used until a bucket has samples
+    DEFAULT_SECONDS_PER_PAGE = 1.0
+    DEFAULT_BASE_SECONDS = 4.0
+
+    def __init__(self):
+        self._samples: Dict[str, Deque[float]] = {}
+
+    def bucket(self, page_count: Optional[int]) -> str:
+        if page_count is None:
+            return "unknown"
+        for bound in self.BUCKET_BOUNDS:
+            if page_count <= bound:
+                return f"le_{bound}"
+        return f"gt_{self.BUCKET_BOUNDS[-1]}"
+
+    def record(self, page_count: Optional[int], seconds: float) -> None:
+        key = self.bucket(page_count)
+        self._samples.setdefault(key, deque(maxlen=self.SAMPLES_PER_BUCKET)).append(seconds)
+
+    def expected_seconds(self, page_count: Optional[int], quantile: float = 0.5) -> float:
+        """Quantile of observed completion times for documents of this size"""
+        samples = self._samples.get(self.bucket(page_count))
+        if not samples:
+            return self.DEFAULT_BASE_SECONDS + self.DEFAULT_SECONDS_PER_PAGE * (page_count or 10)
+        ordered = sorted(samples)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * quantile))]
+
+    def stats(self) -> Dict[str, dict]:
+        return {
+            key: {"samples": len(samples), "p50_seconds": sorted(samples)[len(samples) // 2]}
+            for key, samples in self._samples.items()
+        }
+
+@dataclass
+class _MarkerJob:
+    check_url: str
+    client: httpx.AsyncClient
+    headers: Dict[str, str]
+    page_count: Optional[int]
+    future: asyncio.Future
+    submitted_at: float
+    deadline: float
+    next_poll_at: float
+    interval: float
+    max_interval: float
+    polls: int = 0
+    polling: bool = field(default=False)
+
+class MarkerPoller:
+    """One background loop that polls every in-flight Marker job.
+
+    The first poll for a job is timed from the completion times observed for
+    documents with a similar page count; misses back off exponentially up to
+    max_interval. When Marker is configured to call our webhook, jobs are only
+    polled every callback_fallback_interval in case a callback is lost, and
+    notify() triggers an immediate fetch when one arrives. A callback can beat
+    wait() (the job is saved between submitting and waiting), so callbacks for
+    unknown jobs are kept for early_callback_ttl and claimed by wait().
+    """
+    def __init__(self,
+                 min_interval: float = 1.0,
+                 max_interval: float = 30.0,
+                 backoff: float = 1.5,
+                 first_poll_fraction: float = 0.8,
+                 max_wait_seconds: float = 600.0,
+                 callback_fallback_interval: float = 60.0,
+                 early_callback_ttl: float = 30.0):
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.backoff = backoff
+        self.first_poll_fraction = first_poll_fraction
+        self.max_wait_seconds = max_wait_seconds
+        self.callback_fallback_interval = callback_fallback_interval
+        self.early_callback_ttl = early_callback_ttl
+        self.completion_stats = CompletionStats()
+
+        self._jobs: Dict[str, _MarkerJob] = {}
+        # check_url or request_id of callbacks that arrived before their wait(), to when they expire
+        self._early_callbacks: Dict[str, float] = {}
+        self._wake = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+        self._poll_tasks: set = set()
+        self.polls_total = 0
+        self.callbacks_total = 0
+        self.completed_total = 0
+
+    async def wait(self,
+                   client: httpx.AsyncClient,
+                   check_url: str,
+                   api_key: str,
+                   page_count: Optional[int] = None,
+                   expect_callback: bool = False,
+                   first_poll_delay: Optional[float] = None) -> MarkerOutput:
+        """Wait until Marker finishes the job at check_url and return its output.
+
+        The caller owns the returned MarkerOutput and should close it.
+        """
+        now = time.monotonic()
+        if first_poll_delay is not None:
+            first_delay = first_poll_delay
+        elif expect_callback:
+            first_delay = self.callback_fallback_interval
+        else:
+            expected = self.completion_stats.expected_seconds(page_count)
+            first_delay = max(self.min_interval, self.first_poll_fraction * expected)
+        job = _MarkerJob(
+            check_url=check_url,
+            client=client,
+            headers={"X-Api-Key": api_key},
+            page_count=page_count,
+            future=asyncio.get_running_loop().create_future(),
+            submitted_at=now,
+            deadline=now + self.max_wait_seconds,
+            next_poll_at=now + first_delay,
+            interval=self.callback_fallback_interval if expect_callback else self.min_interval,
+            max_interval=self.callback_fallback_interval if expect_callback else self.max_interval
+        )
+        self._jobs[check_url] = job
+        if self._claim_early_callback(check_url):
+            self.callbacks_total += 1
+            job.next_poll_at = now
+        self._ensure_running()
+        self._wake.set()
+        try:
+            return await job.future
+        finally:
+            self._jobs.pop(check_url, None)
+
+    def notify(self, check_url: Optional[str] = None, request_id: Optional[str] = None) -> bool:
+        """Fetch a job's result right away (called from the completion webhook)"""
+        job = self._jobs.get(check_url) if check_url else None
+        if job is None and request_id:
+            job = next((j for url, j in self._jobs.items() if url.rstrip("/").endswith(f"/{request_id}")), None)
+        if job is None:
+            self._remember_early_callback(check_url, request_id)
+            return False
+        self.callbacks_total += 1
+        job.next_poll_at = time.monotonic()
+        self._wake.set()
+        return True
+
+    def _remember_early_callback(self, check_url: Optional[str], request_id: Optional[str]) -> None:
+        now = time.monotonic()
+        self._early_callbacks = {key: expires for key, expires in self._early_callbacks.items() if expires > now}
+        for key in (check_url.rstrip("/") if check_url else None, request_id):
+            if key:
+                self._early_callbacks[key] = now + self.early_callback_ttl
+
+    def _claim_early_callback(self, check_url: str) -> bool:
+        """Whether a callback for check_url arrived (within the TTL) before it was waited on"""
+        url = check_url.rstrip("/")
+        keys = [url, url.rsplit("/", 1)[-1]]
+        claimed = [self._early_callbacks.pop(key) for key in keys if key in self._early_callbacks]
+        return any(expires > time.monotonic() for expires in claimed)
+
+    def _ensure_running(self) -> None:
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def _run(self) -> None:
+        while self._jobs:
+            now = time.monotonic()
+            due = [job for job in self._jobs.values()
+                   if not job.polling and not job.future.done() and job.next_poll_at <= now]
+            for job in due:
+                job.polling = True
+                task = asyncio.create_task(self._poll(job))
+                self._poll_tasks.add(task)
+                task.add_done_callback(self._poll_tasks.discard)
+
+            waiting = [job.next_poll_at for job in self._jobs.values() if not job.polling]
+            timeout = max(0.0, min(waiting) - now) if waiting else None
+            self._wake.clear()
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+
+    async def _poll(self, job: _MarkerJob) -> None:
+        try:
+            self.polls_total += 1
+            job.polls += 1
+            output = None
+            try:
+                async with job.client.stream("GET", job.check_url, headers=job.headers) as response:
+                    if response.status_code == 404:
+                        # Unknown or expired job; waiting longer won't help
+                        self._fail(job, HTTPException(status_code=404, detail="Marker job not found"))
+                        return
+                    # A finished job's output can be hundreds of MB, so never hold the body in memory
+                    output = MarkerOutput(tempfile.SpooledTemporaryFile(max_size=RESPONSE_SPOOL_SIZE))
+                    async for chunk in response.aiter_bytes():
+                        output.body.write(chunk)
+                data = await run_blocking(output.read_status)
+            except (httpx.HTTPError, ValueError) as e:
+                logger.warning(f"Polling {job.check_url} failed, will retry: {e}")
+                data = {"status": "processing"}
+
+            if data.get("status") == "complete":
+                self._complete(job, data, output)
+                return
+            if output is not None:
+                output.close()
+            now = time.monotonic()
+            if now >= job.deadline:
+                self._fail(job, HTTPException(status_code=408, detail="Processing timeout"))
+                return
+            job.next_poll_at = min(now + job.interval, job.deadline)
+            job.interval = min(job.interval * self.backoff, job.max_interval)
+        except Exception as e:
+            self._fail(job, e)
+        finally:
+            job.polling = False
+            self._wake.set()
+
+    def _complete(self, job: _MarkerJob, data: dict, output: MarkerOutput) -> None:
+        self._jobs.pop(job.check_url, None)
+        if job.future.done():
+            output.close()
+            return
+        elapsed = time.monotonic() - job.submitted_at
+        if not data.get("success"):
+            output.close()
+            job.future.set_exception(HTTPException(status_code=400, detail=f"Processing failed: {data.get('error')}"))
+            return
+        self.completed_total += 1
+        self.completion_stats.record(job.page_count, elapsed)
+        logger.info(f"Marker job finished after {elapsed:.1f}s and {job.polls} polls")
+        job.future.set_result(output)
+
+    def _fail(self, job: _MarkerJob, error: Exception) -> None:
+        self._jobs.pop(job.check_url, None)
+        if not job.future.done():
+            job.future.set_exception(error)
+
+    async def close(self) -> None:
+        for job in list(self._jobs.values()):
+            if not job.future.done():
+                job.future.cancel()
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def stats(self) -> dict:
+        return {
+            "jobs_in_flight": len(self._jobs),
+            "polls_total": self.polls_total,
+            "callbacks_total": self.callbacks_total,
+            "completed_total": self.completed_total,
+            "completion_seconds": self.completion_stats.stats()
+        }
+
+_poller: Optional[MarkerPoller] = None
+
+def configure_marker_poller(poller: MarkerPoller) -> None:
+    """Replace the process-wide poller (called on app startup with configured limits)"""
+    global _poller
+    _poller = poller
+
+def get_marker_poller() -> MarkerPoller:
+    """Get the process-wide poller shared by every MarkerService"""
+    global _poller
+    if _poller is None:
+        _poller = MarkerPoller()
+    return _poller
+
+async def close_marker_poller() -> None:
+    global _poller
+    if _poller is not None:
+        await _poller.close()
+        _poller = None
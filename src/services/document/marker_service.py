@@ -1,49 +1,276 @@
-from typing import Dict, Any, Tuple, List
-import requests
+from typing import Dict, Any, Tuple, List, Optional, Union, BinaryIO, Callable, Awaitable, AsyncIterator, Iterable, Iterator
+from contextlib import aclosing, asynccontextmanager
+import httpx
 import asyncio
+import io
+import math
 import os
-from uuid import uuid4
+import re
+from uuid import uuid4, uuid5, NAMESPACE_URL
 from datetime import datetime
 from fastapi import HTTPException
 from src.models.viewer.block import Block, BlockType
 from src.models.viewer.page import Page
 from src.models.base.document import Document
+from src.services.document.marker_poller import MarkerOutput, MarkerPoller, get_marker_poller, estimate_page_count
+from src.services.document.pdf_text_extractor import pdf_page_count
+from src.services.scheduling.bulkhead import run_blocking
+
+# Shared client so every MarkerService reuses pooled keep-alive connections
+_http_client: Optional[httpx.AsyncClient] = None
+
+def get_marker_http_client() -> httpx.AsyncClient:
+    """Get the process-wide async HTTP client used for Marker requests"""
+    global _http_client
+    if _http_client is None or _http_client.is_closed:
+        _http_client = httpx.AsyncClient(
+            limits=httpx.Limits(max_connections=20, max_keepalive_connections=10, keepalive_expiry=30),
+            timeout=httpx.Timeout(connect=10.0, read=120.0, write=120.0, pool=30.0)
+        )
+    return _http_client
+
+async def close_marker_http_client() -> None:
+    """Close the shared Marker HTTP client (called on app shutdown)"""
+    global _http_client
+    if _http_client is not None:
+        await _http_client.aclose()
+        _http_client = None
+
+class MarkerJobLimiter:
+    """Caps the Marker jobs (whole documents or page-range shards) in flight across the process"""
+    def __init__(self, max_jobs: int = 8):
+        self.max_jobs = max(max_jobs, 1)
+        self._semaphore = asyncio.Semaphore(self.max_jobs)
+        self.active = 0
+        self.waiting = 0
+
+    @asynccontextmanager
+    async def slot(self):
+        """Hold one job slot from submission until the result is in"""
+        self.waiting += 1
+        try:
+            await self._semaphore.acquire()
+        finally:
+            self.waiting -= 1
+        self.active += 1
+        try:
+            yield
+        finally:
+            self.active -= 1
+            self._semaphore.release()
+
+    def stats(self) -> dict:
+        return {"max_jobs": self.max_jobs, "active": self.active, "waiting": self.waiting}
+
+_job_limiter: Optional[MarkerJobLimiter] = None
+
+def configure_marker_job_limiter(limiter: MarkerJobLimiter) -> None:
+    """Replace the process-wide job limiter (called on app startup with the configured limit)"""
+    global _job_limiter
+    _job_limiter = limiter
+
+def get_marker_job_limiter() -> MarkerJobLimiter:
+    """Get the job limiter shared by every MarkerService"""
+    global _job_limiter
+    if _job_limiter is None:
+        _job_limiter = MarkerJobLimiter()
+    return _job_limiter
 
 class MarkerService:
-    def __init__(self, api_key: str):
+    DEFAULT_MARKER_URL = "https://www.datalab.to/api/v1/marker"
+
+    def __init__(self,
+                 api_key: str,
+                 marker_url: Optional[str] = None,
+                 http_client: Optional[httpx.AsyncClient] = None,
+                 poller: Optional[MarkerPoller] = None,
+                 webhook_url: Optional[str] = None,
+                 shard_pages: Optional[int] = None,
+                 limiter: Optional[MarkerJobLimiter] = None):
         self.api_key = api_key
-        self.marker_url = "https://www.datalab.to/api/v1/marker"
-        self.max_polls = 300  # 10 minutes
-        self.poll_interval = 2  # seconds
+        self.marker_url = marker_url or self.DEFAULT_MARKER_URL
+        self.http_client = http_client
+        self.poller = poller or get_marker_poller()
+        self.webhook_url = webhook_url  # Marker calls this on completion, so polling is only a fallback
+        self.shard_pages = shard_pages  # PDFs longer than this run as concurrent page-range jobs; None disables
+        self.limiter = limiter or get_marker_job_limiter()
         
         if not self.api_key:
             raise ValueError("API key not provided")
 
-    async def process_document(self, file_data: bytes, document_id: str) -> Tuple[List[Page], List[Block]]:
+    @property
+    def client(self) -> httpx.AsyncClient:
+        return self.http_client or get_marker_http_client()
+
+    async def process_document(self, file_data: Union[bytes, BinaryIO], document_id: str) -> Tuple[List[Page], List[Block]]:
         """Full document processing through Marker"""
         try:
-            check_url = await self._initiate_processing(file_data)
-            marker_response = await self._poll_until_complete(check_url)
-            return self._create_pages_and_blocks(marker_response, document_id)
+            shards = await self.plan_shards(file_data)
+            if shards:
+                return await self.process_shards(file_data, document_id, shards)
+            async with self.limiter.slot():
+                submission = await self.submit(file_data)
+                return await self.collect(submission["request_check_url"], document_id, submission["page_count"])
             
         except Exception as e:
             raise HTTPException(status_code=500, detail=str(e))
 
-    async def _initiate_processing(self, file_data: bytes) -> str:
-        """Start Marker processing, return check_url"""
+    async def plan_shards(self, file_data: Union[bytes, BinaryIO]) -> List[Dict[str, Any]]:
+        """Page ranges to run as separate Marker jobs, or [] to send the PDF as one job.
+
+        Only PDFs PyMuPDF can count are sharded; without a reliable count the
+        PDF goes as one job.
+        """
+        if not self.shard_pages:
+            return []
+        # Ranges must match the real page tree; the object scan over-counts incrementally saved PDFs
+        page_count = await run_blocking(pdf_page_count, file_data)
+        if not page_count or page_count <= self.shard_pages:
+            return []
+        # Equal-sized shards, so they finish at about the same time
+        shard_size = math.ceil(page_count / math.ceil(page_count / self.shard_pages))
+        return [
+            {"first_page": first, "last_page": min(first + shard_size, page_count) - 1}
+            for first in range(0, page_count, shard_size)
+        ]
+
+    async def process_shards(self,
+                             file_data: Union[bytes, BinaryIO],
+                             document_id: str,
+                             shards: List[Dict[str, Any]]) -> Tuple[List[Page], List[Block]]:
+        """Run page-range shards as concurrent Marker jobs and merge their pages and blocks"""
+        pages, blocks = [], []
+        async with aclosing(self.stream_shards(file_data, document_id, shards)) as stream:
+            async for page, page_blocks in stream:
+                pages.append(page)
+                blocks.extend(page_blocks)
+        return pages, blocks
+
+    async def stream_shards(self,
+                            file_data: Union[bytes, BinaryIO],
+                            document_id: str,
+                            shards: List[Dict[str, Any]],
+                            on_submitted: Optional[Callable[[Dict[str, Any]], Awaitable[None]]] = None) -> AsyncIterator[Tuple[Page, List[Block]]]:
+        """Run page-range shards (from plan_shards) as concurrent Marker jobs, yielding pages in order.
+
+        Each shard dict gets the request_id and check_url of its job, and
+        on_submitted is called once Marker has accepted it; shards that already
+        have a check_url (from before a restart) are only collected. A shard's
+        pages are yielded once it and every earlier shard are done, so early
+        pages can be stored and read while later ones are still processing.
+        """
+        upload_lock = asyncio.Lock()  # Shards are sent from the same file object, one at a time
+
+        async def run(shard: Dict[str, Any]) -> MarkerOutput:
+            async with self.limiter.slot():
+                first_poll_delay = 0 if shard.get("check_url") else None
+                if not shard.get("check_url"):
+                    async with upload_lock:
+                        if not isinstance(file_data, (bytes, bytearray)):
+                            file_data.seek(0)
+                        submission = await self.submit(file_data, (shard["first_page"], shard["last_page"]))
+                    shard["request_id"] = submission["request_id"]
+                    shard["check_url"] = submission["request_check_url"]
+                    if on_submitted:
+                        await on_submitted(shard)
+                page_count = shard["last_page"] - shard["first_page"] + 1
+                return await self._poll_until_complete(shard["check_url"], page_count, first_poll_delay)
+
+        tasks = [asyncio.create_task(run(shard)) for shard in shards]
+        hierarchy: Dict[str, str] = {}
+        try:
+            # Merge in page order; later shards keep running while earlier ones are awaited
+            for shard, task in zip(shards, tasks):
+                output = await task
+                inherited = hierarchy
+                async for page, page_blocks in _iterate_blocking(iter_pages_and_blocks(output.pages(), document_id, shard["first_page"])):
+                    if page_blocks:
+                        hierarchy = _inherit_section_hierarchy(page_blocks, inherited, hierarchy)
+                    yield page, page_blocks
+                output.close()
+        finally:
+            for task in tasks:
+                task.cancel()
+            for result in await asyncio.gather(*tasks, return_exceptions=True):
+                if isinstance(result, MarkerOutput):
+                    result.close()
+
+    async def submit(self, file_data: Union[bytes, BinaryIO], page_range: Optional[Tuple[int, int]] = None) -> Dict[str, Any]:
+        """Hand a PDF (or an inclusive range of its pages) to Marker.
+
+        Returns request_id, request_check_url and an estimated page_count.
+        """
+        if page_range:
+            page_count = page_range[1] - page_range[0] + 1
+        else:
+            # Scanning a large PDF takes a while, so keep it off the event loop
+            page_count = await run_blocking(estimate_page_count, file_data)
+        data = await self._initiate_processing(file_data, page_range)
+        return {
+            "request_id": data.get("request_id"),
+            "request_check_url": data["request_check_url"],
+            "page_count": page_count
+        }
+
+    async def collect(self,
+                      check_url: str,
+                      document_id: str,
+                      page_count: Optional[int] = None,
+                      first_poll_delay: Optional[float] = None) -> Tuple[List[Page], List[Block]]:
+        """Wait for a submitted job and build its pages and blocks.
+
+        Raises HTTPException 404 if Marker no longer knows the job (e.g. its
+        results expired), in which case the PDF has to be submitted again.
+        """
+        pages, blocks = [], []
+        async with aclosing(self.stream(check_url, document_id, page_count, first_poll_delay)) as stream:
+            async for page, page_blocks in stream:
+                pages.append(page)
+                blocks.extend(page_blocks)
+        return pages, blocks
+
+    async def stream(self,
+                     check_url: str,
+                     document_id: str,
+                     page_count: Optional[int] = None,
+                     first_poll_delay: Optional[float] = None) -> AsyncIterator[Tuple[Page, List[Block]]]:
+        """Wait for a submitted job, then yield each page with its blocks as it is parsed.
+
+        Only one page of Marker's output is in memory at a time, so callers that
+        store each page before asking for the next keep memory flat whatever the
+        document's length. Raises HTTPException 404 like collect.
+        """
+        output = await self._poll_until_complete(check_url, page_count, first_poll_delay)
+        try:
+            async for page, page_blocks in _iterate_blocking(iter_pages_and_blocks(output.pages(), document_id)):
+                yield page, page_blocks
+        finally:
+            output.close()
+
+    async def _initiate_processing(self, file_data: Union[bytes, BinaryIO], page_range: Optional[Tuple[int, int]] = None) -> Dict[str, Any]:
+        """Start Marker processing, return its response with request_check_url"""
+        # httpx streams file objects in chunks instead of building the whole body in memory
+        file_obj = io.BytesIO(file_data) if isinstance(file_data, (bytes, bytearray)) else file_data
+        files = {'file': ('document.pdf', file_obj, 'application/pdf')}
         form_data = {
-            'file': ('document.pdf', file_data, 'application/pdf'),
-            'langs': (None, "English"),
-            'output_format': (None, 'json'),
-            "paginate": (None, True),
-            "force_ocr": (None, False),
-            "use_llm": (None, False),
-            "strip_existing_ocr": (None, False),
-            "disable_image_extraction": (None, False)
+            'langs': "English",
+            'output_format': 'json',
+            "paginate": "True",
+            "force_ocr": "False",
+            "use_llm": "False",
+            "strip_existing_ocr": "False",
+            "disable_image_extraction": "False"
         }
+        if page_range:
+            form_data["page_range"] = f"{page_range[0]}-{page_range[1]}"
+        if self.webhook_url:
+            form_data["webhook_url"] = self.webhook_url
         
         headers = {"X-Api-Key": self.api_key}
-        response = requests.post(self.marker_url, files=form_data, headers=headers)
+        try:
+            response = await self.client.post(self.marker_url, files=files, data=form_data, headers=headers)
+        except httpx.HTTPError as e:
+            raise HTTPException(status_code=502, detail=f"Marker API request failed: {e}")
         
         if response.status_code != 200:
             raise HTTPException(status_code=response.status_code, 
@@ -54,67 +281,131 @@ class MarkerService:
             raise HTTPException(status_code=400, 
                               detail=f"Marker API request failed: {data.get('error')}")
             
-        return data["request_check_url"]
+        return data
 
-    async def _poll_until_complete(self, check_url: str) -> Dict[str, Any]:
-        """Poll check_url until processing is complete"""
-        headers = {"X-Api-Key": self.api_key}
-        
-        for _ in range(self.max_polls):
-            await asyncio.sleep(self.poll_interval)
-            response = requests.get(check_url, headers=headers)
-            data = response.json()
+    async def _poll_until_complete(self, check_url: str, page_count: Optional[int] = None, first_poll_delay: Optional[float] = None) -> MarkerOutput:
+        """Wait for the shared poller (or webhook) to report the job complete"""
+        return await self.poller.wait(
+            self.client,
+            check_url,
+            self.api_key,
+            page_count=page_count,
+            expect_callback=bool(self.webhook_url),
+            first_poll_delay=first_poll_delay
+        )
+
+def pages_and_blocks_from_marker_json(marker_response: Dict[str, Any], document_id: str, page_offset: int = 0) -> Tuple[List[Page], List[Block]]:
+    """Create Page and Block objects from Marker's JSON output (or anything shaped like it)"""
+    pages = []
+    blocks = []
+    for page, page_blocks in iter_pages_and_blocks(marker_response.get('children', []), document_id, page_offset):
+        pages.append(page)
+        blocks.extend(page_blocks)
+    return pages, blocks
+
+def iter_pages_and_blocks(marker_pages: Iterable[Dict[str, Any]], document_id: str, page_offset: int = 0) -> Iterator[Tuple[Page, List[Block]]]:
+    """Build each Page and its Blocks from Marker's page dicts, one page at a time.
+
+    page_offset is the number of the first page, for the output of a page-range job.
+    """
+    shift = None
+    
+    # Process each page in the response
+    for page_idx, page_data in enumerate(marker_pages, start=page_offset):
+        if page_data.get('block_type') != 'Page':  # Only process Page blocks
+            continue
+        if shift is None:
+            shift = _marker_page_shift(page_data, page_offset)
+        if shift:
+            _renumber_marker_ids(page_data, shift)
             
-            if data["status"] == "complete":
-                if not data["success"]:
-                    raise HTTPException(status_code=400, 
-                                      detail=f"Processing failed: {data.get('error')}")
-                return data.get('json', {})
-                
-        raise HTTPException(status_code=408, detail="Processing timeout")
-
-    def _create_pages_and_blocks(self, marker_response: Dict[str, Any], document_id: str) -> Tuple[List[Page], List[Block]]:
-        """Create Page and Block objects from Marker response"""
-        pages = []
-        blocks = []
+        # Create the page; IDs are derived from the document so re-ingesting a job overwrites rather than duplicates
+        page = Page(
+            id=stable_id(document_id, f"/page/{page_idx}"),
+            page_number=page_idx,
+            polygon=page_data.get('polygon'),
+            html_content=page_data.get('html', ""),
+            document_id=document_id,
+            created_at=datetime.now(),
+            updated_at=datetime.now()
+        )
         
-        # Process each page in the response
-        for page_idx, page_data in enumerate(marker_response.get('children', [])):
-            if page_data.get('block_type') != 'Page':  # Only process Page blocks
-                continue
-                
-            # Create the page
-            page = Page(
-                page_number=page_idx,
-                polygon=page_data.get('polygon'),
-                html_content=page_data.get('html', ""),
-                document_id=document_id,
-                created_at=datetime.now(),
-                updated_at=datetime.now()
-            )
-            pages.append(page)
-            
-            # Process blocks in this page
-            page_blocks = self._process_blocks(page_data.get('children', []), document_id, page.id)
-            blocks.extend(page_blocks)
-            
-            # Add block IDs to page
-            for block in page_blocks:
-                page.add_block(block.id)
+        # Process blocks in this page
+        page_blocks = _process_blocks(page_data.get('children', []), document_id, page.id)
         
-        return pages, blocks
-    
-    def _process_blocks(self, block_list: List[Dict], document_id: str, page_id: str) -> List[Block]:
-        """Recursively process blocks and their children"""
-        blocks = []
-        for block_data in block_list:
-            # Create block with document_id
-            block = Block.from_marker_block(block_data, document_id, page_id)
-            blocks.append(block)
-            
-            # Process children recursively
-            if block_data.get('children'):
-                child_blocks = self._process_blocks(block_data['children'], document_id, page_id)
-                blocks.extend(child_blocks)
+        # Add block IDs to page
+        for reading_order, block in enumerate(page_blocks):
+            block.page_number = page_idx
+            block.reading_order = reading_order
+            page.add_block(block.id)
+        yield page, page_blocks
+
+async def _iterate_blocking(iterator: Iterator) -> AsyncIterator:
+    """Advance a blocking iterator (e.g. an incremental parse) off the event loop"""
+    done = object()
+    while (item := await run_blocking(next, iterator, done)) is not done:
+        yield item
+
+def _process_blocks(block_list: List[Dict], document_id: str, page_id: str) -> List[Block]:
+    """Recursively process blocks and their children"""
+    blocks = []
+    for block_data in block_list:
+        # Create block with document_id
+        block_id = stable_id(document_id, block_data['id']) if block_data.get('id') else None
+        block = Block.from_marker_block(block_data, document_id, page_id, block_id)
+        blocks.append(block)
         
-        return blocks
\ No newline at end of file
+        # Process children recursively
+        if block_data.get('children'):
+            child_blocks = _process_blocks(block_data['children'], document_id, page_id)
+            blocks.extend(child_blocks)
+    
+    return blocks
+
+_MARKER_PAGE_ID = re.compile(r"^/page/(\d+)/")
+
+def _marker_page_shift(first_page: Dict[str, Any], page_offset: int) -> int:
+    """How far a page-range job's Marker IDs are from the page numbers of the whole document.
+
+    Marker may number a range from 0 or from its first page; renumbering keeps
+    block IDs the same as when the PDF is processed in one job.
+    """
+    match = _MARKER_PAGE_ID.match(first_page.get('id') or "")
+    return page_offset - int(match.group(1)) if match else 0
+
+def _renumber_marker_ids(block_data: Dict[str, Any], shift: int) -> None:
+    """Shift the page number in a Marker block's ID and section hierarchy, and its children's"""
+    def renumber(marker_id: str) -> str:
+        return _MARKER_PAGE_ID.sub(lambda m: f"/page/{int(m.group(1)) + shift}/", marker_id)
+
+    if block_data.get('id'):
+        block_data['id'] = renumber(block_data['id'])
+    if block_data.get('section_hierarchy'):
+        block_data['section_hierarchy'] = {level: renumber(marker_id) for level, marker_id in block_data['section_hierarchy'].items()}
+    for child in block_data.get('children') or []:
+        _renumber_marker_ids(child, shift)
+
+def _inherit_section_hierarchy(blocks: List[Block], inherited: Dict[str, str], current: Dict[str, str]) -> Dict[str, str]:
+    """Extend a shard's section hierarchies with the sections still open at the end of the previous shard.
+
+    A shard's own header at some level closes the inherited sections at that
+    level and deeper. Blocks without a hierarchy of their own (page headers and
+    footers) take the sections open so far, current, without changing them.
+    Returns the sections open after the blocks, to pass back in as current and,
+    at the end of the shard, to hand to the next shard as inherited.
+    """
+    for block in blocks:
+        own = block.section_hierarchy or {}
+        if not own:
+            if current:
+                block.section_hierarchy = dict(current)
+            continue
+        shallowest = min(int(level) for level in own)
+        current = {level: marker_id for level, marker_id in inherited.items() if int(level) < shallowest}
+        current.update(own)
+        block.section_hierarchy = dict(current)
+    return current
+
+def stable_id(document_id: str, marker_id: str) -> str:
+    """Deterministic UUID for a Marker page or block within a document"""
+    return str(uuid5(NAMESPACE_URL, f"ruminate:{document_id}{marker_id}"))
@@ -0,0 +1,168 @@
+"""PDF text-layer extraction with PyMuPDF, producing Marker-shaped JSON.
+
+Runs inside worker processes, so it only depends on PyMuPDF (an optional
+dependency: pip install pymupdf) and the standard library.
+"""
+import html
+import os
+import statistics
+from typing import Any, BinaryIO, Dict, List, Optional, Union
+
+# A text block is a section header if its largest font is this much bigger than body text...
+HEADER_SIZE_RATIO = 1.15
+# ...or it is bold throughout, and in either case no longer than this
+MAX_HEADER_CHARS = 150
+MAX_HEADER_LINES = 3
+MAX_HEADER_LEVELS = 4
+# Short blocks entirely within this fraction of the top or bottom edge are running headers/footers
+PAGE_MARGIN_FRACTION = 0.06
+MAX_MARGIN_CHARS = 120
+BOLD_FLAG = 16
+
+def _open_pdf(source: Union[bytes, str]):
+    import pymupdf
+    if isinstance(source, str):
+        return pymupdf.open(source)
+    return pymupdf.open(stream=source, filetype="pdf")
+
+def pdf_page_count(source: Union[bytes, str, BinaryIO]) -> Optional[int]:
+    """Exact page count from the PDF's page tree, None if PyMuPDF is missing or cannot parse it.
+
+    File objects are opened by path when they have one, otherwise read whole
+    and rewound to where they started.
+    """
+    try:
+        import pymupdf  # noqa: F401
+    except ImportError:
+        return None
+    if isinstance(source, bytearray):
+        source = bytes(source)
+    elif not isinstance(source, (bytes, str)):
+        name = getattr(source, "name", None)
+        if isinstance(name, str) and os.path.isfile(name):
+            source = name
+        else:
+            start = source.tell()
+            try:
+                data = source.read()
+            finally:
+                source.seek(start)
+            source = data
+    try:
+        with _open_pdf(source) as pdf:
+            return pdf.page_count
+    except Exception:
+        return None
+
+def _polygon(bbox) -> List[List[float]]:
+    x0, y0, x1, y1 = bbox
+    return [[x0, y0], [x1, y0], [x1, y1], [x0, y1]]
+
+def inspect_text_layer(source: Union[bytes, str], sample_pages: int = 5) -> Dict[str, Any]:
+    """Page count and average characters of embedded text over a spread of pages"""
+    with _open_pdf(source) as pdf:
+        page_count = pdf.page_count
+        if page_count == 0:
+            return {"page_count": 0, "chars_per_page": 0.0}
+        step = max(1, page_count // sample_pages)
+        sample = range(0, page_count, step)
+        chars = [len(pdf[index].get_text("text").strip()) for index in sample]
+    return {"page_count": page_count, "chars_per_page": statistics.mean(chars)}
+
+def _text_blocks(page) -> List[Dict[str, Any]]:
+    """Non-empty text and image blocks of a page with their text, font size and boldness"""
+    blocks = []
+    for raw in page.get_text("dict")["blocks"]:
+        if raw["type"] == 1:
+            blocks.append({"kind": "image", "bbox": raw["bbox"]})
+            continue
+        lines = raw.get("lines", [])
+        spans = [span for line in lines for span in line["spans"] if span["text"].strip()]
+        if not spans:
+            continue
+        text = " ".join("".join(span["text"] for span in line["spans"]).strip() for line in lines).strip()
+        blocks.append({
+            "kind": "text",
+            "bbox": raw["bbox"],
+            "text": text,
+            "lines": len(lines),
+            "size": max(span["size"] for span in spans),
+            "chars": sum(len(span["text"]) for span in spans),
+            "bold": all(span["flags"] & BOLD_FLAG or "Bold" in span["font"] for span in spans)
+        })
+    return blocks
+
+def extract_marker_json(source: Union[bytes, str]) -> Dict[str, Any]:
+    """Extract a PDF's text layer into the JSON structure Marker returns"""
+    with _open_pdf(source) as pdf:
+        pages = [(page.rect, _text_blocks(page)) for page in pdf]
+
+    # Body text size is the size most characters are set in
+    sizes: Dict[float, int] = {}
+    for _, blocks in pages:
+        for block in blocks:
+            if block["kind"] == "text":
+                size = round(block["size"] * 2) / 2
+                sizes[size] = sizes.get(size, 0) + block["chars"]
+    body_size = max(sizes, key=sizes.get) if sizes else 10.0
+
+    def is_header(block) -> bool:
+        if len(block["text"]) > MAX_HEADER_CHARS or block["lines"] > MAX_HEADER_LINES:
+            return False
+        return block["size"] >= body_size * HEADER_SIZE_RATIO or block["bold"]
+
+    header_sizes = sorted({
+        round(block["size"] * 2) / 2
+        for _, blocks in pages for block in blocks
+        if block["kind"] == "text" and is_header(block)
+    }, reverse=True)
+
+    def header_level(block) -> int:
+        return min(header_sizes.index(round(block["size"] * 2) / 2) + 1, MAX_HEADER_LEVELS)
+
+    hierarchy: Dict[str, str] = {}
+    children = []
+    for page_index, (rect, blocks) in enumerate(pages):
+        counters: Dict[str, int] = {}
+        page_children = []
+        for block in blocks:
+            if block["kind"] == "image":
+                block_type, block_html = "Picture", ""
+            else:
+                text = html.escape(block["text"])
+                x0, y0, x1, y1 = block["bbox"]
+                margin = rect.height * PAGE_MARGIN_FRACTION
+                if len(block["text"]) <= MAX_MARGIN_CHARS and y1 <= rect.y0 + margin:
+                    block_type, block_html = "PageHeader", f"<p>{text}</p>"
+                elif len(block["text"]) <= MAX_MARGIN_CHARS and y0 >= rect.y1 - margin:
+                    block_type, block_html = "PageFooter", f"<p>{text}</p>"
+                elif is_header(block):
+                    level = header_level(block)
+                    block_type, block_html = "SectionHeader", f"<h{level}>{text}</h{level}>"
+                else:
+                    block_type, block_html = "Text", f"<p>{text}</p>"
+
+            block_id = f"/page/{page_index}/{block_type}/{counters.get(block_type, 0)}"
+            counters[block_type] = counters.get(block_type, 0) + 1
+            if block_type == "SectionHeader":
+                # A header replaces its own level and closes every deeper one
+                hierarchy = {key: value for key, value in hierarchy.items() if int(key) < level}
+                hierarchy[str(level)] = block_id
+
+            page_children.append({
+                "id": block_id,
+                "block_type": block_type,
+                "html": block_html,
+                "polygon": _polygon(block["bbox"]),
+                "section_hierarchy": dict(hierarchy),
+                "images": {}
+            })
+
+        children.append({
+            "id": f"/page/{page_index}/Page/0",
+            "block_type": "Page",
+            "html": "",
+            "polygon": _polygon(tuple(rect)),
+            "children": page_children
+        })
+    return {"block_type": "Document", "children": children}
@@ -1,68 +1,320 @@
 # services/document/upload_service.py
-from typing import Optional, List
+from typing import Optional, List, Dict, Any, BinaryIO, AsyncIterator, Tuple
 import uuid
 import asyncio
+import hashlib
 import logging
+import time
+from contextlib import aclosing
 from datetime import datetime
-from fastapi import UploadFile
+from fastapi import UploadFile, HTTPException
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from src.models.base.document import Document, DocumentStatus
 from src.models.viewer.block import Block
+from src.models.viewer.page import Page
 from src.repositories.interfaces.document_repository import DocumentRepository
 from src.repositories.interfaces.storage_repository import StorageRepository
+from src.repositories.interfaces.insight_repository import InsightRepository
 from src.services.document.marker_service import MarkerService
+from src.services.document.block_images import store_block_images
+from src.services.document.extraction_router import ExtractionRouter, ExtractionBackend
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Bytes read from an upload at a time while hashing
+UPLOAD_CHUNK_SIZE = 1024 * 1024
+# While pages are being stored, progress is saved to the document at most this often
+PROGRESS_SAVE_SECONDS = 1.0
+# Parsed pages are written together once this many blocks or seconds have built up
+STORE_BATCH_BLOCKS = 2000
+STORE_BATCH_SECONDS = 0.5
+
 class UploadService:
-    def __init__(self, document_repository: DocumentRepository, storage_repository: StorageRepository, marker_service: MarkerService, rumination_service=None):
+    def __init__(self,
+                 document_repository: DocumentRepository,
+                 storage_repository: StorageRepository,
+                 marker_service: MarkerService,
+                 rumination_service=None,
+                 insight_repository: Optional[InsightRepository] = None,
+                 deduplicate: bool = True,
+                 clone_insights: bool = False,
+                 extraction_router: Optional[ExtractionRouter] = None):
         self.document_repo = document_repository
         self.storage_repo = storage_repository
         self.marker = marker_service
         self.rumination_service = rumination_service
+        self.insight_repo = insight_repository
+        self.deduplicate = deduplicate
+        self.clone_insights = clone_insights
+        self.extraction_router = extraction_router
+        self._save_lock = asyncio.Lock()  # Shards of one job are submitted and stored concurrently
 
     async def upload(self, file: UploadFile, session: Optional[AsyncSession] = None, user_id: str = None) -> Document:
         """Upload a document and process it for viewing"""
+        document = await self.accept_upload(file, session, user_id)
+        if document.status == DocumentStatus.PENDING:
+            document = await self.process_document(document, session)
+        return document
+
+    async def accept_upload(self, file: UploadFile, session: Optional[AsyncSession] = None, user_id: str = None) -> Document:
+        """Store the PDF and a PENDING document; processing is left to process_document"""
         document = Document(
             user_id=user_id,
             title=file.filename,
             created_at=datetime.now(),
             updated_at=datetime.now()
         )
-        file_data = await file.read()
-        
+        document.content_hash = await self._hash_upload(file)
+
+        # Reuse the pages and blocks of an identical PDF instead of calling Marker again
+        if self.deduplicate:
+            existing = await self.document_repo.get_document_by_hash(document.content_hash, session)
+            if existing:
+                if existing.user_id == user_id:
+                    logger.info(f"Upload matches existing document {existing.id} of the same user")
+                    return existing
+                return await self._clone_document(existing, document, session)
+
+        # UploadFile is already spooled to disk by Starlette, so hand storage the file object
+        await file.seek(0)
+        document.s3_pdf_path = await self.storage_repo.store_stream(file.file, document.id, session)
+        await self.document_repo.store_document(document, session)
+        return document
+
+    async def _hash_upload(self, file: UploadFile) -> str:
+        """SHA-256 of an upload, read in chunks so the PDF is never held in memory"""
+        digest = hashlib.sha256()
+        while chunk := await file.read(UPLOAD_CHUNK_SIZE):
+            digest.update(chunk)
+        return digest.hexdigest()
+
+    async def process_document(self, document: Document, session: Optional[AsyncSession] = None) -> Document:
+        """Run a stored PENDING document through Marker (or local extraction) and persist its pages and blocks"""
         try:
-            # Store document first
-            await self.document_repo.store_document(document, session)
-            
-            # Run storage and Marker in parallel
-            s3_path = await self.storage_repo.store_file(file_data, document.id, session)
-            document.s3_pdf_path = s3_path
-            logger.info("Starting marker processing!")
-            document.start_marker_processing()
-            
-            # Pass document_id to marker service
-            pages, blocks = await self.marker.process_document(file_data, document.id)
+            pdf = await self.storage_repo.open_file(document.s3_pdf_path, session)
+            if pdf is None:
+                raise FileNotFoundError(f"Stored PDF not found at {document.s3_pdf_path}")
+
+            try:
+                backend = await self.extraction_router.choose(pdf) if self.extraction_router else ExtractionBackend.MARKER
+                if backend == ExtractionBackend.LOCAL:
+                    logger.info("Extracting text layer locally")
+                    document.start_marker_processing()
+                    await self._save_status(document, session)
+                    pages, blocks = await self.extraction_router.local_service.process_document(pdf, document.id)
+                    return await self._store_results(document, pages, blocks, session)
+
+                shards = await self.marker.plan_shards(pdf)
+                if shards:
+                    return await self._process_shards(document, pdf, shards, session)
+
+                async with self.marker.limiter.slot():
+                    logger.info("Starting marker processing!")
+                    # Marker gets the open file, so the upload body is streamed from storage
+                    submission = await self.marker.submit(pdf)
+
+                    document.start_marker_processing()
+                    document.marker_job_id = submission["request_id"]
+                    document.marker_check_url = submission["request_check_url"]
+                    document.page_count = submission["page_count"]
+                    await self._save_status(document, session)  # Persisted so a restart can resume the job
+
+                    # Pass document_id to marker service
+                    pages = self.marker.stream(document.marker_check_url, document.id, submission["page_count"])
+                    return await self._store_page_stream(document, pages, session)
+            finally:
+                pdf.close()
             
-            # Store pages and blocks
-            await self.document_repo.store_pages(pages, session)
-            await self.document_repo.store_blocks(blocks, session)
+        except Exception as e:
+            await self._record_error(document, e, session)
+            raise
 
-            document.start_rumination_processing()
-            logger.info("Ruminations would happen here!")
-            # chunks, excerpts = await self.rumination_service.split_document(blocks)
-            # await self.document_repo.store_chunks(chunks, session)
-            # await self.document_repo.store_excerpts(excerpts, session)
+    async def _process_shards(self, document: Document, pdf: BinaryIO, shards: List[Dict[str, Any]], session: Optional[AsyncSession] = None) -> Document:
+        """Run a long PDF as concurrent page-range Marker jobs, storing each shard as soon as it can be read"""
+        logger.info(f"Starting marker processing in {len(shards)} shards")
+        document.start_marker_processing()
+        document.marker_shards = shards
+        document.page_count = shards[-1]["last_page"] + 1
+        await self._save_status(document, session)
+
+        async def shard_submitted(shard: Dict[str, Any]) -> None:
+            await self._save_status(document, session)  # Persisted so a restart can resume the shard
+
+        # The shard dicts held by the document get each job's check URL as it is submitted
+        pages = self.marker.stream_shards(pdf, document.id, document.marker_shards, shard_submitted)
+        return await self._store_page_stream(document, pages, session)
+
+    async def resume_document(self, document: Document, session: Optional[AsyncSession] = None) -> Document:
+        """Finish a document whose processing was interrupted (e.g. by a restart)"""
+        if document.status == DocumentStatus.PROCESSING_MARKER and document.marker_shards:
+            return await self._resume_shards(document, session)
+        if document.status != DocumentStatus.PROCESSING_MARKER or not document.marker_check_url:
+            # Never reached Marker, so start from the stored PDF
+            return await self.process_document(document, session)
+        try:
+            logger.info(f"Resuming Marker job for document {document.id}")
+            # The job has been running since before the restart, so check on it right away
+            pages = self.marker.stream(document.marker_check_url, document.id, first_poll_delay=0)
+            return await self._store_page_stream(document, pages, session)
+        except HTTPException as e:
+            if e.status_code != 404:
+                await self._record_error(document, e, session)
+                raise
+            logger.warning(f"Marker job for document {document.id} has expired, submitting it again")
+            return await self.process_document(document, session)
+        except Exception as e:
+            await self._record_error(document, e, session)
+            raise
 
-            # await self.rumination_service.process_document(document)
+    async def _resume_shards(self, document: Document, session: Optional[AsyncSession] = None) -> Document:
+        """Collect the shards of an interrupted sharded job, submitting the ones Marker never got"""
+        logger.info(f"Resuming sharded Marker job for document {document.id}")
+        try:
+            pdf = await self.storage_repo.open_file(document.s3_pdf_path, session)
+            if pdf is None:
+                raise FileNotFoundError(f"Stored PDF not found at {document.s3_pdf_path}")
+            try:
+                return await self._process_shards(document, pdf, document.marker_shards, session)
+            finally:
+                pdf.close()
+        except HTTPException as e:
+            if e.status_code != 404:
+                await self._record_error(document, e, session)
+                raise
+            logger.warning(f"A Marker shard of document {document.id} has expired, submitting it again")
+            document.marker_shards = []
+            return await self.process_document(document, session)
+        except Exception as e:
+            await self._record_error(document, e, session)
+            raise
+
+    async def _store_page_stream(self, document: Document, pages: AsyncIterator[Tuple[Page, List[Block]]], session: Optional[AsyncSession] = None) -> Document:
+        """Store pages and their blocks as they are parsed, then mark the document READY.
+
+        Pages are written in small batches (by block count or age), so memory
+        stays flat however long the document is and readers see pages as they land.
+        """
+        document.pages_processed = 0
+        last_saved = time.monotonic()
+        batch_pages: List[Page] = []
+        batch_blocks: List[Block] = []
+        batch_started = None
+
+        async def flush():
+            nonlocal batch_pages, batch_blocks, batch_started, last_saved
+            # Page and block IDs are deterministic, so storing them twice after a resume is harmless
+            await store_block_images(batch_blocks, self.storage_repo, session)
+            await self.document_repo.store_pages_and_blocks(batch_pages, batch_blocks, session)
+            document.pages_processed += len(batch_pages)
+            batch_pages, batch_blocks, batch_started = [], [], None
+            if time.monotonic() - last_saved >= PROGRESS_SAVE_SECONDS:
+                await self._save_status(document, session)
+                last_saved = time.monotonic()
+
+        async with aclosing(pages) as page_stream:
+            next_page = None
+            try:
+                while True:
+                    next_page = asyncio.ensure_future(anext(page_stream, None))
+                    if batch_pages:
+                        # Don't hold parsed pages back while the next one is slow to come (e.g. the next shard)
+                        age = time.monotonic() - batch_started
+                        await asyncio.wait({next_page}, timeout=max(STORE_BATCH_SECONDS - age, 0))
+                        if not next_page.done():
+                            await flush()
+                    item = await next_page
+                    if item is None:
+                        break
+                    page, blocks = item
+                    batch_pages.append(page)
+                    batch_blocks.extend(blocks)
+                    batch_started = batch_started or time.monotonic()
+                    if len(batch_blocks) >= STORE_BATCH_BLOCKS:
+                        await flush()
+            finally:
+                if next_page and not next_page.done():
+                    next_page.cancel()
+                    await asyncio.wait({next_page})
+        if batch_pages:
+            await flush()
+
+        document.page_count = document.pages_processed
+        document.set_ready()
+        await self._save_status(document, session)
+        return document
+
+    async def _store_results(self, document: Document, pages: List[Page], blocks: List[Block], session: Optional[AsyncSession] = None) -> Document:
+        """Store pages and blocks, then mark the document READY"""
+        try:
+            # Page and block IDs are deterministic, so storing them twice after a resume is harmless
+            await store_block_images(blocks, self.storage_repo, session)
+            await self.document_repo.store_pages_and_blocks(pages, blocks, session)
+
+            document.page_count = document.pages_processed = len(pages)
             document.set_ready()
-            await self.document_repo.store_document(document, session)  # Update document status
+            await self._save_status(document, session)
             return document
-            
         except Exception as e:
-            logger.error(f"Error processing document: {e}")
-            document.set_error(str(e))
-            await self.document_repo.store_document(document, session)  # Store error status
-            raise
\ No newline at end of file
+            await self._record_error(document, e, session)
+            raise
+
+    async def _record_error(self, document: Document, error: Exception, session: Optional[AsyncSession] = None) -> None:
+        if document.status == DocumentStatus.ERROR:
+            return
+        logger.error(f"Error processing document: {error}")
+        document.set_error(str(error))
+        await self._save_status(document, session)  # Store error status
+
+    async def _save_status(self, document: Document, session: Optional[AsyncSession] = None) -> None:
+        async with self._save_lock:
+            document.updated_at = datetime.now()
+            await self.document_repo.store_document(document, session)
+
+    async def _clone_document(self, source: Document, document: Document, session: Optional[AsyncSession] = None) -> Document:
+        """Copy the processed pages and blocks (and optionally insights) of source into document"""
+        logger.info(f"Upload matches document {source.id}, cloning instead of processing")
+        pages = await self.document_repo.get_document_pages(source.id, session)
+        blocks = await self.document_repo.get_blocks(source.id, session)
+
+        # New IDs so the clone can be annotated and deleted independently
+        page_ids = {page.id: str(uuid.uuid4()) for page in pages}
+        block_ids = {block.id: str(uuid.uuid4()) for block in blocks}
+        cloned_pages = [
+            page.model_copy(update={
+                "id": page_ids[page.id],
+                "document_id": document.id,
+                "block_ids": [block_ids.get(block_id, block_id) for block_id in page.block_ids]
+            })
+            for page in pages
+        ]
+        cloned_blocks = [
+            block.model_copy(update={
+                "id": block_ids[block.id],
+                "document_id": document.id,
+                "page_id": page_ids.get(block.page_id, block.page_id)
+            })
+            for block in blocks
+        ]
+
+        # The PDF bytes are identical, so the stored file is shared
+        document.s3_pdf_path = source.s3_pdf_path
+        document.page_count = document.pages_processed = len(pages)
+        # Stored before its blocks (which take their user_id from it), but only READY once they exist,
+        # since the viewer fetches blocks as soon as it sees READY
+        await self.document_repo.store_document(document, session)
+        await self.document_repo.store_pages_and_blocks(cloned_pages, cloned_blocks, session)
+        document.set_ready()
+        await self.document_repo.store_document(document, session)
+
+        if self.clone_insights and self.insight_repo:
+            # Written in the same session: another connection would wait on its uncommitted writes
+            insights = await self.insight_repo.get_document_insights(source.id)
+            await self.insight_repo.create_insights([
+                insight.model_copy(update={"block_id": block_ids[insight.block_id], "document_id": document.id})
+                for insight in insights if insight.block_id in block_ids
+            ], session)
+
+        logger.info(f"Cloned {len(cloned_pages)} pages and {len(cloned_blocks)} blocks into document {document.id}")
+        return document
@@ -0,0 +1,112 @@
+import math
+import re
+import logging
+from typing import Dict, List, Optional, Tuple
+
+from src.models.viewer.block import Block
+from src.models.rumination.rumination_estimate import BlockEstimate, RuminationEstimate
+from src.services.rumination.structured_insight_service import StructuredInsightService
+
+logger = logging.getLogger(__name__)
+
+# USD per 1M (input, output) tokens
+MODEL_PRICING: Dict[str, Tuple[float, float]] = {
+    "gpt-4o-mini": (0.15, 0.60),
+    "gpt-4o": (2.50, 10.00),
+    "gpt-4.1-mini": (0.40, 1.60),
+    "gpt-4.1": (2.00, 8.00),
+}
+
+class RuminationEstimator:
+    """Estimates the LLM calls, tokens, wall time and cost of ruminating a document.
+
+    Mirrors the message flow of StructuredInsightService.analyze_block without
+    calling the provider: one analysis call and one annotation call per block,
+    both sent on top of the cumulative context of every earlier block.
+    """
+    CHARS_PER_TOKEN = 4
+    MESSAGE_OVERHEAD_TOKENS = 4  # Role and separators per chat message
+    ANNOTATION_SCHEMA_TOKENS = 150  # Function definition sent with the annotation call
+    ANALYSIS_RESPONSE_TOKENS = 40  # initial_analysis asks for 20 words or less
+    ANNOTATION_RESPONSE_TOKENS = 150
+
+    def __init__(self,
+                 prompts: Dict[str, str],
+                 model: str,
+                 seconds_per_call: float = 3.0):
+        self.prompts = prompts
+        self.model = model
+        self.seconds_per_call = seconds_per_call
+
+    def _estimate_tokens(self, text: str) -> int:
+        return math.ceil(len(text) / self.CHARS_PER_TOKEN) + self.MESSAGE_OVERHEAD_TOKENS
+
+    def _cost(self, model: str, input_tokens: int, output_tokens: int) -> Optional[float]:
+        pricing = MODEL_PRICING.get(model)
+        if not pricing:
+            return None
+        input_price, output_price = pricing
+        return (input_tokens * input_price + output_tokens * output_price) / 1_000_000
+
+    def estimate(self, document_id: str, blocks: List[Block]) -> RuminationEstimate:
+        """Estimate a rumination run over the given blocks"""
+        analyzed = [block for block in blocks if StructuredInsightService.should_analyze(block)]
+
+        cumulative_tokens = 0
+        max_context_tokens = 0
+        block_estimates = []
+        for block in analyzed:
+            plain_text = re.sub(r'<[^>]+>', '', block.html_content or "").strip()
+
+            # Analysis call: cumulative context + initial analysis message
+            analysis_message = self._estimate_tokens(
+                f"{self.prompts.get('initial_analysis', '')}\n"
+                f"[Block ID: {block.id}, Page: {block.page_number}]\n"
+                f"{plain_text}"
+            )
+            analysis_input = cumulative_tokens + analysis_message
+            cumulative_tokens += analysis_message + self.ANALYSIS_RESPONSE_TOKENS
+
+            # Annotation call: updated context + annotation message + schema
+            annotation_message = self._estimate_tokens(
+                f"{self.prompts.get('annotation_extraction', '')}\n\nBlock Text:\n{plain_text}\n\n"
+                "Please format your response as a valid json object."
+            )
+            annotation_input = cumulative_tokens + annotation_message + self.ANNOTATION_SCHEMA_TOKENS
+            cumulative_tokens += annotation_message
+
+            max_context_tokens = max(max_context_tokens, analysis_input, annotation_input)
+            block_estimates.append(BlockEstimate(
+                block_id=block.id,
+                page_number=block.page_number,
+                llm_calls=2,
+                input_tokens=analysis_input + annotation_input,
+                output_tokens=self.ANALYSIS_RESPONSE_TOKENS + self.ANNOTATION_RESPONSE_TOKENS
+            ))
+
+        llm_calls = sum(b.llm_calls for b in block_estimates)
+        input_tokens = sum(b.input_tokens for b in block_estimates)
+        output_tokens = sum(b.output_tokens for b in block_estimates)
+        cost_by_model = {
+            model: round(self._cost(model, input_tokens, output_tokens), 6)
+            for model in MODEL_PRICING
+        }
+        configured_cost = self._cost(self.model, input_tokens, output_tokens)
+        if configured_cost is None:
+            logger.warning(f"No pricing known for model {self.model}")
+
+        return RuminationEstimate(
+            document_id=document_id,
+            model=self.model,
+            blocks_total=len(blocks),
+            blocks_analyzed=len(analyzed),
+            blocks_skipped=len(blocks) - len(analyzed),
+            llm_calls=llm_calls,
+            input_tokens=input_tokens,
+            output_tokens=output_tokens,
+            max_context_tokens=max_context_tokens,
+            estimated_seconds=llm_calls * self.seconds_per_call,
+            estimated_cost_usd=round(configured_cost or 0.0, 6),
+            cost_by_model=cost_by_model,
+            blocks=block_estimates
+        )
@@ -14,6 +14,9 @@ logger = logging.getLogger(__name__)
 logger.setLevel(logging.DEBUG)
 
 class StructuredInsightService:
+    # Block types that rumination sends to the LLM; everything else is skipped
+    RUMINATION_BLOCK_TYPES = {"text"}
+
     def __init__(self, 
                  llm_service: LLMService,
                  insight_repository: InsightRepository):
@@ -39,6 +42,11 @@ class StructuredInsightService:
             if isinstance(self.prompts[key], str):
                 self.prompts[key] = self.prompts[key].replace("{OBJECTIVE}", self.objective)
 
+    @classmethod
+    def should_analyze(cls, block) -> bool:
+        """Whether a block is analyzed during document rumination"""
+        return bool(block.block_type) and block.block_type.lower() in cls.RUMINATION_BLOCK_TYPES
+
     async def extract_annotations(self, block_text: str) -> List[Annotation]:
         json_schema = {
             "type": "object",
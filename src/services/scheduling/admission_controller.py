@@ -0,0 +1,99 @@
+import asyncio
+import math
+import time
+import logging
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+class AdmissionRejected(Exception):
+    """Raised when a workload is at its concurrency and queue-depth limit"""
+    def __init__(self, workload: str, retry_after: int):
+        super().__init__(f"Too many concurrent {workload} requests, retry after {retry_after}s")
+        self.workload = workload
+        self.retry_after = retry_after
+
+class AdmissionController:
+    """Bounds how many requests of one workload class run or wait at once.
+
+    Requests beyond max_concurrency wait in a queue of at most max_queue_depth;
+    anything beyond that is rejected immediately with a Retry-After estimate
+    derived from the observed service time.
+    """
+    # Weight of the newest sample in the service time EWMA
+    EWMA_ALPHA = 0.2
+
+    def __init__(self, workload: str, max_concurrency: int, max_queue_depth: int, default_service_seconds: float = 1.0):
+        self.workload = workload
+        self.max_concurrency = max(max_concurrency, 1)
+        self.max_queue_depth = max(max_queue_depth, 0)
+        self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        self.active = 0
+        self.queued = 0
+        self.admitted_total = 0
+        self.rejected_total = 0
+        self.completed_total = 0
+        self.avg_service_seconds = default_service_seconds
+
+    def admit(self) -> "AdmissionTicket":
+        """Reserve a place in the queue or raise AdmissionRejected"""
+        if self.active + self.queued >= self.max_concurrency + self.max_queue_depth:
+            self.rejected_total += 1
+            retry_after = self.retry_after()
+            logger.warning(f"Rejecting {self.workload} request: {self.active} active, {self.queued} queued, retry after {retry_after}s")
+            raise AdmissionRejected(self.workload, retry_after)
+        self.queued += 1
+        self.admitted_total += 1
+        return AdmissionTicket(self)
+
+    def retry_after(self) -> int:
+        """Seconds until the work ahead of a new request should have drained"""
+        waves = (self.queued + 1) / self.max_concurrency
+        return max(1, math.ceil(self.avg_service_seconds * waves))
+
+    def _record_service_time(self, seconds: float) -> None:
+        self.completed_total += 1
+        self.avg_service_seconds = self.EWMA_ALPHA * seconds + (1 - self.EWMA_ALPHA) * self.avg_service_seconds
+
+    def stats(self) -> dict:
+        return {
+            "workload": self.workload,
+            "active": self.active,
+            "queued": self.queued,
+            "max_concurrency": self.max_concurrency,
+            "max_queue_depth": self.max_queue_depth,
+            "admitted_total": self.admitted_total,
+            "rejected_total": self.rejected_total,
+            "completed_total": self.completed_total,
+            "avg_service_seconds": self.avg_service_seconds
+        }
+
+class AdmissionTicket:
+    """A queued admission; entering it waits for a concurrency slot"""
+    def __init__(self, controller: AdmissionController):
+        self.controller = controller
+        self._started: Optional[float] = None
+        self._released = False
+
+    async def __aenter__(self) -> "AdmissionTicket":
+        try:
+            await self.controller._semaphore.acquire()
+        except BaseException:
+            self.cancel()
+            raise
+        self.controller.queued -= 1
+        self.controller.active += 1
+        self._started = time.monotonic()
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb) -> None:
+        self.controller.active -= 1
+        self.controller._semaphore.release()
+        self.controller._record_service_time(time.monotonic() - self._started)
+        self._released = True
+
+    def cancel(self) -> None:
+        """Give up a ticket that was never entered"""
+        if self._started is None and not self._released:
+            self.controller.queued -= 1
+            self._released = True
@@ -0,0 +1,147 @@
+import asyncio
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager, contextmanager
+from contextvars import ContextVar
+from enum import Enum
+from functools import partial
+from typing import Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+class Workload(str, Enum):
+    """Workload classes that get isolated resource pools"""
+    CHAT = "chat"
+    RUMINATION = "rumination"
+
+class Bulkhead:
+    """Resources reserved for one workload class.
+
+    The LLM share is enforced by LLMScheduler lane limits; this holds the DB
+    connection budget and an optional dedicated thread pool.
+    """
+    def __init__(self, workload: Workload, llm_concurrency: int, db_connections: int, thread_pool_size: Optional[int] = None):
+        self.workload = workload
+        self.llm_concurrency = max(llm_concurrency, 1)
+        self.db_connections = max(db_connections, 1)
+        self._db_semaphore = asyncio.Semaphore(self.db_connections)
+        self.db_in_use = 0
+        self.executor = (
+            ThreadPoolExecutor(max_workers=thread_pool_size, thread_name_prefix=f"{workload.value}-worker")
+            if thread_pool_size else None
+        )
+
+    @asynccontextmanager
+    async def db_slot(self):
+        """Hold one of this workload's DB connections"""
+        await self.acquire_db()
+        try:
+            yield
+        finally:
+            self.release_db()
+
+    async def acquire_db(self) -> None:
+        await self._db_semaphore.acquire()
+        self.db_in_use += 1
+
+    def release_db(self) -> None:
+        self.db_in_use -= 1
+        self._db_semaphore.release()
+
+    async def run_blocking(self, fn, *args, **kwargs):
+        """Run blocking work on this workload's thread pool (or the default one)"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, partial(fn, *args, **kwargs))
+
+    def stats(self) -> dict:
+        return {
+            "workload": self.workload.value,
+            "llm_concurrency": self.llm_concurrency,
+            "db_connections": self.db_connections,
+            "db_in_use": self.db_in_use
+        }
+
+_bulkheads: Dict[Workload, Bulkhead] = {}
+_current_workload: ContextVar[Optional[Workload]] = ContextVar("current_workload", default=None)
+_db_slot_held: ContextVar[bool] = ContextVar("db_slot_held", default=False)
+
+def configure_bulkheads(bulkheads: Dict[Workload, Bulkhead]) -> None:
+    """Register the bulkheads used for each workload class"""
+    _bulkheads.clear()
+    _bulkheads.update(bulkheads)
+
+def get_bulkheads() -> Dict[Workload, Bulkhead]:
+    return _bulkheads
+
+def current_bulkhead() -> Optional[Bulkhead]:
+    """Bulkhead for the workload running in the current task, if any"""
+    workload = _current_workload.get()
+    return _bulkheads.get(workload) if workload else None
+
+@contextmanager
+def workload_context(workload: Workload):
+    """Attribute everything run in this context (and tasks it creates) to a workload"""
+    token = _current_workload.set(workload)
+    try:
+        yield
+    finally:
+        _current_workload.reset(token)
+
+@asynccontextmanager
+async def db_budget():
+    """Hold a DB connection from the current workload's budget.
+
+    Nested use within the same task reuses the outer slot, so a repository
+    method that calls another one cannot deadlock on its own budget.
+    """
+    bulkhead = current_bulkhead()
+    if bulkhead is None or _db_slot_held.get():
+        yield
+        return
+    async with bulkhead.db_slot():
+        token = _db_slot_held.set(True)
+        try:
+            yield
+        finally:
+            _db_slot_held.reset(token)
+
+class DBBudgetLease:
+    """A slot of the current workload's DB budget, taken and given back by separate calls.
+
+    For holders that do not live in one block, like a session between its
+    first statement and its commit. Until release, db_budget() in the task
+    that acquired it reuses the slot.
+    """
+    def __init__(self):
+        self._bulkhead: Optional[Bulkhead] = None
+        self._token = None
+
+    async def acquire(self) -> None:
+        if self._bulkhead is not None or _db_slot_held.get():
+            return
+        bulkhead = current_bulkhead()
+        if bulkhead is None:
+            return
+        await bulkhead.acquire_db()
+        self._bulkhead = bulkhead
+        self._token = _db_slot_held.set(True)
+
+    def release(self) -> None:
+        if self._bulkhead is None:
+            return
+        self._bulkhead.release_db()
+        self._bulkhead = None
+        token, self._token = self._token, None
+        try:
+            # Restores what the acquiring context had, leaving an outer holder's flag alone
+            _db_slot_held.reset(token)
+        except ValueError:
+            pass  # Released from another context, whose flag this lease never set
+
+async def run_blocking(fn, *args, **kwargs):
+    """Run blocking work on the current workload's thread pool"""
+    bulkhead = current_bulkhead()
+    if bulkhead is None:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, partial(fn, *args, **kwargs))
+    return await bulkhead.run_blocking(fn, *args, **kwargs)
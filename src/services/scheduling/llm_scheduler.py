@@ -0,0 +1,151 @@
+import asyncio
+import heapq
+import itertools
+import logging
+from contextlib import asynccontextmanager
+from datetime import datetime, timedelta, timezone
+from enum import Enum
+from typing import Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+class LLMLane(str, Enum):
+    """Priority lanes for LLM work; interactive requests are always dispatched first"""
+    INTERACTIVE = "interactive"
+    BATCH = "batch"
+
+class QuotaExceeded(Exception):
+    """Raised at enqueue time when a user is over one of their quotas"""
+    def __init__(self, user_id: str, reason: str, retry_after: int):
+        super().__init__(f"Quota exceeded for user {user_id}: {reason}")
+        self.user_id = user_id
+        self.reason = reason
+        self.retry_after = retry_after
+
+class LLMScheduler:
+    """Weighted fair queuing of LLM calls across users.
+
+    Each call is tagged with a virtual finish time of
+    max(virtual clock, user's last finish) + cost / weight, where cost is the
+    estimated prompt tokens. Within a lane the call with the smallest tag runs
+    next, so a user with many queued calls cannot starve a user with few.
+    Optional per-lane limits cap each lane's share of max_concurrency.
+    """
+    def __init__(self,
+                 max_concurrency: int,
+                 lane_limits: Optional[Dict[LLMLane, int]] = None,
+                 daily_token_quota: Optional[int] = None,
+                 max_concurrent_jobs: Optional[int] = None,
+                 user_weights: Optional[Dict[str, float]] = None):
+        self.max_concurrency = max(max_concurrency, 1)
+        self.lane_limits = lane_limits or {}
+        self.daily_token_quota = daily_token_quota
+        self.max_concurrent_jobs = max_concurrent_jobs
+        self.user_weights = user_weights or {}
+
+        self._virtual_time = 0.0
+        self._last_finish: Dict[Tuple[LLMLane, str], float] = {}
+        self._queues: Dict[LLMLane, List] = {lane: [] for lane in LLMLane}
+        self._sequence = itertools.count()
+        self.in_flight: Dict[LLMLane, int] = {lane: 0 for lane in LLMLane}
+
+        self._quota_day = self._today()
+        self.tokens_today: Dict[str, int] = {}
+        self.active_jobs: Dict[str, int] = {}
+
+    @staticmethod
+    def _today():
+        return datetime.now(timezone.utc).date()
+
+    @staticmethod
+    def _seconds_until_reset() -> int:
+        now = datetime.now(timezone.utc)
+        tomorrow = datetime.combine(now.date() + timedelta(days=1), datetime.min.time(), tzinfo=timezone.utc)
+        return int((tomorrow - now).total_seconds()) + 1
+
+    def _roll_quota_day(self) -> None:
+        today = self._today()
+        if today != self._quota_day:
+            self._quota_day = today
+            self.tokens_today.clear()
+
+    def check_token_quota(self, user_id: str) -> None:
+        """Raise QuotaExceeded if the user has used up today's tokens"""
+        self._roll_quota_day()
+        if self.daily_token_quota is not None and self.tokens_today.get(user_id, 0) >= self.daily_token_quota:
+            raise QuotaExceeded(user_id, f"daily limit of {self.daily_token_quota} tokens reached", self._seconds_until_reset())
+
+    def record_tokens(self, user_id: str, tokens: int) -> None:
+        """Charge provider-reported tokens to a user's daily total"""
+        self._roll_quota_day()
+        self.tokens_today[user_id] = self.tokens_today.get(user_id, 0) + tokens
+
+    def begin_job(self, user_id: str) -> None:
+        """Register a long-running job (e.g. a rumination) for a user"""
+        self.check_token_quota(user_id)
+        active = self.active_jobs.get(user_id, 0)
+        if self.max_concurrent_jobs is not None and active >= self.max_concurrent_jobs:
+            raise QuotaExceeded(user_id, f"limit of {self.max_concurrent_jobs} concurrent jobs reached", 60)
+        self.active_jobs[user_id] = active + 1
+
+    def end_job(self, user_id: str) -> None:
+        """Release a job registered with begin_job"""
+        remaining = self.active_jobs.get(user_id, 0) - 1
+        if remaining > 0:
+            self.active_jobs[user_id] = remaining
+        else:
+            self.active_jobs.pop(user_id, None)
+
+    def _has_capacity(self, lane: LLMLane) -> bool:
+        if self.in_flight[lane] >= self.lane_limits.get(lane, self.max_concurrency):
+            return False
+        return sum(self.in_flight.values()) < self.max_concurrency
+
+    def _dispatch(self) -> None:
+        """Start queued calls while capacity is available, interactive lane first"""
+        for lane in LLMLane:
+            queue = self._queues[lane]
+            while queue and self._has_capacity(lane):
+                finish_tag, _, start_tag, future = heapq.heappop(queue)
+                if future.done():  # Caller was cancelled while queued
+                    continue
+                self._virtual_time = max(self._virtual_time, start_tag)
+                self.in_flight[lane] += 1
+                future.set_result(None)
+
+    @asynccontextmanager
+    async def slot(self, user_id: str, lane: LLMLane = LLMLane.INTERACTIVE, cost: float = 1.0):
+        """Wait for this user's fair turn in the lane, then hold a concurrency slot"""
+        self.check_token_quota(user_id)
+        weight = self.user_weights.get(user_id, 1.0)
+        start_tag = max(self._virtual_time, self._last_finish.get((lane, user_id), 0.0))
+        finish_tag = start_tag + max(cost, 1.0) / weight
+        self._last_finish[(lane, user_id)] = finish_tag
+
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._queues[lane], (finish_tag, next(self._sequence), start_tag, future))
+        self._dispatch()
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                # Slot was granted just as we were cancelled
+                self.in_flight[lane] -= 1
+                self._dispatch()
+            raise
+
+        try:
+            yield
+        finally:
+            self.in_flight[lane] -= 1
+            self._dispatch()
+
+    def stats(self) -> dict:
+        return {
+            "queued": {lane.value: len(queue) for lane, queue in self._queues.items()},
+            "in_flight": {lane.value: count for lane, count in self.in_flight.items()},
+            "max_concurrency": self.max_concurrency,
+            "lane_limits": {lane.value: limit for lane, limit in self.lane_limits.items()},
+            "active_jobs": dict(self.active_jobs),
+            "tokens_today": dict(self.tokens_today)
+        }
@@ -1,15 +1,25 @@
 interface PictureBlockProps {
-  images: { [key: string]: string };
+  images?: { [key: string]: string };
+  blockId?: string;
+  imageRefs?: { [key: string]: string };
 }
 
-export default function PictureBlock({ images }: PictureBlockProps) {
+export default function PictureBlock({ images, blockId, imageRefs }: PictureBlockProps) {
+  const apiUrl = process.env.NEXT_PUBLIC_API_BASE_URL || "";
+
+  // Stored images are fetched (and browser-cached) by URL; older blocks still carry them as base64
+  const sources = imageRefs && blockId
+    ? Object.keys(imageRefs).map(name => [name, `${apiUrl}/blocks/${blockId}/images/${encodeURIComponent(name)}`])
+    : Object.entries(images || {}).map(([name, base64Data]) => [name, `data:image/jpeg;base64,${base64Data}`]);
+
   return (
     <div className="p-4 border-b border-neutral-200 bg-white">
-      {Object.entries(images).map(([key, base64Data]) => (
+      {sources.map(([key, src]) => (
         <div key={key} className="flex justify-center">
           <img 
-            src={`data:image/jpeg;base64,${base64Data}`}
+            src={src}
             alt="PDF content"
+            loading="lazy"
             className="max-w-full h-auto rounded-lg shadow-sm"
           />
         </div>
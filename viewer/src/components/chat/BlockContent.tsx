@@ -14,6 +14,8 @@ interface BlockContentProps {
     insight: string;
   }>;
   images?: { [key: string]: string };
+  blockId?: string;
+  imageRefs?: { [key: string]: string };
 }
 
 const getBlockClassName = (block_type?: string): string => {
@@ -52,7 +54,7 @@ const unsupportedTypes = [
   'pagefooter'
 ].map(type => type.toLowerCase());
 
-export default function BlockContent({ html_content, block_type, highlights = [], images }: BlockContentProps) {
+export default function BlockContent({ html_content, block_type, highlights = [], images, blockId, imageRefs }: BlockContentProps) {
   const type = block_type?.toLowerCase();
 
   // Check if block type is unsupported
@@ -66,7 +68,7 @@ export default function BlockContent({ html_content, block_type, highlights = []
 
   // Handle supported block types
   if (type === 'picture' || type === 'figure') {
-    return images ? <PictureBlock images={images} /> : null;
+    return images || imageRefs ? <PictureBlock images={images} blockId={blockId} imageRefs={imageRefs} /> : null;
   }
 
   if (type === 'textinlinemath') {
@@ -88,6 +88,8 @@ export default function ChatPane({
         html_content={block.html_content} 
         block_type={block.block_type} 
         images={block.images}
+        blockId={block.id}
+        imageRefs={block.image_refs}
         highlights={currentBlockInsight?.annotations.map(a => ({
           phrase: a.phrase,
           insight: a.insight
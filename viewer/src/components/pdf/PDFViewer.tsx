@@ -20,9 +20,11 @@ export interface Block {
   html_content: string;
   polygon: number[][];
   page_number?: number;
+  reading_order?: number;
   pageIndex?: number;
   children?: Block[];
   images?: { [key: string]: string };
+  image_refs?: { [key: string]: string };
 }
 
 // A minimal Block Info component (for the built-in sidebar tab, if you still want it)
@@ -58,6 +60,30 @@ function BlockInformation({ block }: { block: Block | null }) {
   );
 }
 
+const BLOCKS_PER_REQUEST = 500;
+
+// Fetch a document's blocks in reading order, a request's worth at a time, starting after the given block.
+// Each batch is handed over as it arrives; returns the ID of the last block seen.
+async function streamBlocks(
+  apiUrl: string,
+  docId: string,
+  after: string | null,
+  onBlocks: (blocks: Block[]) => void
+): Promise<string | null> {
+  let cursor = after;
+  while (true) {
+    const params = new URLSearchParams({ limit: String(BLOCKS_PER_REQUEST) });
+    if (cursor) params.set("after", cursor);
+    const resp = await fetch(`${apiUrl}/documents/${docId}/blocks?${params}`);
+    if (!resp.ok) return cursor;
+    const batch = await resp.json();
+    if (!Array.isArray(batch) || batch.length === 0) return cursor;
+    onBlocks(batch);
+    cursor = batch[batch.length - 1].id;
+    if (batch.length < BLOCKS_PER_REQUEST) return cursor;
+  }
+}
+
 // Add utility function for hash calculation
 async function calculateHash(file: File): Promise<string> {
   const buffer = await file.arrayBuffer();
@@ -262,11 +288,8 @@ export default function PDFViewer() {
               // Restore cached conversations
               setBlockConversations(cachedData.blockConversations || {});
               
-              const blocksResp = await fetch(`${apiUrl}/documents/${cachedData.documentId}/blocks`);
-              const blocksData = await blocksResp.json();
-              if (Array.isArray(blocksData)) {
-                setBlocks(blocksData);
-              }
+              setBlocks([]);
+              await streamBlocks(apiUrl, cachedData.documentId, null, batch => setBlocks(prev => [...prev, ...batch]));
               
               // Set PDF file for viewing
               const reader = new FileReader();
@@ -309,23 +332,37 @@ export default function PDFViewer() {
         };
         localStorage.setItem('pdfDocuments', JSON.stringify(cachedDocuments));
 
-        // Poll until document status becomes "READY"
+        // Show the PDF right away; its blocks arrive as processing publishes them
+        setPdfFile(base64);
+
+        // Pages are published in order, so each refresh only asks for blocks after the last one loaded
+        setBlocks([]);
+        let lastBlockId: string | null = null;
+        const fetchBlocks = async () => {
+          lastBlockId = await streamBlocks(apiUrl, docId, lastBlockId, batch => setBlocks(prev => [...prev, ...batch]));
+        };
+
+        // Processing runs in the background; poll until document status becomes "READY".
+        // Long documents are processed in page ranges, so refresh blocks as pages are published.
         let status = data.status;
+        let pagesShown = 0;
         while (status !== "READY") {
-          const statusResp = await fetch(`${apiUrl}/documents/${docId}`);
-          const docData = await statusResp.json();
-          status = docData.status;
           await new Promise(resolve => setTimeout(resolve, 1000));
+          const statusResp = await fetch(`${apiUrl}/documents/${docId}/status`);
+          const statusData = await statusResp.json();
+          status = statusData.status;
+          if (status === "ERROR") {
+            console.error("Document processing failed:", statusData.processing_error);
+            return;
+          }
+          if (status !== "READY" && statusData.pages_processed > pagesShown) {
+            pagesShown = statusData.pages_processed;
+            await fetchBlocks();
+          }
         }
 
         // Fetch document blocks once the document is ready
-        const blocksResp = await fetch(`${apiUrl}/documents/${docId}/blocks`);
-        const blocksData = await blocksResp.json();
-        if (Array.isArray(blocksData)) {
-          setBlocks(blocksData);
-        }
-
-        setPdfFile(base64);
+        await fetchBlocks();
       };
       reader.readAsDataURL(file);
     } catch (error) {